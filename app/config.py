@@ -5,6 +5,25 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./referidos.db"
 
+    # Réplica de lectura opcional (admin, dashboard de referidor, leaderboard, embudo)
+    DATABASE_READ_URL: str = ""
+    READ_YOUR_WRITES_SECONDS: int = 5         # tras un POST, el usuario lee del primario
+
+    # Pool de conexiones (no aplica a SQLite en memoria)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0             # segundos esperando una conexión libre
+    DB_POOL_RECYCLE: int = 1800               # segundos; -1 = nunca reciclar
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100        # asyncpg; 0 detrás de pgbouncer (transaction)
+
+    # PRAGMAs de SQLite aplicados a cada conexión nueva
+    SQLITE_JOURNAL_MODE: str = "WAL"          # lectores no esperan al escritor
+    SQLITE_SYNCHRONOUS: str = "NORMAL"        # seguro con WAL, sin fsync por commit
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456         # 256 MB
+    SQLITE_CACHE_SIZE: int = -65536           # negativo = KiB (64 MB)
+
     # JWT
     SECRET_KEY: str = "change-me"
     ALGORITHM: str = "HS256"
@@ -21,6 +40,46 @@ class Settings(BaseSettings):
     APP_NAME: str = "EGP Referidos"
     BASE_URL: str = "http://localhost:8000"
 
+    # Media (videos de proyectos servidos por /media/videos)
+    MEDIA_VIDEOS_DIR: str = "static/videos"
+
+    # Caché de páginas anónimas (home y landing de referidos)
+    PAGE_CACHE_ENABLED: bool = True
+    PAGE_CACHE_TTL_SECONDS: int = 60
+    PAGE_CACHE_MAX_ENTRIES: int = 512
+
+    # Caché de resolución de códigos de referido (/r/{code} y POST /leads)
+    REFERRAL_CACHE_MAX_ENTRIES: int = 10000
+    REFERRAL_CACHE_TTL_SECONDS: int = 300
+    REFERRAL_CACHE_NEGATIVE_TTL_SECONDS: int = 60
+
+    # Compresión de respuestas dinámicas (Brotli si está instalado, si no gzip)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024          # bytes; respuestas más pequeñas van sin comprimir
+    COMPRESSION_GZIP_LEVEL: int = 6           # 1 (rápido) - 9 (máximo)
+    COMPRESSION_BROTLI_QUALITY: int = 4       # 0 (rápido) - 11 (máximo)
+
+    # Server-Timing + una línea de log INFO por petición muestreada: opcional, apagado por
+    # defecto (0.0 = apagado, 0.01-0.1 en producción para diagnosticar, 1.0 = todas)
+    SERVER_TIMING_SAMPLE_RATE: float = 0.0
+
+    # Métricas Prometheus (/metrics para admins, o exporter en puerto aparte)
+    METRICS_ENABLED: bool = True
+    METRICS_DIR: str = ""                     # compartido entre workers; vacío = solo este proceso
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5.0
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    METRICS_EXPORTER_HOST: str = "127.0.0.1"
+    METRICS_EXPORTER_PORT: int = 9100
+
+    # Eventos en tiempo real para asesores (SSE en /dashboard/asesor/events)
+    SSE_HEARTBEAT_SECONDS: float = 15.0       # comentario keep-alive para proxies
+    SSE_QUEUE_SIZE: int = 100                 # eventos pendientes por conexión antes de pedir recarga
+    SSE_BRIDGE: str = "none"                  # con varios workers: "postgres" (LISTEN/NOTIFY) o "socket"
+    SSE_BRIDGE_DIR: str = "/tmp/egp-sse"      # sockets Unix del bridge "socket" (un host)
+
+    # Webhook de captura de leads por lotes (POST /api/v1/webhooks/leads)
+    WEBHOOK_TOKEN: str = ""                   # secreto compartido en X-Webhook-Token; vacío = deshabilitado
+
     # Email
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
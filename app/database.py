@@ -1,19 +1,71 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import time
+from typing import Optional
+from sqlalchemy import event
+from starlette.requests import Request
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
 
 settings = get_settings()
 
-# Handle SQLite connect_args
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    connect_args=connect_args,
-)
+def sqlite_pragmas() -> dict:
+    """Connect-time PRAGMAs from settings (WAL: readers don't wait for the writer)."""
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+
+def build_engine(url: str, pragmas: Optional[dict] = None, **overrides) -> AsyncEngine:
+    """
+    Create an async engine with the pool settings from config.
+
+    SQLite gets `pragmas` (default: `sqlite_pragmas()`, `{}` for none) on
+    every new connection. In-memory SQLite uses a single static connection,
+    so the pool options do not apply to it.
+    """
+    kwargs = {"echo": False, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    elif url.startswith("postgresql+asyncpg"):
+        # Caché de sentencias preparadas de asyncpg y la del dialecto de SQLAlchemy;
+        # 0 desactiva ambas (necesario detrás de pgbouncer en modo transaction)
+        connect_args["statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+        connect_args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
+    if not _is_sqlite_memory(url):
+        kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    kwargs["connect_args"] = connect_args
+    kwargs.update(overrides)
+    new_engine = create_async_engine(url, **kwargs)
+
+    if url.startswith("sqlite"):
+        pragmas = sqlite_pragmas() if pragmas is None else pragmas
+        if pragmas:
+            @event.listens_for(new_engine.sync_engine, "connect")
+            def _apply_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+                cursor.close()
+
+    return new_engine
+
+
+engine = build_engine(settings.DATABASE_URL)
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -22,6 +74,20 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+# Réplica de solo lectura opcional para las páginas de consulta pesada
+read_engine = build_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
+
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+) if read_engine is not engine else AsyncSessionLocal
+
+# Cookie que ReadYourWritesMiddleware pone tras un POST del usuario: hasta ese
+# instante sus lecturas van al primario, para que vea lo que acaba de escribir
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -32,3 +98,26 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+
+def prefers_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, "")) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session_factory(request: Request):
+    """Replica sessions, unless there is none or the user wrote in the last seconds."""
+    if ReadSessionLocal is AsyncSessionLocal or prefers_primary(request):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+
+async def get_read_db(request: Request):
+    """Like get_db, for read-only handlers that tolerate replication lag."""
+    async with read_session_factory(request)() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
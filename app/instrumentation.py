@@ -0,0 +1,164 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+from starlette.routing import Match
+
+
+class RequestTimings:
+    """Where the wall time of one request went: SQL, template rendering, the rest."""
+
+    __slots__ = ("started", "db_count", "db_ms", "template_ms")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_count = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        total = self.elapsed_ms()
+        other = max(total - self.db_ms - self.template_ms, 0.0)
+        return (
+            f'db;dur={self.db_ms:.1f};desc="{self.db_count} queries", '
+            f"tpl;dur={self.template_ms:.1f}, "
+            f"app;dur={other:.1f}, "
+            f"total;dur={total:.1f}"
+        )
+
+
+# Solo tiene valor mientras se atiende una petición muestreada
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings.get()
+    if timings is None:
+        return
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    timings.db_count += 1
+    timings.db_ms += (time.perf_counter() - started.pop()) * 1000
+
+
+def instrument_engine(engine) -> None:
+    """Attach the cursor listeners to an (async) engine. Safe to call twice."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class InstrumentedTemplates(Jinja2Templates):
+    """Jinja2Templates that adds render time to the current request timings."""
+
+    def TemplateResponse(self, *args, **kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return super().TemplateResponse(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().TemplateResponse(*args, **kwargs)
+        finally:
+            timings.template_ms += (time.perf_counter() - started) * 1000
+
+
+# --- Detección de N+1 -------------------------------------------------------
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape: literals, placeholders and IN lists become `?`."""
+    shape = _STRING_LITERAL_RE.sub("?", statement)
+    shape = _PLACEHOLDER_RE.sub("?", shape)
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("(?)", shape)
+    return _WHITESPACE_RE.sub(" ", shape).strip()
+
+
+class QueryRecorder:
+    """
+    Records the normalized SQL executed on an engine while active:
+
+        with QueryRecorder(engine) as recorder:
+            await client.get("/dashboard/asesor")
+        assert recorder.count <= 8
+        assert not recorder.repeated()
+    """
+
+    def __init__(self, engine):
+        self.engine = getattr(engine, "sync_engine", engine)
+        self.statements: List[str] = []
+        self._listener = self._record
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(normalize_sql(statement))
+
+    def __enter__(self):
+        event.listen(self.engine, "after_cursor_execute", self._listener)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "after_cursor_execute", self._listener)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def clear(self) -> None:
+        self.statements.clear()
+
+    def shapes(self) -> Counter:
+        return Counter(self.statements)
+
+    def repeated(self, max_repeats: int = 3) -> Dict[str, int]:
+        """Statement shapes executed more than `max_repeats` times (N+1 suspects)."""
+        return {shape: n for shape, n in self.shapes().items() if n > max_repeats}
+
+
+def query_budget(max_queries: int):
+    """Declare how many SQL statements a route may run; enforced by the test suite."""
+    def decorator(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorator
+
+
+def route_query_budget(app, method: str, path: str) -> Optional[int]:
+    """Budget declared with @query_budget on the route that serves `method path`."""
+    scope = {"type": "http", "method": method.upper(), "path": path.split("?")[0]}
+    for route in app.routes:
+        match, _child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(getattr(route, "endpoint", None), "query_budget", None)
+    return None
+
+
+def query_budget_violations(recorder: QueryRecorder, app, method: str, path: str, max_repeats: int = 3) -> List[str]:
+    """Problems found for one request: over budget, undeclared budget or N+1 shapes."""
+    problems = []
+    budget = route_query_budget(app, method, path)
+    if budget is None:
+        problems.append(f"{method} {path}: la ruta no declara @query_budget")
+    elif recorder.count > budget:
+        problems.append(f"{method} {path}: {recorder.count} queries (presupuesto {budget})")
+    for shape, n in recorder.repeated(max_repeats).items():
+        problems.append(f"{method} {path}: posible N+1, {n}x {shape}")
+    return problems
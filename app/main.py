@@ -1,18 +1,29 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, Response
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from jinja2 import select_autoescape
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from app.config import get_settings
-from app.database import engine, Base, AsyncSessionLocal
+from app.database import engine, read_engine, Base, AsyncSessionLocal
 from app.models.models import User, UserRole, AssignmentState, EventoAsistencia
 from app.services.auth_service import hash_password
 from app.dependencies import get_current_user_optional
+from app.staticfiles import PrecompressedStaticFiles
+from app.middleware import (
+    CompressionMiddleware, MetricsMiddleware, ReadYourWritesMiddleware, ServerTimingMiddleware,
+)
+from app.metrics import instrument_pool, run_metrics_monitor
+from app.services.events import start_bridge
+from app.services.commission_service import open_commission_ledger
+from app.services.project_service import seed_projects
+from app.services.referrer_stats_service import open_referrer_stats
+from app.services.rollup_service import open_daily_rollups
+from app.instrumentation import InstrumentedTemplates, instrument_engine, query_budget
+from app.services.page_cache import cached_page, page_cache_key, store_page
 from sqlalchemy import select, text
 
 limiter = Limiter(key_func=get_remote_address)
@@ -45,6 +56,23 @@ async def init_db():
             await conn.execute(text(
                 "ALTER TABLE lead_admin_tasks ADD COLUMN IF NOT EXISTS due_date TIMESTAMP"
             ))
+        # Índices agregados a tablas existentes (create_all solo los crea en tablas nuevas)
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_phone ON leads (phone)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_created_at ON leads (created_at)"))
+        if settings.DATABASE_URL.startswith("postgresql"):
+            await conn.execute(text(
+                "ALTER TABLE leads ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255)"
+            ))
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_leads_idempotency_key ON leads (idempotency_key)"
+            ))
+            await conn.execute(text(
+                "ALTER TABLE leads ADD COLUMN IF NOT EXISTS project_id INTEGER REFERENCES projects (id)"
+            ))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_project_id ON leads (project_id)"))
+            await conn.execute(text(
+                "ALTER TABLE leads ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP"
+            ))
 
     # Add new enum values outside of transaction (PostgreSQL requires this for ALTER TYPE ADD VALUE)
     if settings.DATABASE_URL.startswith("postgresql"):
@@ -69,17 +97,25 @@ async def init_db():
                 "ALTER TABLE leads ADD COLUMN commission_amount FLOAT",
                 "ALTER TABLE leads ADD COLUMN commission_paid BOOLEAN NOT NULL DEFAULT 0",
                 "ALTER TABLE leads ADD COLUMN loss_reason VARCHAR(255)",
+                "ALTER TABLE leads ADD COLUMN idempotency_key VARCHAR(255)",
+                "ALTER TABLE leads ADD COLUMN project_id INTEGER REFERENCES projects (id)",
+                "ALTER TABLE leads ADD COLUMN status_changed_at TIMESTAMP",
             ]:
                 try:
                     await conn.execute(text(stmt))
                 except Exception:
                     pass  # La columna ya existe
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_leads_idempotency_key ON leads (idempotency_key)"
+            ))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_leads_project_id ON leads (project_id)"))
             # Migrate old statuses to new ones
             for old, new in [("CONTACTADO", "CONTACTANDO"), ("EN_PROCESO", "PROPUESTA_REALIZADA"), ("CERRADO", "GANADA"), ("DESCARTADO", "PERDIDA")]:
                 try:
                     await conn.execute(text("UPDATE leads SET status = :new WHERE status = :old"), {"new": new, "old": old})
                 except Exception:
                     pass
+        # Emails de leads anteriores a la normalización: python -m scripts.normalize_lead_emails
 
     # Seed admin user
     async with AsyncSessionLocal() as db:
@@ -106,13 +142,45 @@ async def init_db():
             await db.commit()
             logger.info("Assignment state initialized")
 
+        # Proyectos (leads existentes: python -m scripts.backfill_projects)
+        if await seed_projects(db):
+            logger.info("Projects seeded")
+
+        # Libro de comisiones: la primera vez abre los saldos con las comisiones existentes
+        opened = await open_commission_ledger(db)
+        if opened and opened["entries"]:
+            logger.info(f"Commission ledger opened: {opened['entries']} entries")
+
+        # Resúmenes diarios: la primera vez se reconstruye todo el historial de leads
+        caught_up = await open_daily_rollups(db)
+        if caught_up:
+            logger.info(f"Daily rollups built: {caught_up['days']} days, {caught_up['created']} leads")
+
+        # Panel de referidores: contadores precalculados (reconstrucción: python -m scripts.refresh_referrer_stats)
+        built = await open_referrer_stats(db)
+        if built and built["referrers"]:
+            logger.info(f"Referrer stats built: {built['referrers']} referrers")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    monitor = None
+    if settings.METRICS_ENABLED:
+        monitor = asyncio.create_task(run_metrics_monitor(engine))
+    # Reenvío de eventos SSE entre workers (SSE_BRIDGE)
+    bridge = await start_bridge()
     logger.info("Application started")
     yield
     logger.info("Application shutting down")
+    if bridge is not None:
+        await bridge.stop()
+    if monitor is not None:
+        monitor.cancel()
+        try:
+            await monitor
+        except asyncio.CancelledError:
+            pass
 
 
 app = FastAPI(
@@ -135,20 +203,13 @@ class SecurityHeadersMiddleware:
             return await self.app(scope, receive, send)
 
         async def send_wrapper(message):
-            if message["type"] == "http.response.start":
+            # Los estáticos llevan sus propios headers (ver app/staticfiles.py)
+            if message["type"] == "http.response.start" and not scope["path"].startswith("/static/"):
                 headers = message.get("headers", [])
-                
-                # Para archivos estaticos, anadimos Accept-Ranges
-                if scope["path"].startswith("/static/"):
-                    # Solo lo anadimos si no existe
-                    if not any(k.lower() == b"accept-ranges" for k, v in headers):
-                        headers.append((b"accept-ranges", b"bytes"))
-                else:
-                    headers.append((b"x-content-type-options", b"nosniff"))
-                    headers.append((b"x-frame-options", b"DENY"))
-                    headers.append((b"x-xss-protection", b"1; mode=block"))
-                    headers.append((b"referrer-policy", b"strict-origin-when-cross-origin"))
-                    
+                headers.append((b"x-content-type-options", b"nosniff"))
+                headers.append((b"x-frame-options", b"DENY"))
+                headers.append((b"x-xss-protection", b"1; mode=block"))
+                headers.append((b"referrer-policy", b"strict-origin-when-cross-origin"))
                 message["headers"] = headers
             await send(message)
 
@@ -156,17 +217,36 @@ class SecurityHeadersMiddleware:
 
 app.add_middleware(SecurityHeadersMiddleware)
 
+# Con réplica de lectura: quien acaba de escribir lee del primario un rato
+if read_engine is not engine:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Compresión de HTML dinámico (queda por fuera de SecurityHeadersMiddleware)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Métricas por ruta (latencia y estado) y espera del pool de conexiones
+if settings.METRICS_ENABLED:
+    instrument_pool(engine)
+    app.add_middleware(MetricsMiddleware)
+
+# Server-Timing: la más externa, para medir también la compresión
+if settings.SERVER_TIMING_SAMPLE_RATE > 0:
+    instrument_engine(engine)
+    instrument_engine(read_engine)
+    app.add_middleware(ServerTimingMiddleware)
+
 # Static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Templates
-templates = Jinja2Templates(
+templates = InstrumentedTemplates(
     directory="templates",
     autoescape=select_autoescape(["html", "xml"]),
 )
 
 # Include routers
-from app.routers import auth, referral, dashboard, leaderboard, admin, profile
+from app.routers import auth, referral, dashboard, leaderboard, admin, profile, media, metrics, api
 
 app.include_router(auth.router)
 app.include_router(referral.router)
@@ -174,10 +254,23 @@ app.include_router(dashboard.router)
 app.include_router(leaderboard.router)
 app.include_router(admin.router)
 app.include_router(profile.router)
+app.include_router(media.router)
+app.include_router(metrics.router)
+app.include_router(api.router)
 
 
 @app.get("/", response_class=HTMLResponse)
+@query_budget(1)
 async def home(request: Request):
+    # Visitantes anónimos: la página sale de la caché sin tocar la BD ni Jinja
+    cache_key = page_cache_key(request, "home")
+    cached = cached_page(cache_key)
+    if cached is not None:
+        return cached
+    if cache_key is not None:
+        response = templates.TemplateResponse("home.html", {"request": request, "user": None})
+        return store_page(cache_key, response)
+
     user = None
     try:
         from app.database import get_db
@@ -0,0 +1,319 @@
+"""
+Métricas en formato de texto de Prometheus, sin servicios externos.
+
+Cada proceso acumula sus métricas en memoria y, si METRICS_DIR está
+configurado, las vuelca periódicamente a `METRICS_DIR/metrics_<pid>.json`
+(escritura atómica). Quien exporta (`/metrics` o el exporter en un puerto
+aparte, ver scripts/metrics_exporter.py) suma los archivos de todos los
+workers:
+
+- counters e histogramas se suman, también los de procesos ya terminados,
+  para que no retrocedan cuando un worker se recicla;
+- los gauges solo se toman de procesos vivos y llevan la etiqueta `pid`.
+
+El directorio debe vaciarse al desplegar (`python -m scripts.metrics_exporter
+--clear`), igual que con el modo multiproceso de prometheus_client.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# nombre -> (tipo, ayuda, buckets)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route template and status.", None),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency by route template.", LATENCY_BUCKETS),
+    "db_pool_size": ("gauge", "Configured size of the DB connection pool.", None),
+    "db_pool_checked_out": ("gauge", "DB connections currently checked out of the pool.", None),
+    "db_pool_overflow": ("gauge", "DB connections open beyond the pool size.", None),
+    "db_pool_wait_seconds": ("histogram", "Time spent waiting for a DB connection.", POOL_WAIT_BUCKETS),
+    "notifications_sent_total": ("counter", "Notifications delivered by channel.", None),
+    "notifications_failed_total": ("counter", "Notifications that failed by channel.", None),
+    "leads_created_total": ("counter", "Leads created, by advisor assigned at creation.", None),
+    "leads_assigned_total": ("counter", "Lead assignments by advisor and source.", None),
+    "event_loop_lag_seconds": ("histogram", "Event loop scheduling lag.", LOOP_LAG_BUCKETS),
+    "event_loop_lag_last_seconds": ("gauge", "Most recent event loop lag sample.", None),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[dict]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class MetricsRegistry:
+    """In-process metric values; cheap to update from request handlers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        # (nombre, labels) -> [conteos por bucket..., +Inf, suma]
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def inc(self, name: str, labels: Optional[dict] = None, value: float = 1.0) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = float(value)
+
+    def observe(self, name: str, value: float, labels: Optional[dict] = None) -> None:
+        buckets = METRICS[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0.0] * (len(buckets) + 2)
+            series[bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, list(l), v] for (n, l), v in self.gauges.items()],
+                "histograms": [[n, list(l), list(s)] for (n, l), s in self.histograms.items()],
+            }
+
+
+registry = MetricsRegistry()
+
+
+# --- Puntos de instrumentación ---------------------------------------------
+
+def record_request(method: str, route: str, status: int, seconds: float) -> None:
+    registry.inc("http_requests_total", {"method": method, "route": route, "status": status})
+    registry.observe("http_request_duration_seconds", seconds, {"method": method, "route": route})
+
+
+def record_notification(channel: str, ok: bool) -> None:
+    name = "notifications_sent_total" if ok else "notifications_failed_total"
+    registry.inc(name, {"channel": channel})
+
+
+def record_lead_created(advisor_id: Optional[int]) -> None:
+    registry.inc("leads_created_total", {"advisor_id": advisor_id if advisor_id else "none"})
+
+
+def record_leads_assigned(advisor_ids: Iterable[int], source: str) -> None:
+    for advisor_id in advisor_ids:
+        registry.inc("leads_assigned_total", {"advisor_id": advisor_id, "source": source})
+
+
+def instrument_pool(engine) -> None:
+    """Time `pool.connect()` (wait for a free connection). Safe to call twice."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if getattr(pool, "_metrics_instrumented", False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            registry.observe("db_pool_wait_seconds", time.perf_counter() - started)
+
+    pool.connect = timed_connect
+    pool._metrics_instrumented = True
+
+
+def sample_pool(engine) -> None:
+    """Copy the pool occupancy into gauges (pools without a size are skipped)."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    for name, attr in (
+        ("db_pool_size", "size"),
+        ("db_pool_checked_out", "checkedout"),
+        ("db_pool_overflow", "overflow"),
+    ):
+        getter = getattr(pool, attr, None)
+        if getter is not None:
+            # QueuePool.overflow() es negativo mientras sobra capacidad
+            registry.set(name, max(getter(), 0))
+
+
+# --- Almacenamiento multiproceso ---------------------------------------------
+
+def metrics_file(directory: str, pid: Optional[int] = None) -> str:
+    return os.path.join(directory, f"metrics_{pid or os.getpid()}.json")
+
+
+def flush_metrics(directory: Optional[str] = None) -> None:
+    """Write this process' snapshot atomically (no-op without METRICS_DIR)."""
+    directory = settings.METRICS_DIR if directory is None else directory
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = metrics_file(directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def clear_metrics_dir(directory: str) -> int:
+    """Remove every per-process file; returns how many were removed."""
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        if name.startswith("metrics_") and name.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def load_snapshots(directory: str) -> List[dict]:
+    snapshots = []
+    if not os.path.isdir(directory):
+        return snapshots
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith("metrics_") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            # Archivo a medio escribir por un worker que murió: se ignora
+            logger.warning(f"Archivo de métricas ilegible: {name}")
+    return snapshots
+
+
+def collect(directory: Optional[str] = None, include_current: bool = True) -> List[dict]:
+    """Snapshots of every worker; the calling process is always fresh."""
+    directory = settings.METRICS_DIR if directory is None else directory
+    snapshots = load_snapshots(directory) if directory else []
+    if include_current:
+        pid = os.getpid()
+        snapshots = [s for s in snapshots if s.get("pid") != pid]
+        snapshots.append(registry.snapshot())
+    return snapshots
+
+
+# --- Formato de texto de Prometheus ------------------------------------------
+
+def _format_labels(labels: Iterable) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(snapshots: List[dict]) -> str:
+    counters: Dict[Tuple[str, Labels], float] = {}
+    gauges: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, series in snapshot.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.get(key)
+            if total is None or len(total) != len(series):
+                histograms[key] = list(series)
+            else:
+                histograms[key] = [a + b for a, b in zip(total, series)]
+        pid = snapshot.get("pid")
+        if pid != os.getpid() and (pid is None or not _pid_alive(pid)):
+            continue
+        for name, labels, value in snapshot.get("gauges", []):
+            key = (name, tuple(tuple(pair) for pair in labels) + (("pid", str(pid)),))
+            gauges[key] = value
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if kind == "counter":
+            series = sorted((k, v) for k, v in counters.items() if k[0] == name)
+        elif kind == "gauge":
+            series = sorted((k, v) for k, v in gauges.items() if k[0] == name)
+        else:
+            series = sorted((k, v) for k, v in histograms.items() if k[0] == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (_name, labels), value in series:
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0.0
+            for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- Tarea de fondo por worker -----------------------------------------------
+
+async def run_metrics_monitor(engine, interval: Optional[float] = None, flush_interval: Optional[float] = None) -> None:
+    """
+    Per-worker loop: measures event-loop lag (how late each sleep wakes up),
+    samples the pool gauges and flushes the snapshot every `flush_interval`.
+    """
+    interval = settings.METRICS_LOOP_LAG_INTERVAL_SECONDS if interval is None else interval
+    flush_interval = settings.METRICS_FLUSH_INTERVAL_SECONDS if flush_interval is None else flush_interval
+    loop = asyncio.get_running_loop()
+    last_flush = loop.time()
+    try:
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - expected, 0.0)
+            registry.observe("event_loop_lag_seconds", lag)
+            registry.set("event_loop_lag_last_seconds", lag)
+            if loop.time() - last_flush >= flush_interval:
+                sample_pool(engine)
+                await asyncio.to_thread(flush_metrics)
+                last_flush = loop.time()
+    finally:
+        sample_pool(engine)
+        flush_metrics()
@@ -0,0 +1,294 @@
+import json
+import logging
+import random
+import time
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+from app.config import get_settings
+from app.database import READ_PRIMARY_COOKIE
+from app.instrumentation import RequestTimings, current_timings
+from app.metrics import record_request
+from app.staticfiles import parse_accept_encoding
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+settings = get_settings()
+timing_logger = logging.getLogger("app.timing")
+
+# Tipos que ya vienen comprimidos (o no ganan nada): se envían tal cual
+INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+INCOMPRESSIBLE_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/pdf",
+    "application/octet-stream",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  # ya es un zip
+    "text/event-stream",
+}
+
+
+class _GzipEncoder:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        # wbits=31 -> formato gzip (cabecera + CRC)
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    encoding = "br"
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    if not media_type:
+        return False
+    if media_type in INCOMPRESSIBLE_TYPES:
+        return False
+    return not media_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+class CompressionMiddleware:
+    """
+    Streaming Brotli/gzip compression for dynamic responses.
+
+    Each body chunk is compressed and flushed as it arrives, so streamed
+    responses stay streamed. Only up to `minimum_size` bytes are held back
+    to decide whether compressing is worth it. Responses that are already
+    encoded, partial (206), or of an incompressible media type pass through.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = None,
+        gzip_level: int = None,
+        brotli_quality: int = None,
+    ):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.gzip_level = settings.COMPRESSION_GZIP_LEVEL if gzip_level is None else gzip_level
+        self.brotli_quality = settings.COMPRESSION_BROTLI_QUALITY if brotli_quality is None else brotli_quality
+
+    def select_encoder(self, scope):
+        accepted = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return _BrotliEncoder(self.brotli_quality)
+        if "gzip" in accepted:
+            return _GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoder = self.select_encoder(scope)
+        if encoder is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        pending = []        # cuerpo retenido hasta alcanzar minimum_size
+        pending_size = 0
+        compressing = None  # None: sin decidir, True/False una vez decidido
+
+        async def start_compressed():
+            headers = MutableHeaders(raw=start_message["headers"])
+            del headers["content-length"]
+            headers["content-encoding"] = encoder.encoding
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # La representación comprimida ya no es idéntica byte a byte
+                headers["etag"] = "W/" + etag
+            start_message["headers"] = headers.raw
+            await send(start_message)
+
+        async def send_wrapper(message):
+            nonlocal start_message, pending_size, compressing
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                start_message = message
+                if (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or scope["method"] == "HEAD"
+                ):
+                    compressing = False
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or compressing is False:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressing is None:
+                pending.append(body)
+                pending_size += len(body)
+                if more_body and pending_size < self.minimum_size:
+                    return
+                body = b"".join(pending)
+                pending.clear()
+                if pending_size < self.minimum_size:
+                    # Respuesta completa y pequeña: no vale la pena comprimir
+                    compressing = False
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body, "more_body": False})
+                    return
+                compressing = True
+                await start_compressed()
+
+            data = encoder.process(body) if body else b""
+            if not more_body:
+                data += encoder.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class ReadYourWritesMiddleware:
+    """
+    After a successful write (POST/PUT/PATCH/DELETE) the client gets a short
+    cookie so `get_read_db` sends its next reads to the primary instead of a
+    replica that may not have the row yet. A cookie works across workers.
+    """
+
+    WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(self, app, seconds: int = None):
+        self.app = app
+        self.seconds = settings.READ_YOUR_WRITES_SECONDS if seconds is None else seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.WRITE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(raw=message.setdefault("headers", []))
+                until = time.time() + self.seconds
+                headers.append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={until:.0f}; Max-Age={self.seconds}; Path=/; HttpOnly; SameSite=Lax",
+                )
+                message["headers"] = headers.raw
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class ServerTimingMiddleware:
+    """
+    Attributes each sampled request's wall time to DB (query count and ms),
+    template rendering and the rest. Emits a `Server-Timing` header and one
+    JSON log line per request.
+    """
+
+    def __init__(self, app, sample_rate: float = None):
+        self.app = app
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(raw=message.setdefault("headers", []))
+                headers.append("server-timing", timings.server_timing())
+                message["headers"] = headers.raw
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_timings.reset(token)
+            timing_logger.info(json.dumps({
+                "event": "request_timing",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "total_ms": round(timings.elapsed_ms(), 2),
+                "db_ms": round(timings.db_ms, 2),
+                "db_queries": timings.db_count,
+                "template_ms": round(timings.template_ms, 2),
+            }))
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and observes their latency per route template
+    (`/r/{code}`, not `/r/ABC123`), so the label set stays bounded.
+    Requests that match no route are grouped under `unmatched`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = {}
+
+    def route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self._route_paths.get(endpoint)
+        if label is None:
+            label = "unmatched"
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    label = route.path
+                    break
+            self._route_paths[endpoint] = label
+        return label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record_request(
+                scope["method"], self.route_label(scope), status_code,
+                time.perf_counter() - started,
+            )
@@ -1,7 +1,7 @@
 import enum
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Date, Text, ForeignKey, Enum, Float, func
+    Column, Integer, String, Boolean, DateTime, Date, Text, ForeignKey, Enum, Float, Index, UniqueConstraint, func
 )
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -68,6 +68,19 @@ class User(Base):
     lead_notes = relationship("LeadNote", back_populates="advisor")
 
 
+class Project(Base):
+    __tablename__ = "projects"
+    # Top de proyectos: se lee solo del índice (lead_count, name)
+    __table_args__ = (Index("ix_projects_lead_count", "lead_count", "name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    slug = Column(String(50), unique=True, nullable=False)
+    name = Column(String(100), nullable=False)
+    # Leads del proyecto, mantenido al crear leads (ver project_service)
+    lead_count = Column(Integer, default=0, nullable=False, server_default="0")
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+
 class Lead(Base):
     __tablename__ = "leads"
 
@@ -75,9 +88,12 @@ class Lead(Base):
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     email = Column(String(255), nullable=False, index=True)
-    phone = Column(String(20), nullable=True)
+    phone = Column(String(20), nullable=True, index=True)
     city = Column(String(100), nullable=True)
     notes_public = Column(Text, nullable=True)
+    # Proyecto reconocido en notes_public (el texto libre se conserva tal cual)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=True, index=True)
+    project = relationship("Project")
     status = Column(Enum(LeadStatus), default=LeadStatus.NUEVO, nullable=False)
     loss_reason = Column(String(255), nullable=True)
 
@@ -100,17 +116,169 @@ class Lead(Base):
     utm_campaign = Column(String(255), nullable=True)
     utm_content = Column(String(255), nullable=True)
 
+    # Llave de idempotencia del webhook de captura (única: un reenvío no duplica el lead)
+    idempotency_key = Column(String(255), unique=True, nullable=True, index=True)
+
     payment_date = Column(Date, nullable=True)
     commission_amount = Column(Float, nullable=True)
     commission_paid = Column(Boolean, default=False, nullable=False, server_default="0")
 
-    created_at = Column(DateTime, default=func.now(), nullable=False)
+    # Con microsegundos (no func.now(): en SQLite CURRENT_TIMESTAMP va al segundo y el cursor
+    # de /api/v1/leads no avanzaría entre leads creados en el mismo segundo)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # Entrada al estado actual (NULL en leads anteriores al historial: se usa created_at)
+    status_changed_at = Column(DateTime, nullable=True)
 
     # Relationships
     notes = relationship("LeadNote", back_populates="lead", cascade="all, delete-orphan")
     admin_tasks = relationship("LeadAdminTask", back_populates="lead", cascade="all, delete-orphan")
 
 
+class LeadStatusEvent(Base):
+    """
+    Append-only log of status changes, written in the same transaction as
+    the change. `hours_in_stage` is the time the lead spent in from_status.
+    """
+    __tablename__ = "lead_status_events"
+    __table_args__ = (
+        Index("ix_lead_status_events_lead_at", "lead_id", "at"),
+        Index("ix_lead_status_events_advisor_at", "advisor_id", "at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=False)
+    advisor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    changed_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    from_status = Column(Enum(LeadStatus), nullable=True)
+    to_status = Column(Enum(LeadStatus), nullable=False)
+    at = Column(DateTime, nullable=False)
+    hours_in_stage = Column(Float, nullable=True)
+
+
+class AdvisorStageVelocity(Base):
+    """
+    Histogram of hours between two stages per advisor (one row per bucket of
+    status_history_service.VELOCITY_BUCKETS), incremented with each event so
+    the funnel reads medians without scanning lead_status_events.
+    """
+    __tablename__ = "advisor_stage_velocity"
+    __table_args__ = (
+        UniqueConstraint(
+            "advisor_id", "from_status", "to_status", "bucket", name="uq_advisor_stage_velocity_bucket",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    advisor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    from_status = Column(Enum(LeadStatus), nullable=False)
+    to_status = Column(Enum(LeadStatus), nullable=False)
+    bucket = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+    hours_total = Column(Float, nullable=False, default=0.0, server_default="0")
+
+
+class LeadDailyRollup(Base):
+    """
+    Lead activity per day and dimension value (advisor, referrer, project,
+    utm_source, utm_campaign; "all" for the totals). Maintained on writes by
+    rollup_service; won, lost and commission are net (leaving GANADA counts -1).
+    """
+    __tablename__ = "lead_daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "dimension", "key", name="uq_lead_daily_rollups_day_dimension_key"),
+        Index("ix_lead_daily_rollups_dimension_day", "dimension", "day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    dimension = Column(String(20), nullable=False)
+    key = Column(String(255), nullable=False, default="", server_default="")   # "" = sin valor
+    created = Column(Integer, nullable=False, default=0, server_default="0")
+    transitions = Column(Integer, nullable=False, default=0, server_default="0")
+    won = Column(Integer, nullable=False, default=0, server_default="0")
+    lost = Column(Integer, nullable=False, default=0, server_default="0")
+    commission = Column(Float, nullable=False, default=0.0, server_default="0")
+
+
+class CommissionPayout(Base):
+    """One payout batch; the leads it paid are its commission_ledger entries."""
+    __tablename__ = "commission_payouts"
+
+    id = Column(Integer, primary_key=True)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    lead_count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    note = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+
+class CommissionLedgerEntry(Base):
+    """
+    Append-only commission movements of a lead. unpaid_delta and paid_delta
+    move money into or between the referrer's two balances (a payout is -x
+    unpaid / +x paid); unpaid_balance and paid_balance are the referrer's
+    running balances after the entry.
+    """
+    __tablename__ = "commission_ledger"
+    __table_args__ = (
+        Index("ix_commission_ledger_referrer_id_id", "referrer_id", "id"),
+        Index("ix_commission_ledger_lead_id", "lead_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, ForeignKey("leads.id", ondelete="CASCADE"), nullable=False)
+    referrer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    kind = Column(String(20), nullable=False)   # accrual, adjustment, payout, reversal, reconciliation
+    unpaid_delta = Column(Float, nullable=False, default=0.0)
+    paid_delta = Column(Float, nullable=False, default=0.0)
+    unpaid_balance = Column(Float, nullable=False, default=0.0)
+    paid_balance = Column(Float, nullable=False, default=0.0)
+    payout_id = Column(Integer, ForeignKey("commission_payouts.id"), nullable=True)
+    created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    at = Column(DateTime, nullable=False)
+
+
+class CommissionBalance(Base):
+    """
+    Current commission balances, updated with each ledger entry: scope
+    "referrer" has one row per referrer (referrer_id 0 = leads without
+    referrer) and scope "total" one row for the whole company.
+    """
+    __tablename__ = "commission_balances"
+    __table_args__ = (
+        UniqueConstraint("scope", "referrer_id", name="uq_commission_balances_scope_referrer"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String(20), nullable=False)
+    referrer_id = Column(Integer, nullable=False, default=0, server_default="0")
+    unpaid = Column(Float, nullable=False, default=0.0, server_default="0")
+    paid = Column(Float, nullable=False, default=0.0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+
+
+class ReferrerStats(Base):
+    """
+    Referrer dashboard counters, kept current by referrer_stats_service on
+    every write to the referrer's leads. ranked_count (leads with a payment
+    date) orders the leaderboard; leaderboard_rank is 1 + referrers with a
+    higher ranked_count, NULL while it is 0.
+    """
+    __tablename__ = "referrer_stats"
+    __table_args__ = (
+        Index("ix_referrer_stats_ranked_count", "ranked_count"),
+    )
+
+    referrer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, autoincrement=False)
+    total_referidos = Column(Integer, nullable=False, default=0, server_default="0")
+    closed_count = Column(Integer, nullable=False, default=0, server_default="0")
+    ranked_count = Column(Integer, nullable=False, default=0, server_default="0")
+    leaderboard_rank = Column(Integer, nullable=True)
+    badge_flags = Column(Integer, nullable=False, default=0, server_default="0")
+    confirmed_event_slug = Column(String(100), nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+
+
 class LeadNote(Base):
     __tablename__ = "lead_notes"
 
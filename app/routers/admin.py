@@ -1,25 +1,42 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+import io
+from datetime import date, datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_db, get_read_db, read_session_factory
+from app.instrumentation import InstrumentedTemplates, query_budget
 from app.models.models import User, Lead, LeadNote, LeadStatus, UserRole, LeadAdminTask, LossReason, EventoAsistencia
 from app.dependencies import get_current_user
 from app.services.auth_service import hash_password
 from app.services.assignment_service import assign_pending_leads, get_next_advisor
+from app.services.lead_service import AdminLeadItem, admin_lead_rows, filter_leads, notes_by_lead, tasks_by_lead
+from app.services.import_service import import_leads, read_csv_rows_off_loop
+from app.services.export_service import EXPORT_HEADER, export_batches, lead_export_query, stream_csv
+from app.services.xlsx_stream import CONTENT_TYPE as XLSX_CONTENT_TYPE, stream_xlsx
+from app.routers.api import parse_statuses
+from app.metrics import record_leads_assigned
+from app.services.events import publish_leads_assigned
+from app.services.project_service import PROJECTS, top_projects as top_projects_by_leads
+from app.services.commission_service import commission_totals, record_commission_change
+from app.services.referrer_stats_service import sync_referrer_stats
+from app.services.rollup_service import DIMENSIONS, RollupTotals, daily_series, rollup_totals
+from app.services.status_history_service import (
+    StatusChangeBatch, merge_by_stage, summarize, velocity_histograms,
+)
 from app.utils import generate_referral_code
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-templates = Jinja2Templates(directory="templates")
+templates = InstrumentedTemplates(directory="templates")
 
 
 @router.get("", response_class=HTMLResponse)
+@query_budget(17)
 async def admin_dashboard(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     if current_user.role != UserRole.ADMIN:
@@ -50,95 +67,51 @@ async def admin_dashboard(
     )
     advisors = result.scalars().all()
 
-    from datetime import timedelta
-    # Advisor performance
+    # Advisor performance (rollups diarios por asesor, sin recorrer leads): las reasignaciones
+    # mueven created/won/lost al nuevo asesor, así que son los leads que cada uno tiene hoy
+    by_advisor = await rollup_totals(db, "advisor")
     advisor_performance = {}
     for advisor in advisors:
-        result = await db.execute(
-            select(Lead.status, func.count(Lead.id))
-            .where(Lead.advisor_id == advisor.id)
-            .group_by(Lead.status)
-        )
-        status_counts = result.all()
-        
-        perf = {"total": 0, "ganados": 0, "perdidos": 0, "en_proceso": 0}
-        for status, count in status_counts:
-            perf["total"] += count
-            if status in (LeadStatus.GANADA):
-                perf["ganados"] += count
-            elif status == LeadStatus.PERDIDA:
-                perf["perdidos"] += count
-            else:
-                perf["en_proceso"] += count
-                
-        advisor_performance[advisor.id] = perf
-
-    # Weekly Leads
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_leads = (await db.execute(
-        select(func.count(Lead.id)).where(Lead.created_at >= seven_days_ago)
-    )).scalar() or 0
-
-    # Top Projects
-    projects_result = await db.execute(
-        select(Lead.notes_public, func.count(Lead.id).label('count'))
-        .where(Lead.notes_public != None, Lead.notes_public != "")
-        .group_by(Lead.notes_public)
-        .order_by(func.count(Lead.id).desc())
-        .limit(3)
-    )
-    top_projects = [{"name": row[0], "count": row[1]} for row in projects_result.all()]
-
-    # Leads list
-    result = await db.execute(
-        select(Lead).order_by(Lead.created_at.desc())
-    )
-    leads = result.scalars().all()
-
-    # For leads, get referrer, advisor names, and tasks
+        totals = by_advisor.get(str(advisor.id), RollupTotals())
+        advisor_performance[advisor.id] = {
+            "total": totals.created,
+            "ganados": totals.won,
+            "perdidos": totals.lost,
+            "en_proceso": max(totals.created - totals.won - totals.lost, 0),
+        }
+
+    # Weekly Leads (hoy y los 6 días anteriores)
+    today = datetime.utcnow().date()
+    recent_leads = (await rollup_totals(db, "all", since=today - timedelta(days=6))).get("", RollupTotals()).created
+
+    # Top Projects (contadores por proyecto, sin recorrer leads)
+    top_projects = [{"name": p.name, "count": p.count} for p in await top_projects_by_leads(db)]
+
+    # Leads list (proyección; la entidad completa solo en vistas de detalle)
+    leads = await admin_lead_rows(db)
+
+    # For leads, get referrer, advisor names (from the users already loaded) and tasks
+    users_by_id = {u.id: u for u in users}
+    lead_tasks = await tasks_by_lead(db, [lead.id for lead in leads])
     lead_details = []
     for lead in leads:
         referrer_name = ""
         advisor_name = ""
-        if lead.referrer_id:
-            r = (await db.execute(select(User).where(User.id == lead.referrer_id))).scalar_one_or_none()
-            if r:
-                referrer_name = f"{r.name} {r.last_name}"
-        if lead.advisor_id:
-            a = (await db.execute(select(User).where(User.id == lead.advisor_id))).scalar_one_or_none()
-            if a:
-                advisor_name = f"{a.name} {a.last_name}"
-                
-        # Get admin tasks
-        tasks_result = await db.execute(
-            select(LeadAdminTask).where(LeadAdminTask.lead_id == lead.id).order_by(LeadAdminTask.created_at.desc())
-        )
-        tasks = tasks_result.scalars().all()
-
-        lead_details.append({
-            "lead": lead,
-            "referrer_name": referrer_name,
-            "advisor_name": advisor_name,
-            "tasks": tasks,
-        })
-
-    # Financial Stats
-    com_unpaid_res = await db.execute(
-        select(func.sum(Lead.commission_amount))
-        .where(Lead.commission_amount != None)
-        .where(Lead.commission_paid == False)
-    )
-    total_unpaid = com_unpaid_res.scalar() or 0.0
-
-    com_paid_res = await db.execute(
-        select(func.sum(Lead.commission_amount))
-        .where(Lead.commission_amount != None)
-        .where(Lead.commission_paid == True)
-    )
-    total_paid = com_paid_res.scalar() or 0.0
-    # Lead Status Stats
-    total_ganados = (await db.execute(select(func.count(Lead.id)).where(Lead.status.in_([LeadStatus.GANADA])))).scalar() or 0
-    total_perdidos = (await db.execute(select(func.count(Lead.id)).where(Lead.status == LeadStatus.PERDIDA))).scalar() or 0
+        r = users_by_id.get(lead.referrer_id)
+        if r:
+            referrer_name = f"{r.name} {r.last_name}"
+        a = users_by_id.get(lead.advisor_id)
+        if a:
+            advisor_name = f"{a.name} {a.last_name}"
+        tasks = lead_tasks[lead.id]
+
+        lead_details.append(AdminLeadItem(lead, referrer_name, advisor_name, tasks))
+
+    # Financial Stats (saldo total del libro de comisiones)
+    total_unpaid, total_paid = await commission_totals(db)
+    # Lead Status Stats (ganados/perdidos netos acumulados en los rollups)
+    all_time = (await rollup_totals(db, "all")).get("", RollupTotals())
+    total_ganados, total_perdidos = all_time.won, all_time.lost
     total_en_proceso = total_leads - pending_leads - total_ganados - total_perdidos
 
     conversion_rate = (total_ganados / total_leads * 100) if total_leads > 0 else 0.0
@@ -181,6 +154,7 @@ async def admin_dashboard(
         "lead_details": lead_details,
         "all_advisors": [a for a in advisors if a.is_active],
         "loss_reasons": [lr.value for lr in LossReason],
+        "lead_statuses": [s.value for s in LeadStatus],
         "asistentes": asistentes,
     })
 
@@ -247,11 +221,41 @@ async def toggle_advisor(
     return RedirectResponse(url="/admin?tab=advisors", status_code=302)
 
 
+@router.post("/users/{user_id}/toggle")
+async def toggle_referrer(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    result = await db.execute(
+        select(User).where(User.id == user_id, User.role == UserRole.REFERIDOR)
+    )
+    referrer = result.scalar_one_or_none()
+
+    if not referrer:
+        raise HTTPException(status_code=404, detail="Referidor no encontrado")
+
+    referrer.is_active = not referrer.is_active
+    # El ranking solo cuenta referidores activos: su fila sale o vuelve y los puestos se recalculan
+    await sync_referrer_stats(db, referrer)
+    await db.commit()
+
+    return RedirectResponse(url="/admin?tab=users", status_code=302)
+
+
+# Transición que mide el tiempo al primer contacto
+FIRST_CONTACT = (LeadStatus.NUEVO, LeadStatus.CONTACTANDO)
+
+
 @router.get("/advisors/{advisor_id}/funnel", response_class=HTMLResponse)
+@query_budget(8)
 async def advisor_funnel(
     advisor_id: int,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     if current_user.role != UserRole.ADMIN:
@@ -270,25 +274,33 @@ async def advisor_funnel(
     )
     leads = result_leads.scalars().all()
 
-    lead_notes = {}
-    lead_tasks = {}
-    for lead in leads:
-        result_notes = await db.execute(
-            select(LeadNote)
-            .where(LeadNote.lead_id == lead.id)
-            .order_by(LeadNote.created_at.desc())
-        )
-        lead_notes[lead.id] = result_notes.scalars().all()
-        
-        result_tasks = await db.execute(
-            select(LeadAdminTask)
-            .where(LeadAdminTask.lead_id == lead.id)
-            .order_by(LeadAdminTask.created_at.desc())
-        )
-        lead_tasks[lead.id] = result_tasks.scalars().all()
+    lead_ids = [lead.id for lead in leads]
+    lead_notes = await notes_by_lead(db, lead_ids)
+    lead_tasks = await tasks_by_lead(db, lead_ids)
 
     statuses = [s.value for s in LeadStatus]
 
+    # Velocidad: histogramas precalculados del asesor y del equipo (sin recorrer el historial)
+    advisor_velocity = await velocity_histograms(db, advisor_id)
+    team_velocity = await velocity_histograms(db)
+    order = list(LeadStatus)
+    stage_times = merge_by_stage(advisor_velocity)
+    team_stage_times = merge_by_stage(team_velocity)
+    stage_velocity = [
+        {"status": status.value, "advisor": summarize(stage_times[status]),
+         "team": summarize(team_stage_times.get(status, {}))}
+        for status in order if status in stage_times
+    ]
+    transition_velocity = [
+        {"from": old.value, "to": new.value, "advisor": summarize(histogram),
+         "team": summarize(team_velocity.get((old, new), {}))}
+        for (old, new), histogram in sorted(
+            advisor_velocity.items(), key=lambda item: (order.index(item[0][0]), order.index(item[0][1]))
+        )
+    ]
+    first_contact = summarize(advisor_velocity.get(FIRST_CONTACT, {}))
+    team_first_contact = summarize(team_velocity.get(FIRST_CONTACT, {}))
+
     return templates.TemplateResponse(
         "admin_funnel.html",
         {
@@ -299,10 +311,80 @@ async def advisor_funnel(
             "lead_notes": lead_notes,
             "lead_tasks": lead_tasks,
             "statuses": statuses,
+            "first_contact": first_contact,
+            "team_first_contact": team_first_contact,
+            "stage_velocity": stage_velocity,
+            "transition_velocity": transition_velocity,
         },
     )
 
 
+TREND_DEFAULT_DAYS = 30
+TREND_MAX_DAYS = 366
+TREND_BREAKDOWN_LIMIT = 25
+TREND_DIMENSION_LABELS = {
+    "all": "Total",
+    "advisor": "Asesor",
+    "referrer": "Referidor",
+    "project": "Proyecto",
+    "utm_source": "Fuente (utm_source)",
+    "utm_campaign": "Campaña (utm_campaign)",
+}
+
+
+@router.get("/trends", response_class=HTMLResponse)
+@query_budget(4)
+async def trends(
+    request: Request,
+    dimension: str = "all",
+    days: int = TREND_DEFAULT_DAYS,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Daily trend and breakdown by dimension, read only from lead_daily_rollups."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail="Dimensión inválida")
+    days = min(max(days, 1), TREND_MAX_DAYS)
+
+    until = datetime.utcnow().date()
+    since = until - timedelta(days=days - 1)
+    series = await daily_series(db, since, until)
+    totals = RollupTotals(*(sum(values) for values in zip(*(t for _day, t in series)))) if series else RollupTotals()
+
+    breakdown = []
+    if dimension != "all":
+        by_key = await rollup_totals(db, dimension, since, until)
+        top = sorted(by_key.items(), key=lambda item: (-item[1].created, -item[1].won, item[0]))
+        top = top[:TREND_BREAKDOWN_LIMIT]
+        labels = {}
+        if dimension in ("advisor", "referrer"):
+            ids = [int(key) for key, _totals in top if key]
+            if ids:
+                result = await db.execute(select(User.id, User.name, User.last_name).where(User.id.in_(ids)))
+                labels = {str(user_id): f"{name} {last_name}" for user_id, name, last_name in result.all()}
+        elif dimension == "project":
+            labels = {str(p.id): p.name for p in PROJECTS}
+        empty_label = "Sin asignar" if dimension in ("advisor", "referrer", "project") else "Directo"
+        breakdown = [
+            {"label": labels.get(key, key) if key else empty_label, "totals": key_totals}
+            for key, key_totals in top
+        ]
+
+    return templates.TemplateResponse("admin_trends.html", {
+        "request": request,
+        "user": current_user,
+        "dimension": dimension,
+        "dimension_labels": TREND_DIMENSION_LABELS,
+        "days": days,
+        "since": since,
+        "until": until,
+        "series": series,
+        "totals": totals,
+        "breakdown": breakdown,
+    })
+
 
 @router.post("/leads/{lead_id}/reassign")
 async def reassign_lead(
@@ -332,16 +414,26 @@ async def reassign_lead(
         if not advisor:
             raise HTTPException(status_code=404, detail="Asesor no encontrado")
 
+        old_advisor_id = lead.advisor_id
         lead.advisor_id = new_advisor_id
         lead.assigned_at = datetime.utcnow()
+        # Rollups por asesor: el lead y sus totales pasan al nuevo asesor
+        history = StatusChangeBatch(changed_by_id=current_user.id)
+        history.advisor_change(lead, old_advisor_id)
         if lead.status == LeadStatus.PENDING_ASSIGNMENT:
             lead.status = LeadStatus.NUEVO
+            history.add(lead, LeadStatus.PENDING_ASSIGNMENT, LeadStatus.NUEVO)
+        await history.flush(db)
 
     await db.commit()
+    if new_advisor_id:
+        record_leads_assigned([new_advisor_id], source="reassign")
+        publish_leads_assigned([new_advisor_id], source="reassign", lead_ids=[lead_id])
     return RedirectResponse(url="/admin?tab=leads", status_code=302)
 
 
 @router.post("/assign-pending")
+@query_budget(10)
 async def assign_pending(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -369,7 +461,76 @@ async def toggle_lead_payment(
         raise HTTPException(status_code=404, detail="Lead no encontrado")
 
     lead.commission_paid = not lead.commission_paid
+    await record_commission_change(
+        db, lead, lead.commission_amount, not lead.commission_paid, created_by_id=current_user.id,
+    )
     await db.commit()
 
     return RedirectResponse(url="/admin?tab=leads", status_code=302)
 
+
+
+def _filter_value(value: Optional[str], parse):
+    """Query filter from an HTML form: an empty field means no filter."""
+    if not value:
+        return None
+    try:
+        return parse(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Filtro inválido")
+
+
+@router.get("/export/leads.{fmt}")
+@query_budget(2)
+async def export_leads(
+    fmt: str,
+    status: Optional[str] = None,
+    advisor_id: Optional[str] = None,
+    referrer_id: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    session_factory=Depends(read_session_factory),
+    current_user: User = Depends(get_current_user),
+):
+    """Leads and commissions as CSV or XLSX, streamed from a server-side cursor."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    if fmt not in ("csv", "xlsx"):
+        raise HTTPException(status_code=404, detail="Formato no soportado")
+
+    query = filter_leads(
+        lead_export_query(),
+        parse_statuses(status),
+        _filter_value(advisor_id, int),
+        _filter_value(referrer_id, int),
+        _filter_value(created_from, date.fromisoformat),
+        _filter_value(created_to, date.fromisoformat),
+    )
+    batches = export_batches(session_factory, query)
+    filename = f"leads-{datetime.utcnow():%Y%m%d-%H%M}.{fmt}"
+    headers = {"content-disposition": f'attachment; filename="{filename}"', "cache-control": "no-store"}
+    if fmt == "csv":
+        return StreamingResponse(stream_csv(EXPORT_HEADER, batches), media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(stream_xlsx(EXPORT_HEADER, batches, sheet_name="Leads"), media_type=XLSX_CONTENT_TYPE, headers=headers)
+
+
+@router.post("/import/leads")
+@query_budget(10)
+async def import_leads_csv(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Bulk lead import from a CSV upload; returns counts and per-row errors."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    # El archivo se lee por bloques desde el temporal del upload, en un hilo: no bloquea el event loop
+    lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        report = await import_leads(db, read_csv_rows_off_loop(lines))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="El archivo debe estar en UTF-8")
+    finally:
+        lines.detach()
+    return {**report._asdict(), "errors": [error._asdict() for error in report.errors]}
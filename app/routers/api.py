@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import hmac
+import json
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.config import get_settings
+from app.database import get_db, get_read_db
+from app.dependencies import get_current_user
+from app.instrumentation import query_budget
+from app.models.models import User, Lead, LeadStatus, UserRole
+from app.schemas.commission import CommissionPayoutRequest, CommissionPayoutResponse
+from app.schemas.lead import (
+    LeadBulkRequest, LeadBulkResponse, LeadCreateRequest, LeadResponse, LeadWebhookRequest, LeadWebhookResponse,
+)
+from app.services.commission_service import pay_commissions
+from app.services.import_service import ingest_webhook_leads
+from app.services.lead_service import bulk_update_leads, create_lead, filter_leads
+
+router = APIRouter(prefix="/api/v1", tags=["api"])
+settings = get_settings()
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+LEAD_FIELDS = tuple(LeadResponse.model_fields)
+# Columnas de Lead que respaldan cada campo directo de LeadResponse
+LEAD_COLUMNS = {name: getattr(Lead, name) for name in LEAD_FIELDS if name not in ("referrer_name", "advisor_name")}
+
+
+def encode_cursor(created_at: datetime, lead_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), lead_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, lead_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(lead_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(LEAD_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in LEAD_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(requested))
+
+
+def parse_statuses(status: Optional[str]) -> List[LeadStatus]:
+    if not status:
+        return []
+    try:
+        return [LeadStatus(s.strip()) for s in status.split(",") if s.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Estado inválido")
+
+
+def scope_leads(query, user: User):
+    """Same visibility as the HTML dashboards: admins see all, others only their own."""
+    if user.role == UserRole.ADMIN:
+        return query
+    if user.role == UserRole.ASESOR:
+        return query.where(Lead.advisor_id == user.id)
+    return query.where(Lead.referrer_id == user.id)
+
+
+def etag_response(request: Request, payload: dict) -> Response:
+    """JSON response with a content ETag; `If-None-Match` gets a 304."""
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"etag": etag, "cache-control": "private, no-cache", "vary": "Cookie, Authorization"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/leads")
+@query_budget(2)
+async def list_leads(
+    request: Request,
+    status: Optional[str] = Query(None, description="Uno o varios estados separados por coma"),
+    advisor_id: Optional[int] = None,
+    referrer_id: Optional[int] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+    fields: Optional[str] = Query(None, description="Campos de LeadResponse separados por coma"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Leads visible to the current user, newest first, paginated with a keyset cursor."""
+    selected = parse_fields(fields)
+
+    # Solo las columnas pedidas; created_at e id siempre, para el cursor
+    columns = [LEAD_COLUMNS[name].label(name) for name in selected if name in LEAD_COLUMNS]
+    columns += [Lead.created_at.label("_created_at"), Lead.id.label("_id")]
+    query = select(*columns)
+    if "referrer_name" in selected:
+        referrer = aliased(User)
+        query = query.add_columns(referrer.name.label("_r_name"), referrer.last_name.label("_r_last"))
+        query = query.outerjoin(referrer, referrer.id == Lead.referrer_id)
+    if "advisor_name" in selected:
+        advisor = aliased(User)
+        query = query.add_columns(advisor.name.label("_a_name"), advisor.last_name.label("_a_last"))
+        query = query.outerjoin(advisor, advisor.id == Lead.advisor_id)
+
+    query = filter_leads(
+        scope_leads(query, current_user), parse_statuses(status), advisor_id, referrer_id, created_from, created_to,
+    )
+    if cursor:
+        cursor_at, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Lead.created_at < cursor_at,
+            and_(Lead.created_at == cursor_at, Lead.id < cursor_id),
+        ))
+
+    result = await db.execute(query.order_by(Lead.created_at.desc(), Lead.id.desc()).limit(limit + 1))
+    rows = result.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for row in rows:
+        values = row._mapping
+        data = {name: values[name] for name in selected if name in LEAD_COLUMNS}
+        if "status" in data:
+            data["status"] = data["status"].value
+        if "referrer_name" in selected:
+            data["referrer_name"] = f"{values['_r_name']} {values['_r_last']}" if values["_r_name"] else None
+        if "advisor_name" in selected:
+            data["advisor_name"] = f"{values['_a_name']} {values['_a_last']}" if values["_a_name"] else None
+        items.append(LeadResponse.model_construct(**data).model_dump(mode="json", include=set(selected)))
+
+    next_cursor = encode_cursor(rows[-1]._created_at, rows[-1]._id) if has_more else None
+    return etag_response(request, {"items": items, "next_cursor": next_cursor})
+
+
+@router.post("/leads", status_code=201, response_model=LeadResponse)
+@query_budget(8)
+async def create_lead_api(
+    data: LeadCreateRequest,
+    db: AsyncSession = Depends(get_db),
+):
+    """JSON counterpart of the referral form (POST /leads)."""
+    lead = await create_lead(db, data)
+    return LeadResponse(
+        id=lead.id,
+        first_name=lead.first_name,
+        last_name=lead.last_name,
+        email=lead.email,
+        phone=lead.phone,
+        city=lead.city,
+        status=lead.status.value,
+        created_at=lead.created_at,
+    )
+
+
+@router.post("/leads/bulk", response_model=LeadBulkResponse)
+@query_budget(8)
+async def bulk_leads(
+    data: LeadBulkRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Status, reassignment, commission payment or task for many leads at once."""
+    if current_user.role not in (UserRole.ASESOR, UserRole.ADMIN):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    try:
+        return await bulk_update_leads(db, current_user, data)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/commissions/payouts", response_model=CommissionPayoutResponse)
+@query_budget(6)
+async def commission_payout(
+    data: CommissionPayoutRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Pay many commissions in one batch; returns one statement per referrer."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    return await pay_commissions(
+        db, lead_ids=data.lead_ids, referrer_ids=data.referrer_ids, created_by_id=current_user.id, note=data.note,
+    )
+
+
+@router.post("/webhooks/leads", response_model=LeadWebhookResponse)
+@query_budget(10)
+async def webhook_leads(
+    data: LeadWebhookRequest,
+    db: AsyncSession = Depends(get_db),
+    x_webhook_token: Optional[str] = Header(None),
+):
+    """Batch lead capture for ad platforms; each lead carries an idempotency key."""
+    if not settings.WEBHOOK_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_webhook_token or not hmac.compare_digest(x_webhook_token, settings.WEBHOOK_TOKEN):
+        raise HTTPException(status_code=401, detail="Token inválido")
+    return await ingest_webhook_leads(db, data)
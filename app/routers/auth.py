@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.database import get_db
+from app.instrumentation import InstrumentedTemplates
 from app.models.models import User, UserRole
 from app.schemas.auth import RegisterRequest, LoginRequest
 from app.services.auth_service import (
@@ -20,7 +20,7 @@ from app.config import get_settings
 limiter = Limiter(key_func=get_remote_address)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
-templates = Jinja2Templates(directory="templates")
+templates = InstrumentedTemplates(directory="templates")
 settings = get_settings()
 _secure_cookies = settings.BASE_URL.startswith("https")
 
@@ -1,20 +1,21 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.database import get_db
+from app.database import get_read_db
+from app.instrumentation import InstrumentedTemplates, query_budget
 from app.models.models import User, Lead, UserRole
 from app.dependencies import get_current_user_optional
 
 router = APIRouter(tags=["leaderboard"])
-templates = Jinja2Templates(directory="templates")
+templates = InstrumentedTemplates(directory="templates")
 
 
 @router.get("/leaderboard", response_class=HTMLResponse)
+@query_budget(2)
 async def leaderboard(
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user_optional),
 ):
     """Public leaderboard: top referrers ranked by lead count."""
@@ -0,0 +1,58 @@
+import os
+import re
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+from app.config import get_settings
+from app.staticfiles import cache_control_for, is_not_modified, partial_file_response
+
+router = APIRouter(prefix="/media", tags=["media"])
+settings = get_settings()
+
+VIDEO_NAME_RE = re.compile(r"^[\w-]+\.(mp4|webm)$")
+VIDEO_MEDIA_TYPES = {"mp4": "video/mp4", "webm": "video/webm"}
+
+
+def _lookup_video(name: str):
+    full_path = os.path.join(settings.MEDIA_VIDEOS_DIR, name)
+    try:
+        stat_result = os.stat(full_path)
+    except OSError:
+        return full_path, None
+    if not os.path.isfile(full_path):
+        return full_path, None
+    return full_path, stat_result
+
+
+@router.api_route("/videos/{name}", methods=["GET", "HEAD"])
+async def project_video(name: str, request: Request):
+    """Project videos with byte ranges (206, multi-range, If-Range), ETag and caching."""
+    match = VIDEO_NAME_RE.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Video no encontrado")
+
+    full_path, stat_result = await anyio.to_thread.run_sync(_lookup_video, name)
+    if stat_result is None:
+        raise HTTPException(status_code=404, detail="Video no encontrado")
+
+    request_headers = Headers(scope=request.scope)
+    media_type = VIDEO_MEDIA_TYPES[match.group(1)]
+    headers = {
+        "accept-ranges": "bytes",
+        "cache-control": cache_control_for(full_path, request.scope),
+    }
+    response = FileResponse(
+        full_path,
+        headers=headers,
+        media_type=media_type,
+        stat_result=stat_result,
+    )
+    if is_not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+
+    partial = partial_file_response(
+        request_headers, response, full_path, stat_result, headers, media_type,
+    )
+    return partial or response
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from app.database import engine
+from app.dependencies import get_current_user
+from app.instrumentation import query_budget
+from app.metrics import CONTENT_TYPE, collect, render, sample_pool
+from app.models.models import User, UserRole
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+@query_budget(1)
+async def metrics(current_user: User = Depends(get_current_user)):
+    """Prometheus metrics of every worker. For scrapers without a session use the exporter port."""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Solo administradores")
+
+    sample_pool(engine)
+    return Response(render(collect()), media_type=CONTENT_TYPE)
@@ -1,15 +1,15 @@
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.instrumentation import InstrumentedTemplates
 from app.models.models import User
 from app.dependencies import get_current_user
 from app.services.auth_service import hash_password, verify_password
 
 router = APIRouter(prefix="/perfil", tags=["perfil"])
-templates = Jinja2Templates(directory="templates")
+templates = InstrumentedTemplates(directory="templates")
 
 
 @router.get("", response_class=HTMLResponse)
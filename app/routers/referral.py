@@ -1,53 +1,57 @@
-from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.models import User, Lead, LeadStatus, UserRole
-from app.services.assignment_service import get_next_advisor
+from app.instrumentation import InstrumentedTemplates, query_budget
+from app.models.models import User, UserRole
+from app.schemas.lead import LeadCreateRequest
+from app.services.lead_service import create_lead as create_lead_record
+from app.services.page_cache import cached_page, page_cache_key, store_page
+from app.services.referral_cache import resolve_referral_code
 
 router = APIRouter(tags=["referral"])
-templates = Jinja2Templates(directory="templates")
+templates = InstrumentedTemplates(directory="templates")
+
+UTM_PARAMS = ("utm_source", "utm_medium", "utm_campaign", "utm_content")
 
 
 @router.get("/r/{code}", response_class=HTMLResponse)
+@query_budget(1)
 async def referral_landing(
     request: Request,
     code: str,
     db: AsyncSession = Depends(get_db),
 ):
     """Landing page for referral link. Sets referral_code cookie."""
-    result = await db.execute(
-        select(User).where(User.referral_code == code, User.is_active == True)
-    )
-    referrer = result.scalar_one_or_none()
+    cache_key = page_cache_key(request, "referral_landing", code, query_params=UTM_PARAMS)
+    response = cached_page(cache_key)
 
-    referrer_name = None
-    if referrer:
-        referrer_name = f"{referrer.name} {referrer.last_name}"
+    if response is None:
+        referrer = await resolve_referral_code(db, code)
 
-    # Get UTM params
-    utm = {
-        "utm_source": request.query_params.get("utm_source", ""),
-        "utm_medium": request.query_params.get("utm_medium", ""),
-        "utm_campaign": request.query_params.get("utm_campaign", ""),
-        "utm_content": request.query_params.get("utm_content", ""),
-    }
+        referrer_name = None
+        if referrer and referrer.is_active:
+            referrer_name = referrer.display_name
 
-    response = templates.TemplateResponse("referral_landing.html", {
-        "request": request,
-        "referral_code": code,
-        "referrer_name": referrer_name,
-        "utm": utm,
-    })
-    # Set cookie to persist referral code
+        # Get UTM params
+        utm = {name: request.query_params.get(name, "") for name in UTM_PARAMS}
+
+        response = templates.TemplateResponse("referral_landing.html", {
+            "request": request,
+            "referral_code": code,
+            "referrer_name": referrer_name,
+            "utm": utm,
+        })
+        store_page(cache_key, response)
+
+    # Set cookie to persist referral code (per response, also on cache hits)
     response.set_cookie("referral_code", code, max_age=86400 * 30, samesite="lax")
     return response
 
 
 @router.post("/leads")
+@query_budget(8)
 async def create_lead(
     request: Request,
     db: AsyncSession = Depends(get_db),
@@ -89,38 +93,12 @@ async def create_lead(
             },
         })
 
-    # Find referrer
-    referrer_id = None
-    if referral_code:
-        result = await db.execute(
-            select(User).where(User.referral_code == referral_code)
-        )
-        referrer = result.scalar_one_or_none()
-        if referrer:
-            referrer_id = referrer.id
-
-    # Assign advisor via round-robin
-    advisor_id = await get_next_advisor(db)
-    now = datetime.utcnow()
-
-    lead = Lead(
-        first_name=first_name,
-        last_name=last_name,
-        email=email,
-        phone=phone,
-        city=city,
-        notes_public=notes_public,
-        referrer_id=referrer_id,
-        advisor_id=advisor_id,
-        assigned_at=now if advisor_id else None,
-        status=LeadStatus.NUEVO if advisor_id else LeadStatus.PENDING_ASSIGNMENT,
-        utm_source=utm_source,
-        utm_medium=utm_medium,
-        utm_campaign=utm_campaign,
-        utm_content=utm_content,
-    )
-    db.add(lead)
-    await db.commit()
+    # Ya validado arriba con las reglas del formulario
+    await create_lead_record(db, LeadCreateRequest.model_construct(
+        first_name=first_name, last_name=last_name, email=email, phone=phone, city=city,
+        notes_public=notes_public, referral_code=referral_code or None,
+        utm_source=utm_source, utm_medium=utm_medium, utm_campaign=utm_campaign, utm_content=utm_content,
+    ))
 
     return templates.TemplateResponse("lead_success.html", {
         "request": request,
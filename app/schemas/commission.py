@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+
+PAYOUT_MAX_IDS = 500
+
+
+class CommissionPayoutRequest(BaseModel):
+    """Pay the unpaid commissions of the given leads, or of every lead of the given referrers."""
+    lead_ids: Optional[List[int]] = Field(None, min_length=1, max_length=PAYOUT_MAX_IDS)
+    referrer_ids: Optional[List[int]] = Field(None, min_length=1, max_length=PAYOUT_MAX_IDS)
+    note: Optional[str] = Field(None, max_length=255)
+
+    @model_validator(mode="after")
+    def check_scope(self):
+        if (self.lead_ids is None) == (self.referrer_ids is None):
+            raise ValueError("Indique lead_ids o referrer_ids")
+        return self
+
+
+class PayoutStatementLine(BaseModel):
+    lead_id: int
+    lead_name: str
+    amount: float
+
+
+class PayoutStatement(BaseModel):
+    """What one referrer was paid in a payout, with their balances afterwards."""
+    referrer_id: Optional[int] = None
+    referrer_name: str
+    lead_count: int
+    total: float
+    unpaid_balance: float
+    paid_balance: float
+    lines: List[PayoutStatementLine]
+
+
+class CommissionPayoutResponse(BaseModel):
+    payout_id: Optional[int] = None
+    paid_leads: int
+    total: float
+    statements: List[PayoutStatement]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -16,6 +16,13 @@ class LeadCreateRequest(BaseModel):
     utm_campaign: Optional[str] = None
     utm_content: Optional[str] = None
 
+    @field_validator("email")
+    @classmethod
+    def normalize_email(cls, value: str) -> str:
+        # Un solo formato para todas las vías de alta (formulario, API, importación, webhook):
+        # la detección de duplicados compara el email tal cual contra el índice
+        return value.lower()
+
 
 class LeadResponse(BaseModel):
     id: int
@@ -38,3 +45,72 @@ class LeadStatusUpdate(BaseModel):
 
 class LeadNoteCreate(BaseModel):
     note: str = Field(..., min_length=1, max_length=2000)
+
+
+BULK_MAX_LEADS = 500
+
+
+class LeadBulkRequest(BaseModel):
+    """One operation applied to many leads: set_status, reassign, mark_commission_paid or add_task."""
+    lead_ids: List[int] = Field(..., min_length=1, max_length=BULK_MAX_LEADS)
+    operation: Literal["set_status", "reassign", "mark_commission_paid", "add_task"]
+    status: Optional[str] = None
+    loss_reason: Optional[str] = None
+    advisor_id: Optional[int] = None
+    task: Optional[str] = Field(None, max_length=2000)
+    due_date: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_operation_fields(self):
+        required = {"set_status": "status", "reassign": "advisor_id", "add_task": "task"}.get(self.operation)
+        if required and not getattr(self, required):
+            raise ValueError(f"{required} es obligatorio para {self.operation}")
+        return self
+
+
+class LeadBulkResult(BaseModel):
+    id: int
+    outcome: Literal["ok", "not_found", "forbidden"]
+
+
+class LeadBulkResponse(BaseModel):
+    operation: str
+    updated: int
+    results: List[LeadBulkResult]
+
+
+WEBHOOK_MAX_LEADS = 500
+
+
+class LeadWebhookItem(LeadCreateRequest):
+    """One webhook lead: the form fields plus the sender's idempotency key."""
+    idempotency_key: str = Field(..., min_length=1, max_length=255)
+
+
+class LeadWebhookRequest(BaseModel):
+    """
+    Batch of leads from an ad platform. Each lead is validated on its own
+    (an invalid lead does not reject the batch); the batch-level UTM fields
+    fill the ones a lead does not carry.
+    """
+    leads: List[Dict[str, Any]] = Field(..., min_length=1, max_length=WEBHOOK_MAX_LEADS)
+    utm_source: Optional[str] = None
+    utm_medium: Optional[str] = None
+    utm_campaign: Optional[str] = None
+    utm_content: Optional[str] = None
+
+
+class LeadWebhookResult(BaseModel):
+    index: int
+    idempotency_key: Optional[str] = None
+    outcome: Literal["created", "duplicate", "invalid"]
+    lead_id: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+
+class LeadWebhookResponse(BaseModel):
+    received: int
+    created: int
+    duplicates: int
+    invalid: int
+    results: List[LeadWebhookResult]
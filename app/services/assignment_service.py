@@ -1,13 +1,17 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.metrics import record_leads_assigned
+from app.services.events import publish_leads_assigned
+from app.services.status_history_service import StatusChangeBatch
 from app.models.models import User, UserRole, AssignmentState
 
 
-async def get_next_advisor(db: AsyncSession) -> Optional[int]:
+async def get_next_advisors(db: AsyncSession, count: int) -> List[int]:
     """
-    Round-robin assignment: pick next active advisor.
+    Round-robin assignment for `count` leads at once: returns the next `count`
+    active advisor ids (cycling) and moves the shared state forward once.
     Ensures only truly active advisors are selected by forcing a fresh query.
     """
     # Get or create assignment state
@@ -21,62 +25,48 @@ async def get_next_advisor(db: AsyncSession) -> Optional[int]:
 
     # Force fresh read: get ONLY active advisors ordered by id
     result = await db.execute(
-        select(User)
+        select(User.id)
         .where(
             User.role == UserRole.ASESOR,
             User.is_active.is_(True),
         )
         .order_by(User.id)
-        .execution_options(populate_existing=True)
     )
-    advisors = result.scalars().all()
+    advisor_ids = result.scalars().all()
 
-    if not advisors:
+    if not advisor_ids:
         # Reset state since there are no active advisors
         state.last_assigned_advisor_id = None
         state.updated_at = datetime.utcnow()
         await db.flush()
-        return None
+        return []
+
+    if count <= 0:
+        return []
 
     # Find the next advisor after last_assigned
     last_id = state.last_assigned_advisor_id
-    next_advisor = None
-
-    if last_id is None:
-        next_advisor = advisors[0]
+    if last_id in advisor_ids:
+        # Pick the next one (wrap around)
+        first = (advisor_ids.index(last_id) + 1) % len(advisor_ids)
     else:
-        # Find position of last assigned advisor in active list
-        found = False
-        for i, advisor in enumerate(advisors):
-            if advisor.id == last_id:
-                # Pick the next one (wrap around)
-                next_advisor = advisors[(i + 1) % len(advisors)]
-                found = True
-                break
-        if not found:
-            # Last assigned advisor no longer active, start from first active
-            next_advisor = advisors[0]
-
-    # Double-check: verify the selected advisor is truly active
-    verify_result = await db.execute(
-        select(User).where(
-            User.id == next_advisor.id,
-            User.role == UserRole.ASESOR,
-            User.is_active.is_(True),
-        )
-    )
-    verified = verify_result.scalar_one_or_none()
+        # Nothing assigned yet, or last assigned advisor no longer active
+        first = 0
 
-    if not verified:
-        # Selected advisor became inactive, pick the first active one
-        next_advisor = advisors[0]
+    assigned = [advisor_ids[(first + i) % len(advisor_ids)] for i in range(count)]
 
     # Update state
-    state.last_assigned_advisor_id = next_advisor.id
+    state.last_assigned_advisor_id = assigned[-1]
     state.updated_at = datetime.utcnow()
     await db.flush()
 
-    return next_advisor.id
+    return assigned
+
+
+async def get_next_advisor(db: AsyncSession) -> Optional[int]:
+    """Round-robin assignment: pick next active advisor."""
+    assigned = await get_next_advisors(db, 1)
+    return assigned[0] if assigned else None
 
 
 async def assign_pending_leads(db: AsyncSession) -> int:
@@ -84,19 +74,31 @@ async def assign_pending_leads(db: AsyncSession) -> int:
     from app.models.models import Lead, LeadStatus
 
     result = await db.execute(
-        select(Lead).where(Lead.status == LeadStatus.PENDING_ASSIGNMENT)
+        select(Lead)
+        .where(Lead.status == LeadStatus.PENDING_ASSIGNMENT)
+        .order_by(Lead.id)
     )
     pending_leads = result.scalars().all()
 
+    # One round-robin step for the whole batch instead of one per lead
+    advisor_ids = await get_next_advisors(db, len(pending_leads)) if pending_leads else []
+    now = datetime.utcnow()
+
+    history = StatusChangeBatch(at=now)
     assigned_count = 0
-    for lead in pending_leads:
-        advisor_id = await get_next_advisor(db)
-        if advisor_id is None:
-            break
+    for lead, advisor_id in zip(pending_leads, advisor_ids):
+        old_advisor_id = lead.advisor_id
         lead.advisor_id = advisor_id
-        lead.assigned_at = datetime.utcnow()
+        lead.assigned_at = now
         lead.status = LeadStatus.NUEVO
+        history.advisor_change(lead, old_advisor_id)
+        history.add(lead, LeadStatus.PENDING_ASSIGNMENT, LeadStatus.NUEVO)
         assigned_count += 1
 
+    await history.flush(db)
     await db.commit()
+    record_leads_assigned(advisor_ids[:assigned_count], source="pending")
+    publish_leads_assigned(
+        advisor_ids[:assigned_count], source="pending", lead_ids=[lead.id for lead in pending_leads[:assigned_count]],
+    )
     return assigned_count
@@ -0,0 +1,252 @@
+"""
+Commission ledger (commission_ledger) and running balances (commission_balances).
+
+Every change to a lead's commission amount or paid flag is booked as a
+ledger entry in the same transaction as the change. A LedgerBatch writes its
+entries with two statements: one upsert of the balance rows (the referrer's
+and the company total, RETURNING the new balances) and one INSERT of the
+entries, stamped with the running balances. Dashboards read a single
+balance row instead of summing leads.
+
+A lead's position is (unpaid, paid): (amount, 0) while unpaid, (0, amount)
+once paid. An entry moves it from the old position to the new one.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import CommissionBalance, CommissionLedgerEntry, CommissionPayout, Lead, User
+from app.schemas.commission import CommissionPayoutResponse, PayoutStatement, PayoutStatementLine
+
+# Diferencias menores se consideran redondeo de floats
+AMOUNT_TOLERANCE = 0.005
+NO_REFERRER = 0
+
+
+class CommissionTotals(NamedTuple):
+    unpaid: float = 0.0
+    paid: float = 0.0
+
+
+def position(amount: Optional[float], paid: bool) -> CommissionTotals:
+    amount = amount or 0.0
+    return CommissionTotals(0.0, amount) if paid else CommissionTotals(amount, 0.0)
+
+
+def _entry_kind(old_amount: Optional[float], old_paid: bool, new_amount: Optional[float], new_paid: bool) -> str:
+    if old_paid != new_paid and (old_amount or new_amount):
+        return "payout" if new_paid else "reversal"
+    return "accrual" if not old_amount else "adjustment"
+
+
+def _upsert_balances(db: AsyncSession, rows: List[dict]):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(CommissionBalance).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["scope", "referrer_id"],
+        set_={
+            "unpaid": CommissionBalance.unpaid + stmt.excluded.unpaid,
+            "paid": CommissionBalance.paid + stmt.excluded.paid,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ).returning(CommissionBalance.scope, CommissionBalance.referrer_id, CommissionBalance.unpaid, CommissionBalance.paid)
+
+
+class LedgerBatch:
+    """Ledger entries of one transaction; flush() before its commit."""
+
+    def __init__(self, at: Optional[datetime] = None, created_by_id: Optional[int] = None,
+                 payout_id: Optional[int] = None):
+        self.at = at or datetime.utcnow()
+        self.created_by_id = created_by_id
+        self.payout_id = payout_id
+        self._entries: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, lead_id: int, referrer_id: Optional[int], kind: str, unpaid_delta: float, paid_delta: float) -> None:
+        if abs(unpaid_delta) < AMOUNT_TOLERANCE and abs(paid_delta) < AMOUNT_TOLERANCE:
+            return
+        self._entries.append({
+            "lead_id": lead_id, "referrer_id": referrer_id, "kind": kind,
+            "unpaid_delta": unpaid_delta, "paid_delta": paid_delta,
+        })
+
+    def change(self, lead_id: int, referrer_id: Optional[int], old_amount: Optional[float], old_paid: bool,
+               new_amount: Optional[float], new_paid: bool) -> None:
+        old, new = position(old_amount, old_paid), position(new_amount, new_paid)
+        self.add(
+            lead_id, referrer_id, _entry_kind(old_amount, old_paid, new_amount, new_paid),
+            new.unpaid - old.unpaid, new.paid - old.paid,
+        )
+
+    async def flush(self, db: AsyncSession) -> Dict[int, CommissionTotals]:
+        """Write the entries; returns the referrers' balances after them (NO_REFERRER for leads without one)."""
+        if not self._entries:
+            return {}
+        deltas: Dict[Tuple[str, int], List[float]] = {}
+        for entry in self._entries:
+            for key in (("referrer", entry["referrer_id"] or NO_REFERRER), ("total", NO_REFERRER)):
+                row = deltas.setdefault(key, [0.0, 0.0])
+                row[0] += entry["unpaid_delta"]
+                row[1] += entry["paid_delta"]
+        result = await db.execute(_upsert_balances(db, [
+            {"scope": scope, "referrer_id": referrer_id, "unpaid": unpaid, "paid": paid, "updated_at": self.at}
+            for (scope, referrer_id), (unpaid, paid) in deltas.items()
+        ]))
+        balances = {
+            row.referrer_id: CommissionTotals(row.unpaid, row.paid) for row in result.all() if row.scope == "referrer"
+        }
+
+        # Saldo corrido: se parte del saldo anterior al lote y se acumula entrada por entrada
+        running = {
+            referrer_id: [balance.unpaid - deltas[("referrer", referrer_id)][0],
+                          balance.paid - deltas[("referrer", referrer_id)][1]]
+            for referrer_id, balance in balances.items()
+        }
+        for entry in self._entries:
+            balance = running[entry["referrer_id"] or NO_REFERRER]
+            balance[0] += entry["unpaid_delta"]
+            balance[1] += entry["paid_delta"]
+            entry.update(
+                unpaid_balance=balance[0], paid_balance=balance[1], payout_id=self.payout_id,
+                created_by_id=self.created_by_id, at=self.at,
+            )
+        # render_nulls: entradas con y sin referidor/pago en el mismo INSERT
+        await db.execute(insert(CommissionLedgerEntry).execution_options(render_nulls=True), self._entries)
+        self._entries = []
+        return balances
+
+
+async def record_commission_change(
+    db: AsyncSession, lead: Lead, old_amount: Optional[float], old_paid: bool, created_by_id: Optional[int] = None,
+) -> None:
+    ledger = LedgerBatch(created_by_id=created_by_id)
+    ledger.change(lead.id, lead.referrer_id, old_amount, old_paid, lead.commission_amount, lead.commission_paid)
+    await ledger.flush(db)
+
+
+# --- Lectura -----------------------------------------------------------------
+
+async def commission_totals(db: AsyncSession, referrer_id: Optional[int] = None) -> CommissionTotals:
+    """Unpaid and paid commission of one referrer, or of the company when referrer_id is None."""
+    scope, key = ("total", NO_REFERRER) if referrer_id is None else ("referrer", referrer_id)
+    result = await db.execute(
+        select(CommissionBalance.unpaid, CommissionBalance.paid)
+        .where(CommissionBalance.scope == scope, CommissionBalance.referrer_id == key)
+    )
+    row = result.one_or_none()
+    return CommissionTotals(*row) if row else CommissionTotals()
+
+
+# --- Pagos por lote -------------------------------------------------------------
+
+async def book_payout(
+    db: AsyncSession,
+    lead_ids: Optional[Iterable[int]] = None,
+    referrer_ids: Optional[Iterable[int]] = None,
+    created_by_id: Optional[int] = None,
+    note: Optional[str] = None,
+) -> CommissionPayoutResponse:
+    """
+    Mark the unpaid commissions of `lead_ids` (or of every lead of
+    `referrer_ids`) paid with one UPDATE and book them; the caller commits.
+    Leads already paid or without an amount are left out.
+    """
+    query = (
+        update(Lead)
+        .where(Lead.commission_paid == False, Lead.commission_amount.isnot(None), Lead.commission_amount != 0)  # noqa: E712
+        .values(commission_paid=True)
+        .returning(Lead.id, Lead.referrer_id, Lead.commission_amount, Lead.first_name, Lead.last_name)
+        .execution_options(synchronize_session=False)
+    )
+    if lead_ids is not None:
+        query = query.where(Lead.id.in_(list(lead_ids)))
+    if referrer_ids is not None:
+        query = query.where(Lead.referrer_id.in_(list(referrer_ids)))
+    paid = sorted((await db.execute(query)).all(), key=lambda row: row.id)
+    if not paid:
+        return CommissionPayoutResponse(paid_leads=0, total=0.0, statements=[])
+
+    total = sum(row.commission_amount for row in paid)
+    payout = CommissionPayout(created_by_id=created_by_id, lead_count=len(paid), total=total, note=note)
+    db.add(payout)
+    await db.flush()
+
+    ledger = LedgerBatch(created_by_id=created_by_id, payout_id=payout.id)
+    lines: Dict[int, List[PayoutStatementLine]] = {}
+    for row in paid:
+        ledger.add(row.id, row.referrer_id, "payout", -row.commission_amount, row.commission_amount)
+        lines.setdefault(row.referrer_id or NO_REFERRER, []).append(PayoutStatementLine(
+            lead_id=row.id, lead_name=f"{row.first_name} {row.last_name}", amount=row.commission_amount,
+        ))
+    balances = await ledger.flush(db)
+
+    names = {
+        row.id: f"{row.name} {row.last_name}"
+        for row in (await db.execute(select(User.id, User.name, User.last_name).where(User.id.in_(list(lines))))).all()
+    }
+    statements = [
+        PayoutStatement(
+            referrer_id=referrer_id or None,
+            referrer_name=names.get(referrer_id, "Sin referidor"),
+            lead_count=len(referrer_lines),
+            total=sum(line.amount for line in referrer_lines),
+            unpaid_balance=balances[referrer_id].unpaid,
+            paid_balance=balances[referrer_id].paid,
+            lines=referrer_lines,
+        )
+        for referrer_id, referrer_lines in sorted(lines.items())
+    ]
+    return CommissionPayoutResponse(payout_id=payout.id, paid_leads=len(paid), total=total, statements=statements)
+
+
+async def pay_commissions(db: AsyncSession, **kwargs) -> CommissionPayoutResponse:
+    """book_payout() and commit."""
+    response = await book_payout(db, **kwargs)
+    await db.commit()
+    return response
+
+
+# --- Conciliación ---------------------------------------------------------------
+
+async def reconcile_commission_ledger(db: AsyncSession) -> Dict[str, int]:
+    """
+    Book the difference between each lead's commission and its ledger
+    position (leads from before the ledger, SQL fixes, seeds) and commit.
+    Running it again books nothing.
+    """
+    booked = {
+        row[0]: CommissionTotals(row[1], row[2])
+        for row in (await db.execute(
+            select(
+                CommissionLedgerEntry.lead_id,
+                func.sum(CommissionLedgerEntry.unpaid_delta),
+                func.sum(CommissionLedgerEntry.paid_delta),
+            ).group_by(CommissionLedgerEntry.lead_id)
+        )).all()
+    }
+    leads = (await db.execute(
+        select(Lead.id, Lead.referrer_id, Lead.commission_amount, Lead.commission_paid)
+        .where(Lead.commission_amount.isnot(None) | Lead.id.in_(select(CommissionLedgerEntry.lead_id)))
+        .order_by(Lead.id)
+    )).all()
+    ledger = LedgerBatch()
+    for lead_id, referrer_id, amount, paid in leads:
+        current, already = position(amount, paid), booked.get(lead_id, CommissionTotals())
+        ledger.add(lead_id, referrer_id, "reconciliation", current.unpaid - already.unpaid, current.paid - already.paid)
+    entries = len(ledger)
+    await ledger.flush(db)
+    await db.commit()
+    return {"leads": len(leads), "entries": entries}
+
+
+async def open_commission_ledger(db: AsyncSession) -> Optional[Dict[str, int]]:
+    """Reconcile once when the ledger is still empty (first start after the table exists)."""
+    if (await db.execute(select(CommissionLedgerEntry.id).limit(1))).first() is not None:
+        return None
+    return await reconcile_commission_ledger(db)
@@ -5,6 +5,7 @@ import httpx
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from app.config import get_settings
+from app.metrics import record_notification
 
 logger = logging.getLogger(__name__)
 
@@ -208,8 +209,10 @@ async def send_payment_date_notification(
             start_tls=not use_ssl,
         )
         logger.info(f"Email enviado a {to_email} para lead {lead_name}")
+        record_notification("email", ok=True)
     except Exception as e:
         logger.error(f"Error enviando email a {to_email}: {type(e).__name__}: {e}")
+        record_notification("email", ok=False)
 
 
 def _normalize_phone(phone: str) -> str:
@@ -260,6 +263,7 @@ async def send_whatsapp_payment_notification(
             logger.error(f"Proveedor de WhatsApp desconocido: {cfg.WHATSAPP_PROVIDER}")
     except Exception as e:
         logger.error(f"Error enviando WhatsApp a {phone}: {type(e).__name__}: {e}")
+        record_notification("whatsapp", ok=False)
 
 
 async def _send_via_ultramsg(cfg, phone: str, mensaje: str) -> None:
@@ -281,6 +285,7 @@ async def _send_via_ultramsg(cfg, phone: str, mensaje: str) -> None:
             logger.info(f"WhatsApp (UltraMsg) enviado a {phone}")
         else:
             logger.error(f"Error UltraMsg ({response.status_code}): {response.text}")
+        record_notification("whatsapp", ok=response.status_code == 200)
 
 
 async def _send_via_meta(cfg, phone: str, mensaje: str) -> None:
@@ -307,6 +312,7 @@ async def _send_via_meta(cfg, phone: str, mensaje: str) -> None:
             logger.info(f"WhatsApp (Meta) enviado a {phone}")
         else:
             logger.error(f"Error Meta API ({response.status_code}): {response.text}")
+        record_notification("whatsapp", ok=response.status_code == 200)
 
 
 async def send_password_reset_email(to_email: str, token: str) -> None:
@@ -355,5 +361,7 @@ async def send_password_reset_email(to_email: str, token: str) -> None:
             start_tls=not use_ssl,
         )
         logger.info(f"Email de reset enviado a {to_email}")
+        record_notification("email", ok=True)
     except Exception as e:
         logger.error(f"Error enviando email reset a {to_email}: {type(e).__name__}: {e}")
+        record_notification("email", ok=False)
@@ -0,0 +1,240 @@
+"""
+In-process pub/sub for the advisor Server-Sent Events feed.
+
+Each SSE connection subscribes to its advisor's channel with a bounded
+queue. A subscriber that falls behind is not allowed to grow without limit:
+its queue is emptied and it gets a single `resync` event (the page reloads).
+
+With several workers a bridge relays every publish to the other processes:
+Postgres LISTEN/NOTIFY, or Unix datagram sockets in a shared directory for
+a single host without Postgres. Messages carry the origin worker id so a
+worker does not deliver its own publishes twice.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+NOTIFY_CHANNEL = "egp_lead_events"
+# Postgres rechaza payloads de NOTIFY de 8000 bytes o más
+NOTIFY_MAX_BYTES = 7999
+# Ids por evento lead_assigned: por encima solo va el conteo (el panel solo usa count)
+EVENT_MAX_LEAD_IDS = 100
+
+
+def advisor_channel(advisor_id: int) -> str:
+    return f"advisor:{advisor_id}"
+
+
+class Subscription:
+    """One listener: a bounded queue of (event, data) tuples."""
+
+    def __init__(self, channel: str, max_queue: int):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, event: str, data: dict) -> None:
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se le pide recargar
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", {"dropped": self.dropped}))
+
+
+class EventBroker:
+    def __init__(self, max_queue: int = None):
+        self.max_queue = settings.SSE_QUEUE_SIZE if max_queue is None else max_queue
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.bridge = None
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, self.max_queue)
+        self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        if channel is not None:
+            return len(self._subscribers.get(channel, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+    def deliver(self, channel: str, event: str, data: dict) -> None:
+        """Hand an event to this process's subscribers only."""
+        for subscription in list(self._subscribers.get(channel, ())):
+            subscription.offer(event, data)
+
+    def publish(self, channel: str, event: str, data: dict) -> None:
+        """Deliver locally and relay to the other workers. Call after commit."""
+        self.deliver(channel, event, data)
+        if self.bridge is not None:
+            self.bridge.send(json.dumps({
+                "origin": self.worker_id, "channel": channel, "event": event, "data": data,
+            }, separators=(",", ":")))
+
+    def receive(self, payload: str) -> None:
+        """Message from the bridge; our own publishes were already delivered."""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") != self.worker_id:
+            self.deliver(message["channel"], message["event"], message["data"])
+
+
+broker = EventBroker()
+
+
+def publish_leads_assigned(
+    advisor_ids: Iterable[Optional[int]],
+    source: str,
+    lead_ids: Optional[Iterable[int]] = None,
+) -> None:
+    """
+    One `lead_assigned` event per advisor, with how many leads they got and,
+    up to EVENT_MAX_LEAD_IDS, which ones (larger batches send only the count).
+    """
+    grouped: Dict[int, list] = defaultdict(list)
+    lead_ids = list(lead_ids) if lead_ids is not None else None
+    for i, advisor_id in enumerate(advisor_ids):
+        if advisor_id is not None:
+            grouped[advisor_id].append(lead_ids[i] if lead_ids is not None else None)
+    for advisor_id, ids in grouped.items():
+        data = {"count": len(ids), "source": source}
+        if lead_ids is not None and len(ids) <= EVENT_MAX_LEAD_IDS:
+            data["lead_ids"] = ids
+        broker.publish(advisor_channel(advisor_id), "lead_assigned", data)
+
+
+def format_sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class PostgresBridge:
+    """LISTEN/NOTIFY on a dedicated asyncpg connection."""
+
+    def __init__(self, broker: EventBroker, dsn: str, channel: str = NOTIFY_CHANNEL):
+        self.broker = broker
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.channel = channel
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._conn = None
+        self._sender = None
+
+    async def start(self) -> None:
+        import asyncpg
+
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(self.channel, self._on_notify)
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.broker.receive(payload)
+
+    def send(self, payload: str) -> None:
+        if len(payload.encode()) > NOTIFY_MAX_BYTES:
+            # Demasiado grande para NOTIFY: los demás workers reciben un resync en su lugar
+            message = json.loads(payload)
+            payload = json.dumps({
+                "origin": message["origin"], "channel": message["channel"], "event": "resync", "data": {"dropped": 0},
+            }, separators=(",", ":"))
+        self._outbox.put_nowait(payload)
+
+    async def _send_loop(self) -> None:
+        while True:
+            payload = await self._outbox.get()
+            try:
+                await self._conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+            except Exception:
+                logger.exception("No se pudo reenviar el evento a los demás workers")
+
+    async def stop(self) -> None:
+        if self._sender is not None:
+            self._sender.cancel()
+        if self._conn is not None:
+            await self._conn.close()
+
+
+class SocketBridge:
+    """
+    Unix datagram sockets, one per worker, in a shared directory: a publish
+    is sent to every other socket found there. Single host only.
+    """
+
+    def __init__(self, broker: EventBroker, directory: str):
+        self.broker = broker
+        self.directory = directory
+        self.path = os.path.join(directory, f"{broker.worker_id}.sock")
+        self._sock = None
+
+    async def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                payload = self._sock.recv(65536)
+            except BlockingIOError:
+                return
+            self.broker.receive(payload.decode())
+
+    def send(self, payload: str) -> None:
+        data = payload.encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == self.path:
+                continue
+            try:
+                self._sock.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket de un worker que ya no existe
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Evento descartado: el worker %s no está leyendo", name)
+
+    async def stop(self) -> None:
+        if self._sock is not None:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            self._sock.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+async def start_bridge(broker: EventBroker = broker):
+    """Bridge from settings (SSE_BRIDGE: none, postgres or socket); None when disabled."""
+    if settings.SSE_BRIDGE == "postgres":
+        bridge = PostgresBridge(broker, settings.DATABASE_URL)
+    elif settings.SSE_BRIDGE == "socket":
+        bridge = SocketBridge(broker, settings.SSE_BRIDGE_DIR)
+    else:
+        return None
+    await bridge.start()
+    broker.bridge = bridge
+    return bridge
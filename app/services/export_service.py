@@ -0,0 +1,71 @@
+import csv
+import io
+from typing import AsyncIterator, Iterable, List, Sequence
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.orm import aliased
+from app.models.models import Lead, User
+
+# Inicios con los que Excel toma una celda de texto como fórmula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# Filas por lote leído del cursor del servidor y enviado al cliente
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_HEADER = [
+    "id", "nombre", "apellido", "email", "telefono", "ciudad", "proyecto", "estado", "razon_perdida",
+    "referidor", "email_referidor", "asesor", "utm_source", "utm_medium", "utm_campaign",
+    "comision", "comision_pagada", "fecha_pago", "asignado", "creado",
+]
+
+
+def lead_export_query():
+    """All export columns in one SELECT; referrer and advisor names are joined in SQL."""
+    referrer = aliased(User)
+    advisor = aliased(User)
+    return (
+        select(
+            Lead.id, Lead.first_name, Lead.last_name, Lead.email, Lead.phone, Lead.city, Lead.notes_public,
+            # Texto tal cual de la columna (nombre == valor en LeadStatus), sin pasar por el Enum
+            type_coerce(Lead.status, String), Lead.loss_reason,
+            (referrer.name + " " + referrer.last_name), referrer.email,
+            (advisor.name + " " + advisor.last_name),
+            Lead.utm_source, Lead.utm_medium, Lead.utm_campaign,
+            Lead.commission_amount, Lead.commission_paid, Lead.payment_date, Lead.assigned_at, Lead.created_at,
+        )
+        .outerjoin(referrer, referrer.id == Lead.referrer_id)
+        .outerjoin(advisor, advisor.id == Lead.advisor_id)
+        .order_by(Lead.id)
+    )
+
+
+async def export_batches(session_factory, query, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[tuple]]:
+    """
+    Rows of `query` in batches from a server-side cursor (`stream` + `yield_per`).
+
+    The session is opened here and not taken from the request: the response
+    body is produced after the request's dependencies have been closed.
+    """
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+def csv_cell(value):
+    """Text that Excel would run as a formula (names and notes come from the public form) gets a leading '."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def stream_csv(header: Sequence[str], batches: AsyncIterator[Iterable[Sequence]]) -> AsyncIterator[bytes]:
+    """CSV chunk per batch; starts with a UTF-8 BOM so Excel reads the accents."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield b"\xef\xbb\xbf" + buffer.getvalue().encode()
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode()
@@ -0,0 +1,352 @@
+import csv
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+import anyio
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.metrics import record_lead_created, record_leads_assigned
+from app.models.models import Lead, LeadStatus, User
+from app.schemas.lead import (
+    LeadCreateRequest, LeadWebhookItem, LeadWebhookRequest, LeadWebhookResponse, LeadWebhookResult,
+)
+from app.services.assignment_service import get_next_advisors
+from app.services.events import publish_leads_assigned
+from app.services.lead_service import chunked
+from app.services.project_service import increment_project_counts, match_project
+from app.services.referrer_stats_service import StatsBatch
+from app.services.rollup_service import RollupBatch
+
+# Filas por lote: una búsqueda de códigos, una de duplicados, un paso de
+# round-robin y un INSERT por lote
+IMPORT_CHUNK_SIZE = 2000
+# Tope de errores detallados en el reporte (el total siempre se cuenta)
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+# Encabezados en español (los de la exportación) aceptados como alias
+HEADER_ALIASES = {
+    "nombre": "first_name",
+    "apellido": "last_name",
+    "telefono": "phone",
+    "teléfono": "phone",
+    "ciudad": "city",
+    "proyecto": "notes_public",
+    "comentario": "notes_public",
+    "codigo_referido": "referral_code",
+    "código_referido": "referral_code",
+}
+FIELDS = tuple(LeadCreateRequest.model_fields)
+UTM_FIELDS = ("utm_source", "utm_medium", "utm_campaign", "utm_content")
+
+
+class ImportRowError(NamedTuple):
+    line: int
+    email: Optional[str]
+    errors: List[str]
+
+
+class ImportReport(NamedTuple):
+    total: int
+    imported: int
+    duplicates: int
+    pending_assignment: int
+    unknown_referral_codes: int
+    error_count: int
+    errors: List[ImportRowError]
+
+
+def read_csv_rows(lines: Iterable[str]) -> Iterator[Tuple[int, dict]]:
+    """(line number, row) for each data row, with headers mapped to LeadCreateRequest fields."""
+    reader = csv.DictReader(lines)
+    if reader.fieldnames:
+        reader.fieldnames = [
+            HEADER_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in reader.fieldnames
+        ]
+    for row in reader:
+        yield reader.line_num, {
+            key: value.strip() for key, value in row.items() if key in FIELDS and value and value.strip()
+        }
+
+
+async def read_csv_rows_off_loop(
+    lines: Iterable[str], block_size: int = IMPORT_CHUNK_SIZE,
+) -> AsyncIterator[Tuple[int, dict]]:
+    """read_csv_rows for an upload: each block is read and parsed in a worker thread, off the event loop."""
+    rows = read_csv_rows(lines)
+    while True:
+        block = await anyio.to_thread.run_sync(list, islice(rows, block_size))
+        if not block:
+            return
+        for row in block:
+            yield row
+
+
+async def _aiter_rows(rows) -> AsyncIterator[Tuple[int, dict]]:
+    if hasattr(rows, "__aiter__"):
+        async for row in rows:
+            yield row
+    else:
+        for row in rows:
+            yield row
+
+
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error.errors()]
+
+
+async def _existing(db: AsyncSession, column, values: Set[str]) -> Set[str]:
+    found = set()
+    for values_chunk in chunked(sorted(values)):
+        result = await db.execute(select(column).where(column.in_(values_chunk)))
+        found.update(result.scalars().all())
+    return found
+
+
+async def _referrer_ids(db: AsyncSession, codes: Set[str]) -> Dict[str, int]:
+    ids = {}
+    for codes_chunk in chunked(sorted(codes)):
+        result = await db.execute(select(User.referral_code, User.id).where(User.referral_code.in_(codes_chunk)))
+        ids.update(result.all())
+    return ids
+
+
+def _lead_values(data: LeadCreateRequest, referrer_id: Optional[int], advisor_id: Optional[int], now: datetime) -> dict:
+    return {
+        "first_name": data.first_name,
+        "last_name": data.last_name,
+        "email": data.email,
+        "phone": data.phone,
+        "city": data.city,
+        "notes_public": data.notes_public,
+        "project_id": match_project(data.notes_public),
+        "referrer_id": referrer_id,
+        "advisor_id": advisor_id,
+        "assigned_at": now if advisor_id else None,
+        "status": LeadStatus.NUEVO if advisor_id else LeadStatus.PENDING_ASSIGNMENT,
+        "status_changed_at": now,
+        "utm_source": data.utm_source,
+        "utm_medium": data.utm_medium,
+        "utm_campaign": data.utm_campaign,
+        "utm_content": data.utm_content,
+        "created_at": now,
+    }
+
+
+async def _book_created(db: AsyncSession, values: List[dict], now: datetime) -> None:
+    """Daily rollups and referrer counters of newly inserted leads."""
+    rollups, referrers = RollupBatch(), StatsBatch(now)
+    for value in values:
+        rollups.add(now.date(), value, created=1)
+        referrers.add(value["referrer_id"], referidos=1)
+    await rollups.flush(db)
+    await referrers.flush(db)
+
+
+async def import_leads(
+    db: AsyncSession,
+    rows: Union[Iterable[Tuple[int, dict]], AsyncIterator[Tuple[int, dict]]],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> ImportReport:
+    """
+    Validate and insert leads from parsed CSV rows (an iterable, or an async
+    iterator such as read_csv_rows_off_loop), committing once per chunk.
+
+    Rows are validated with LeadCreateRequest; duplicates (same email or phone
+    as an existing lead or an earlier row of the file) are skipped. Unknown
+    referral codes leave the lead without referrer, as the public form does.
+    """
+    counts = {"total": 0, "imported": 0, "duplicates": 0, "pending": 0, "unknown_codes": 0, "errors": 0}
+    errors: List[ImportRowError] = []
+    seen_emails: Set[str] = set()
+    seen_phones: Set[str] = set()
+
+    def add_error(line: int, email: Optional[str], messages: List[str]) -> None:
+        counts["errors"] += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append(ImportRowError(line, email, messages))
+
+    async def flush(batch: List[Tuple[int, LeadCreateRequest]]) -> None:
+        emails = {data.email for _line, data in batch}
+        phones = {data.phone for _line, data in batch if data.phone}
+        existing_emails = await _existing(db, Lead.email, emails)
+        existing_phones = await _existing(db, Lead.phone, phones) if phones else set()
+
+        accepted = []
+        for line, data in batch:
+            if (
+                data.email in existing_emails or data.email in seen_emails
+                or (data.phone and (data.phone in existing_phones or data.phone in seen_phones))
+            ):
+                counts["duplicates"] += 1
+                continue
+            seen_emails.add(data.email)
+            if data.phone:
+                seen_phones.add(data.phone)
+            accepted.append(data)
+        if not accepted:
+            return
+
+        codes = {data.referral_code for data in accepted if data.referral_code}
+        referrer_ids = await _referrer_ids(db, codes) if codes else {}
+        advisor_ids = await get_next_advisors(db, len(accepted))
+        now = datetime.utcnow()
+
+        values = []
+        for i, data in enumerate(accepted):
+            referrer_id = referrer_ids.get(data.referral_code) if data.referral_code else None
+            if data.referral_code and referrer_id is None:
+                counts["unknown_codes"] += 1
+            values.append(_lead_values(data, referrer_id, advisor_ids[i] if advisor_ids else None, now))
+        # render_nulls: filas con y sin asesor/referidor en el mismo INSERT
+        await db.execute(insert(Lead).execution_options(render_nulls=True), values)
+        await increment_project_counts(db, [v["project_id"] for v in values])
+        await _book_created(db, values, now)
+        await db.commit()
+
+        counts["imported"] += len(values)
+        for advisor_id in advisor_ids or [None] * len(values):
+            record_lead_created(advisor_id)
+        if advisor_ids:
+            record_leads_assigned(advisor_ids, source="import")
+            publish_leads_assigned(advisor_ids, source="import")
+        else:
+            counts["pending"] += len(values)
+
+    batch: List[Tuple[int, LeadCreateRequest]] = []
+    async for line, row in _aiter_rows(rows):
+        counts["total"] += 1
+        try:
+            data = LeadCreateRequest(**row)
+        except ValidationError as e:
+            add_error(line, row.get("email"), _validation_messages(e))
+            continue
+        batch.append((line, data))
+        if len(batch) >= chunk_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+
+    return ImportReport(
+        total=counts["total"],
+        imported=counts["imported"],
+        duplicates=counts["duplicates"],
+        pending_assignment=counts["pending"],
+        unknown_referral_codes=counts["unknown_codes"],
+        error_count=counts["errors"],
+        errors=errors,
+    )
+
+
+def utm_from_url(url: Optional[str]) -> dict:
+    """utm_* parameters of a landing page URL (ad platforms send the page the form was on)."""
+    if not url or not isinstance(url, str):
+        return {}
+    params = dict(parse_qsl(urlsplit(url).query))
+    return {field: params[field] for field in UTM_FIELDS if params.get(field)}
+
+
+async def _lead_ids_by_key(db: AsyncSession, keys: Set[str]) -> Dict[str, int]:
+    ids = {}
+    for keys_chunk in chunked(sorted(keys)):
+        result = await db.execute(select(Lead.idempotency_key, Lead.id).where(Lead.idempotency_key.in_(keys_chunk)))
+        ids.update(result.all())
+    return ids
+
+
+async def _ingest_webhook_leads(db: AsyncSession, data: LeadWebhookRequest) -> LeadWebhookResponse:
+    batch_utm = {field: getattr(data, field) for field in UTM_FIELDS if getattr(data, field)}
+    results: List[Optional[LeadWebhookResult]] = [None] * len(data.leads)
+    parsed: List[Tuple[int, LeadWebhookItem]] = []
+    for index, raw in enumerate(data.leads):
+        try:
+            # Prioridad: campos del lead > UTM de su landing_url > UTM del lote
+            item = LeadWebhookItem(**{**batch_utm, **utm_from_url(raw.get("landing_url")), **raw})
+        except ValidationError as e:
+            key = raw.get("idempotency_key")
+            results[index] = LeadWebhookResult(
+                index=index, idempotency_key=key if isinstance(key, str) else None,
+                outcome="invalid", errors=_validation_messages(e),
+            )
+            continue
+        parsed.append((index, item))
+
+    # Una sola consulta basta para reconocer un lote reenviado
+    existing = await _lead_ids_by_key(db, {item.idempotency_key for _index, item in parsed}) if parsed else {}
+    new: Dict[str, Tuple[int, LeadWebhookItem]] = {}
+    repeated: List[Tuple[int, str]] = []
+    for index, item in parsed:
+        key = item.idempotency_key
+        if key in existing or key in new:
+            repeated.append((index, key))
+        else:
+            new[key] = (index, item)
+
+    created_ids: Dict[str, int] = {}
+    advisor_ids: List[int] = []
+    if new:
+        codes = {item.referral_code for _index, item in new.values() if item.referral_code}
+        referrer_ids = await _referrer_ids(db, codes) if codes else {}
+        advisor_ids = await get_next_advisors(db, len(new))
+        now = datetime.utcnow()
+        values = [
+            {
+                **_lead_values(
+                    item,
+                    referrer_ids.get(item.referral_code) if item.referral_code else None,
+                    advisor_ids[i] if advisor_ids else None,
+                    now,
+                ),
+                "idempotency_key": key,
+            }
+            for i, (key, (_index, item)) in enumerate(new.items())
+        ]
+        # Índice único: una entrega concurrente del mismo lote falla aquí y se revierte completa
+        await db.execute(insert(Lead).execution_options(render_nulls=True), values)
+        created_ids = await _lead_ids_by_key(db, set(new))
+        await increment_project_counts(db, [v["project_id"] for v in values])
+        await _book_created(db, values, now)
+        await db.commit()
+
+        for advisor_id in advisor_ids or [None] * len(new):
+            record_lead_created(advisor_id)
+        if advisor_ids:
+            record_leads_assigned(advisor_ids, source="webhook")
+            # En el orden de inserción, que es el de advisor_ids (created_ids sigue el del SELECT)
+            publish_leads_assigned(advisor_ids, source="webhook", lead_ids=[created_ids[key] for key in new])
+
+    for key, (index, _item) in new.items():
+        results[index] = LeadWebhookResult(
+            index=index, idempotency_key=key, outcome="created", lead_id=created_ids[key],
+        )
+    for index, key in repeated:
+        results[index] = LeadWebhookResult(
+            index=index, idempotency_key=key, outcome="duplicate", lead_id=existing.get(key, created_ids.get(key)),
+        )
+
+    return LeadWebhookResponse(
+        received=len(results),
+        created=len(new),
+        duplicates=len(repeated),
+        invalid=len(results) - len(parsed),
+        results=results,
+    )
+
+
+async def ingest_webhook_leads(db: AsyncSession, data: LeadWebhookRequest) -> LeadWebhookResponse:
+    """
+    Insert a webhook batch in one transaction, with one outcome per lead.
+
+    Leads whose idempotency key was already received come back as
+    `duplicate` with the original lead id, so a redelivered batch costs one
+    SELECT and no writes. If a concurrent delivery of the same keys commits
+    first, the unique index rejects ours and the batch is re-evaluated.
+    """
+    try:
+        return await _ingest_webhook_leads(db, data)
+    except IntegrityError:
+        await db.rollback()
+        return await _ingest_webhook_leads(db, data)
@@ -0,0 +1,358 @@
+from datetime import date, datetime, time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import case, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.metrics import record_lead_created, record_leads_assigned
+from app.models.models import Lead, LeadNote, LeadAdminTask, LeadStatus, LossReason, User, UserRole
+from app.schemas.lead import LeadBulkRequest, LeadBulkResponse, LeadBulkResult, LeadCreateRequest
+from app.services.assignment_service import get_next_advisor
+from app.services.commission_service import book_payout
+from app.services.events import publish_leads_assigned
+from app.services.project_service import increment_project_counts, match_project
+from app.services.referrer_stats_service import StatsBatch
+from app.services.rollup_service import RollupBatch
+from app.services.status_history_service import StatusChangeBatch
+from app.services.referral_cache import resolve_referral_code
+
+# Tope de parámetros por IN (...) para no chocar con el límite de SQLite
+IN_CHUNK_SIZE = 900
+
+
+def chunked(ids: List[int], size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+async def notes_by_lead(db: AsyncSession, lead_ids: Iterable[int]) -> Dict[int, List[LeadNote]]:
+    """Notes of several leads (one query per IN_CHUNK_SIZE ids), newest first, keyed by lead id."""
+    lead_ids = list(lead_ids)
+    grouped = {lead_id: [] for lead_id in lead_ids}
+    for ids in chunked(lead_ids):
+        result = await db.execute(
+            select(LeadNote)
+            .where(LeadNote.lead_id.in_(ids))
+            .order_by(LeadNote.created_at.desc(), LeadNote.id.desc())
+        )
+        for note in result.scalars().all():
+            grouped[note.lead_id].append(note)
+    return grouped
+
+
+async def tasks_by_lead(db: AsyncSession, lead_ids: Iterable[int]) -> Dict[int, List[LeadAdminTask]]:
+    """Tasks of several leads (one query per IN_CHUNK_SIZE ids), newest first, keyed by lead id."""
+    lead_ids = list(lead_ids)
+    grouped = {lead_id: [] for lead_id in lead_ids}
+    for ids in chunked(lead_ids):
+        result = await db.execute(
+            select(LeadAdminTask)
+            .where(LeadAdminTask.lead_id.in_(ids))
+            .order_by(LeadAdminTask.created_at.desc(), LeadAdminTask.id.desc())
+        )
+        for task in result.scalars().all():
+            grouped[task.lead_id].append(task)
+    return grouped
+
+
+def filter_leads(
+    query,
+    statuses: Optional[List[LeadStatus]] = None,
+    advisor_id: Optional[int] = None,
+    referrer_id: Optional[int] = None,
+    created_from: Optional[date] = None,
+    created_to: Optional[date] = None,
+):
+    """Lead list filters shared by the JSON API and the admin export (dates inclusive)."""
+    if statuses:
+        query = query.where(Lead.status.in_(statuses))
+    if advisor_id is not None:
+        query = query.where(Lead.advisor_id == advisor_id)
+    if referrer_id is not None:
+        query = query.where(Lead.referrer_id == referrer_id)
+    if created_from is not None:
+        query = query.where(Lead.created_at >= datetime.combine(created_from, time.min))
+    if created_to is not None:
+        query = query.where(Lead.created_at <= datetime.combine(created_to, time.max))
+    return query
+
+
+async def create_lead(db: AsyncSession, data: LeadCreateRequest) -> Lead:
+    """Create and commit a lead: resolve the referral code, assign an advisor round-robin."""
+    referrer_id = None
+    if data.referral_code:
+        referrer = await resolve_referral_code(db, data.referral_code)
+        if referrer:
+            referrer_id = referrer.id
+
+    advisor_id = await get_next_advisor(db)
+    project_id = match_project(data.notes_public)
+    now = datetime.utcnow()
+
+    lead = Lead(
+        first_name=data.first_name,
+        last_name=data.last_name,
+        email=data.email,
+        phone=data.phone,
+        city=data.city,
+        notes_public=data.notes_public,
+        project_id=project_id,
+        referrer_id=referrer_id,
+        advisor_id=advisor_id,
+        assigned_at=now if advisor_id else None,
+        status=LeadStatus.NUEVO if advisor_id else LeadStatus.PENDING_ASSIGNMENT,
+        status_changed_at=now,
+        utm_source=data.utm_source,
+        utm_medium=data.utm_medium,
+        utm_campaign=data.utm_campaign,
+        utm_content=data.utm_content,
+        created_at=now,
+    )
+    db.add(lead)
+    await increment_project_counts(db, [project_id])
+    rollups = RollupBatch()
+    rollups.add(now.date(), lead, created=1)
+    await rollups.flush(db)
+    referrers = StatsBatch(now)
+    referrers.add(referrer_id, referidos=1)
+    await referrers.flush(db)
+    await db.commit()
+    record_lead_created(advisor_id)
+    publish_leads_assigned([advisor_id], source="new", lead_ids=[lead.id])
+    if advisor_id:
+        record_leads_assigned([advisor_id], source="round_robin")
+    return lead
+
+
+async def normalize_lead_emails(db: AsyncSession) -> int:
+    """Lowercase the emails stored before LeadCreateRequest normalized them; commits, returns the count."""
+    result = await db.execute(
+        update(Lead).where(Lead.email != func.lower(Lead.email)).values(email=func.lower(Lead.email))
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# --- Proyecciones para las vistas de lista ------------------------------------
+# Tuplas con nombre en lugar de entidades Lead: sin identity map, sin estado
+# ORM por fila y sin traer columnas que la lista no muestra (UTM, etc.).
+
+class ReferrerSummary(NamedTuple):
+    name: str
+    last_name: str
+    email: str
+
+
+class AsesorLeadCard(NamedTuple):
+    """One card of the advisor kanban."""
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: Optional[str]
+    notes_public: Optional[str]
+    status: LeadStatus
+    loss_reason: Optional[str]
+    payment_date: Optional[date]
+    commission_amount: Optional[float]
+    commission_paid: bool
+    created_at: datetime
+    referrer: Optional[ReferrerSummary]
+
+
+class ReferidorLeadRow(NamedTuple):
+    """One row of the referrer's own lead list."""
+    id: int
+    first_name: str
+    last_name: str
+    status: LeadStatus
+    loss_reason: Optional[str]
+    payment_date: Optional[date]
+    commission_amount: Optional[float]
+    created_at: datetime
+
+
+class AdminLeadRow(NamedTuple):
+    """One row of the admin leads tab."""
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: Optional[str]
+    city: Optional[str]
+    notes_public: Optional[str]
+    status: LeadStatus
+    loss_reason: Optional[str]
+    commission_amount: Optional[float]
+    commission_paid: bool
+    created_at: datetime
+    advisor_id: Optional[int]
+    referrer_id: Optional[int]
+
+
+class AdminLeadItem(NamedTuple):
+    lead: AdminLeadRow
+    referrer_name: str
+    advisor_name: str
+    tasks: list
+
+
+def lead_columns(view) -> list:
+    """The Lead columns a view model is built from, in field order."""
+    return [getattr(Lead, name) for name in view._fields if hasattr(Lead, name) and name != "referrer"]
+
+
+def _asesor_card_query():
+    referrer = aliased(User)
+    return (
+        select(*lead_columns(AsesorLeadCard), referrer.name, referrer.last_name, referrer.email)
+        .outerjoin(referrer, referrer.id == Lead.referrer_id)
+    )
+
+
+def _asesor_card(row) -> AsesorLeadCard:
+    return AsesorLeadCard(*row[:-3], ReferrerSummary(*row[-3:]) if row[-3] is not None else None)
+
+
+async def asesor_lead_card(db: AsyncSession, lead_id: int) -> Optional[AsesorLeadCard]:
+    """A single kanban card, for the partial responses of the advisor actions."""
+    row = (await db.execute(_asesor_card_query().where(Lead.id == lead_id))).first()
+    return _asesor_card(row) if row is not None else None
+
+
+async def asesor_lead_cards(db: AsyncSession, advisor_id: int, search: str = "") -> List[AsesorLeadCard]:
+    query = _asesor_card_query().where(Lead.advisor_id == advisor_id)
+    if search:
+        search_filter = f"%{search}%"
+        query = query.where(
+            (Lead.first_name.ilike(search_filter)) |
+            (Lead.last_name.ilike(search_filter)) |
+            (Lead.email.ilike(search_filter)) |
+            (Lead.phone.ilike(search_filter))
+        )
+    result = await db.execute(query.order_by(Lead.created_at.desc()))
+    return [_asesor_card(row) for row in result.all()]
+
+
+async def referidor_lead_rows(
+    db: AsyncSession, referrer_id: int, limit: Optional[int] = None, offset: int = 0,
+) -> List[ReferidorLeadRow]:
+    """The referrer's leads, newest first; one page of them when `limit` is given."""
+    query = (
+        select(*lead_columns(ReferidorLeadRow))
+        .where(Lead.referrer_id == referrer_id)
+        .order_by(Lead.created_at.desc(), Lead.id.desc())
+    )
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    result = await db.execute(query)
+    return [ReferidorLeadRow._make(row) for row in result.all()]
+
+
+async def admin_lead_rows(db: AsyncSession) -> List[AdminLeadRow]:
+    result = await db.execute(select(*lead_columns(AdminLeadRow)).order_by(Lead.created_at.desc()))
+    return [AdminLeadRow._make(row) for row in result.all()]
+
+
+def reassign_values(advisor_id: int, now: datetime) -> dict:
+    """UPDATE values moving leads to `advisor_id`; pending leads also become NUEVO."""
+    pending = Lead.status == LeadStatus.PENDING_ASSIGNMENT
+    return {
+        "advisor_id": advisor_id,
+        "assigned_at": now,
+        # El THEN con el tipo de la columna: en Postgres un VARCHAR no se mezcla con el enum leadstatus
+        "status": case((pending, literal(LeadStatus.NUEVO, Lead.status.type)), else_=Lead.status),
+        "status_changed_at": case((pending, now), else_=Lead.status_changed_at),
+    }
+
+
+async def bulk_update_leads(db: AsyncSession, user: User, data: LeadBulkRequest) -> LeadBulkResponse:
+    """
+    Apply one operation to many leads in a single transaction.
+
+    Ownership is checked for all ids in one query (advisors only touch their
+    own leads) and the change is one UPDATE/INSERT over the allowed ids.
+    Raises PermissionError for operations the role may not run and
+    ValueError for invalid arguments; nothing is written in either case.
+    """
+    if data.operation == "reassign" and user.role != UserRole.ADMIN:
+        raise PermissionError("Solo administradores")
+
+    now = datetime.utcnow()
+    values = {}
+    if data.operation == "set_status":
+        try:
+            status = LeadStatus(data.status)
+        except ValueError:
+            raise ValueError("Estado inválido")
+        loss_reason = None
+        if status == LeadStatus.PERDIDA and data.loss_reason:
+            try:
+                LossReason(data.loss_reason)
+            except ValueError:
+                raise ValueError("Razón de pérdida inválida")
+            loss_reason = data.loss_reason
+        values = {
+            "status": status,
+            "loss_reason": loss_reason,
+            "status_changed_at": case((Lead.status != status, now), else_=Lead.status_changed_at),
+        }
+    elif data.operation == "reassign":
+        advisor = await db.execute(
+            select(User.id).where(User.id == data.advisor_id, User.role == UserRole.ASESOR)
+        )
+        if advisor.scalar_one_or_none() is None:
+            raise ValueError("Asesor no encontrado")
+        values = reassign_values(data.advisor_id, now)
+
+    lead_ids = list(dict.fromkeys(data.lead_ids))
+    # Dueño, estado, entrada al estado y dimensiones de los rollups en la misma consulta
+    rows = await db.execute(
+        select(
+            Lead.id, Lead.advisor_id, Lead.status, Lead.status_changed_at, Lead.created_at,
+            Lead.referrer_id, Lead.project_id, Lead.utm_source, Lead.utm_campaign, Lead.commission_amount,
+        ).where(Lead.id.in_(lead_ids))
+    )
+    found = {row.id: row for row in rows.all()}
+    outcomes = {}
+    for lead_id in lead_ids:
+        if lead_id not in found:
+            outcomes[lead_id] = "not_found"
+        elif user.role == UserRole.ASESOR and found[lead_id].advisor_id != user.id:
+            outcomes[lead_id] = "forbidden"
+        else:
+            outcomes[lead_id] = "ok"
+    allowed = [lead_id for lead_id in lead_ids if outcomes[lead_id] == "ok"]
+
+    if allowed:
+        if data.operation == "add_task":
+            await db.execute(insert(LeadAdminTask), [
+                {"lead_id": lead_id, "task": data.task.strip(), "due_date": data.due_date} for lead_id in allowed
+            ])
+        elif data.operation == "mark_commission_paid":
+            # Un solo lote de pago: UPDATE de los pendientes y asientos en el libro de comisiones
+            await book_payout(db, lead_ids=allowed, created_by_id=user.id)
+        else:
+            await db.execute(
+                update(Lead).where(Lead.id.in_(allowed)).values(**values).execution_options(synchronize_session=False)
+            )
+        history = StatusChangeBatch(at=now, changed_by_id=user.id)
+        for lead_id in allowed:
+            lead = found[lead_id]
+            if data.operation == "set_status":
+                history.add(lead, lead.status, status)
+            elif data.operation == "reassign":
+                moved = {**lead._mapping, "advisor_id": data.advisor_id}
+                history.advisor_change(moved, lead.advisor_id)
+                if lead.status == LeadStatus.PENDING_ASSIGNMENT:
+                    history.add(moved, lead.status, LeadStatus.NUEVO)
+        await history.flush(db)
+        await db.commit()
+        if data.operation == "reassign":
+            record_leads_assigned([data.advisor_id] * len(allowed), source="reassign")
+            publish_leads_assigned([data.advisor_id] * len(allowed), source="reassign", lead_ids=allowed)
+
+    return LeadBulkResponse(
+        operation=data.operation,
+        updated=len(allowed),
+        results=[LeadBulkResult(id=lead_id, outcome=outcomes[lead_id]) for lead_id in lead_ids],
+    )
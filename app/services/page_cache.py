@@ -0,0 +1,61 @@
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from app.config import get_settings
+from app.services.ttl_cache import TTLCache
+
+settings = get_settings()
+
+# Cookies que indican una sesión: con cualquiera de ellas no se usa la caché
+AUTH_COOKIES = ("access_token", "refresh_token")
+
+
+class PageCache(TTLCache):
+    """Rendered pages keyed by (route, values, auth state)."""
+
+    def invalidate(self, route: str = None) -> None:
+        """Drop every entry, or only those of `route`."""
+        if route is None:
+            super().invalidate()
+        else:
+            super().invalidate(lambda key: key[0] == route)
+
+
+page_cache = PageCache(
+    max_entries=settings.PAGE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PAGE_CACHE_TTL_SECONDS,
+)
+
+
+def page_cache_key(request: Request, route: str, *path_values, query_params: tuple = ()) -> Optional[tuple]:
+    """
+    Cache key for an anonymous request: (route, path and relevant query values,
+    auth state). Returns None when the page must not come from the cache.
+    """
+    if not settings.PAGE_CACHE_ENABLED or request.method != "GET":
+        return None
+    if any(request.cookies.get(name) for name in AUTH_COOKIES):
+        return None
+    values = path_values + tuple(request.query_params.get(name, "") for name in query_params)
+    return (route, values, "anon")
+
+
+def cached_page(key: Optional[tuple]) -> Optional[Response]:
+    """Build a response from the cached body, or None on a miss."""
+    if key is None:
+        return None
+    value = page_cache.get(key)
+    if value is None:
+        return None
+    status_code, body, media_type = value
+    response = HTMLResponse(content=body, status_code=status_code, media_type=media_type)
+    response.headers["x-page-cache"] = "hit"
+    return response
+
+
+def store_page(key: Optional[tuple], response: Response) -> Response:
+    """Cache a freshly rendered 200 response (before per-request cookies are added)."""
+    if key is not None and response.status_code == 200:
+        page_cache.set(key, (response.status_code, response.body, response.media_type))
+        response.headers["x-page-cache"] = "miss"
+    return response
@@ -0,0 +1,140 @@
+"""
+Project dimension for leads.
+
+The forms send the project as free text in `notes_public` ("Isla Baru",
+"Palma de Mallorca", "Interesada en El Nogal", ...). It is matched once, when
+the lead is created, against the six projects of home.html; the lead keeps
+the text and gets `project_id`. `projects.lead_count` is kept in the same
+transaction, so project stats never group over the leads table.
+"""
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import case, distinct, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Lead, Project
+
+
+class ProjectInfo(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    aliases: Tuple[str, ...]
+
+
+# Los seis proyectos de home.html; ids fijos para resolverlos sin consultar la base.
+# Alias normalizados (sin tildes, minúsculas), incluidas las variantes de los formularios
+PROJECTS = (
+    ProjectInfo(1, "isla-baru", "Isla Barú", ("isla baru",)),
+    ProjectInfo(2, "baru-beach", "Barú Beach", ("baru beach", "baru beach condominio")),
+    ProjectInfo(3, "el-nogal", "El Nogal", ("el nogal", "nogal")),
+    ProjectInfo(4, "palmas-mallorca", "Palmas de Mallorca", ("palmas de mallorca", "palma de mallorca", "mallorca")),
+    ProjectInfo(5, "prado-norte", "Prado Norte", ("prado norte",)),
+    ProjectInfo(6, "covenas", "Coveñas Beach Club", ("covenas beach club", "covenas")),
+)
+
+
+class ProjectCount(NamedTuple):
+    name: str
+    count: int
+
+
+def normalize(text: str) -> str:
+    """Lowercase, without accents or punctuation, single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+@lru_cache(maxsize=4096)
+def match_project(text: Optional[str]) -> Optional[int]:
+    """Project id named in `text`, or None when there is none or more than one."""
+    if not text:
+        return None
+    padded = f" {normalize(text)} "
+    found = {p.id for p in PROJECTS if any(f" {alias} " in padded for alias in p.aliases)}
+    return found.pop() if len(found) == 1 else None
+
+
+async def seed_projects(db: AsyncSession) -> int:
+    """Insert the projects that are missing; returns how many were added."""
+    existing = set((await db.execute(select(Project.id))).scalars().all())
+    missing = [p for p in PROJECTS if p.id not in existing]
+    for p in missing:
+        db.add(Project(id=p.id, slug=p.slug, name=p.name, lead_count=0))
+    if missing:
+        await db.commit()
+    return len(missing)
+
+
+async def increment_project_counts(db: AsyncSession, project_ids: Iterable[Optional[int]]) -> None:
+    """Add new leads to the per-project counters (one UPDATE); call before the lead's commit."""
+    counts = Counter(project_id for project_id in project_ids if project_id is not None)
+    if not counts:
+        return
+    await db.execute(
+        update(Project)
+        .where(Project.id.in_(list(counts)))
+        .values(lead_count=Project.lead_count + case(dict(counts), value=Project.id, else_=0))
+    )
+
+
+async def top_projects(db: AsyncSession, limit: int = 3) -> List[ProjectCount]:
+    result = await db.execute(
+        select(Project.name, Project.lead_count)
+        .where(Project.lead_count > 0)
+        .order_by(Project.lead_count.desc(), Project.name)
+        .limit(limit)
+    )
+    return [ProjectCount(name, count) for name, count in result.all()]
+
+
+async def refresh_project_counts(db: AsyncSession) -> None:
+    """Recount every project from leads.project_id (index-only COUNT per project)."""
+    await db.execute(
+        update(Project).values(
+            lead_count=select(func.count(Lead.id)).where(Lead.project_id == Project.id).scalar_subquery()
+        )
+    )
+    await db.commit()
+
+
+async def backfill_lead_projects(db: AsyncSession) -> Dict[str, int]:
+    """
+    Set `project_id` on leads created before it existed, then recount.
+
+    Works on the distinct `notes_public` values (a handful of spellings per
+    project) instead of lead by lead: one UPDATE per project, committed
+    separately so the write lock is held briefly. Safe to run again.
+    """
+    from app.services.lead_service import chunked
+
+    result = await db.execute(
+        select(distinct(Lead.notes_public)).where(Lead.project_id.is_(None), Lead.notes_public.isnot(None))
+    )
+    values = result.scalars().all()
+    by_project: Dict[int, List[str]] = {}
+    for value in values:
+        project_id = match_project(value)
+        if project_id is not None:
+            by_project.setdefault(project_id, []).append(value)
+
+    updated = 0
+    for project_id, project_values in by_project.items():
+        for values_chunk in chunked(project_values):
+            result = await db.execute(
+                update(Lead)
+                .where(Lead.project_id.is_(None), Lead.notes_public.in_(values_chunk))
+                .values(project_id=project_id)
+            )
+            updated += result.rowcount
+        await db.commit()
+
+    await refresh_project_counts(db)
+    return {
+        "values": len(values),
+        "matched_values": sum(len(v) for v in by_project.values()),
+        "leads_updated": updated,
+    }
@@ -0,0 +1,91 @@
+from typing import NamedTuple, Optional
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.config import get_settings
+from app.models.models import User
+from app.services.page_cache import page_cache
+from app.services.ttl_cache import TTLCache
+
+settings = get_settings()
+
+# Cambios en estos campos invalidan la resolución del código
+TRACKED_FIELDS = ("name", "last_name", "is_active", "referral_code")
+
+_MISSING = object()
+
+
+class ReferrerInfo(NamedTuple):
+    id: int
+    display_name: str
+    is_active: bool
+
+
+referral_cache = TTLCache(
+    max_entries=settings.REFERRAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.REFERRAL_CACHE_TTL_SECONDS,
+)
+
+
+async def resolve_referral_code(db: AsyncSession, code: str) -> Optional[ReferrerInfo]:
+    """
+    Resolve a referral code to its referrer (active or not), or None.
+    Unknown codes are cached too (for a shorter TTL) so bots probing random
+    codes do not reach the database.
+    """
+    if not code:
+        return None
+    info = referral_cache.get(code, _MISSING)
+    if info is not _MISSING:
+        return info
+
+    result = await db.execute(
+        select(User.id, User.name, User.last_name, User.is_active)
+        .where(User.referral_code == code)
+    )
+    row = result.first()
+    if row is None:
+        referral_cache.set(code, None, ttl_seconds=settings.REFERRAL_CACHE_NEGATIVE_TTL_SECONDS)
+        return None
+
+    info = ReferrerInfo(row.id, f"{row.name} {row.last_name}", row.is_active)
+    referral_cache.set(code, info)
+    return info
+
+
+def invalidate_referral_code(code: Optional[str]) -> None:
+    if code:
+        referral_cache.pop(code)
+        page_cache.invalidate("referral_landing")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_codes(session, flush_context):
+    """Remember codes whose referrer was renamed, (de)activated or created."""
+    codes = session.info.setdefault("referral_codes_changed", set())
+    for obj in session.new:
+        if isinstance(obj, User) and obj.referral_code:
+            # Puede haber una entrada negativa para un código recién registrado
+            codes.add(obj.referral_code)
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+            continue
+        old_codes = state.attrs.referral_code.history.deleted
+        codes.update(code for code in (obj.referral_code, *old_codes) if code)
+    for obj in session.deleted:
+        if isinstance(obj, User) and obj.referral_code:
+            codes.add(obj.referral_code)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_codes(session):
+    for code in session.info.pop("referral_codes_changed", ()):
+        invalidate_referral_code(code)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_codes(session):
+    session.info.pop("referral_codes_changed", None)
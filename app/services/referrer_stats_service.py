@@ -0,0 +1,318 @@
+"""
+Referrer dashboard counters (referrer_stats).
+
+Writes that create leads, move them in or out of GANADA or set their
+payment date add deltas to a StatsBatch, flushed with one upsert in the
+same transaction as the change. The upsert recomputes the badge flags from
+the new counters and returns ranked_count, so a referrer gaining or losing
+a ranked lead moves the leaderboard with one more UPDATE: the referrers it
+passes shift by one place and its own rank is recounted through the
+ranked_count index. The referrer dashboard reads one row (joined to the
+commission balance) instead of counting and ranking leads per request.
+
+Only active referrers have a row, as on the public leaderboard: the upsert
+skips anyone else, and (de)activating a referrer syncs its row and the
+ranks (sync_referrer_stats). rebuild_referrer_stats() recomputes every row
+from `leads` (scripts/refresh_referrer_stats.py), absorbing writes that
+bypass the app.
+"""
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import and_, case, delete, func, insert, literal, null, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.models.models import CommissionBalance, EventoAsistencia, Lead, LeadStatus, ReferrerStats, User, UserRole
+
+# Filas por INSERT al reconstruir (8 parámetros por fila)
+INSERT_CHUNK_ROWS = 500
+# Referidores por upsert: un SELECT por referidor unidos con UNION ALL (SQLite admite hasta 500)
+UPSERT_CHUNK_ROWS = 200
+
+
+class Badge(NamedTuple):
+    bit: int
+    icon: str          # id del símbolo en static/img/badges.svg (badge-<icon>)
+    name: str
+    desc: str
+    cls: str
+    metric: str        # "total_referidos" o "closed_count"
+    threshold: int
+    reward: Optional[str] = None
+
+
+BADGES = (
+    Badge(1, "star", "Primer Referido", "Enviaste tu primer referido", "medal-gold", "total_referidos", 1),
+    Badge(2, "flame", "5 Referidos", "¡Ya tienes 5 referidos!", "medal-orange", "total_referidos", 5),
+    Badge(4, "diamond", "10 Referidos", "¡Increíble! 10 referidos", "medal-cyan", "total_referidos", 10),
+    Badge(8, "rocket", "25 Referidos", "¡Eres un referidor élite!", "medal-purple", "total_referidos", 25,
+          "Desc. 10% Hotel El Marqués de Manga"),
+    Badge(16, "check", "Primer Cierre", "Tu primer referido se cerró", "medal-green", "closed_count", 1,
+          "Bono de $100.000 COP"),
+    Badge(32, "trophy", "Top Closer", "3 o más cierres logrados", "medal-trophy", "closed_count", 3),
+)
+
+
+def badge_flags(total_referidos: int, closed_count: int) -> int:
+    counts = {"total_referidos": total_referidos, "closed_count": closed_count}
+    return sum(badge.bit for badge in BADGES if counts[badge.metric] >= badge.threshold)
+
+
+def _badge_flags_sql(total_referidos, closed_count):
+    counts = {"total_referidos": total_referidos, "closed_count": closed_count}
+    flags = 0
+    for badge in BADGES:
+        flags = flags + case((counts[badge.metric] >= badge.threshold, badge.bit), else_=0)
+    return flags
+
+
+def badges_for(flags: int) -> List[dict]:
+    """The dashboard badge list, every badge with its unlocked state."""
+    return [
+        {"icon": badge.icon, "name": badge.name, "desc": badge.desc, "cls": badge.cls,
+         "unlocked": bool(flags & badge.bit), "reward": badge.reward}
+        for badge in BADGES
+    ]
+
+
+UPSERT_COLUMNS = ("referrer_id", "total_referidos", "closed_count", "ranked_count", "badge_flags", "updated_at")
+
+
+def _insert(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(ReferrerStats)
+
+
+def _active_referrer_rows(rows: List[dict]):
+    """
+    The rows as one SELECT per referrer (UNION ALL) that only yields active
+    REFERIDOR users, so the upsert skips anyone the leaderboard leaves out.
+    """
+    selects = [
+        select(
+            User.id,
+            *(literal(row[name], ReferrerStats.__table__.c[name].type) for name in UPSERT_COLUMNS[1:]),
+        ).where(User.id == row["referrer_id"], User.role == UserRole.REFERIDOR, User.is_active == True)  # noqa: E712
+        for row in rows
+    ]
+    return selects[0] if len(selects) == 1 else union_all(*selects)
+
+
+def _upsert_counts(db: AsyncSession, rows: List[dict]):
+    stmt = _insert(db).from_select(UPSERT_COLUMNS, _active_referrer_rows(rows))
+    total = ReferrerStats.total_referidos + stmt.excluded.total_referidos
+    closed = ReferrerStats.closed_count + stmt.excluded.closed_count
+    return stmt.on_conflict_do_update(
+        index_elements=["referrer_id"],
+        set_={
+            "total_referidos": total,
+            "closed_count": closed,
+            "ranked_count": ReferrerStats.ranked_count + stmt.excluded.ranked_count,
+            "badge_flags": _badge_flags_sql(total, closed),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ).returning(ReferrerStats.referrer_id, ReferrerStats.ranked_count)
+
+
+async def _shift_rank(db: AsyncSession, referrer_id: int, old: int, new: int) -> None:
+    """Move one referrer from `old` to `new` ranked leads; the referrers in between shift one place."""
+    low, high = sorted((old, new))
+    other = aliased(ReferrerStats)
+    higher = select(func.count()).select_from(other).where(other.ranked_count > new).scalar_subquery()
+    await db.execute(
+        update(ReferrerStats)
+        .where(or_(
+            ReferrerStats.referrer_id == referrer_id,
+            and_(ReferrerStats.ranked_count >= max(low, 1), ReferrerStats.ranked_count < high),
+        ))
+        .values(leaderboard_rank=case(
+            (ReferrerStats.referrer_id == referrer_id, higher + 1 if new > 0 else null()),
+            else_=ReferrerStats.leaderboard_rank + (1 if new > old else -1),
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def refresh_ranks(db: AsyncSession) -> None:
+    """Recount every rank (one UPDATE with a correlated count over the ranked_count index)."""
+    other = aliased(ReferrerStats)
+    higher = (
+        select(func.count()).select_from(other)
+        .where(other.ranked_count > ReferrerStats.ranked_count)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(ReferrerStats)
+        .values(leaderboard_rank=case((ReferrerStats.ranked_count > 0, higher + 1), else_=null()))
+        .execution_options(synchronize_session=False)
+    )
+
+
+class StatsBatch:
+    """Counter deltas of one transaction per referrer; flush() before its commit."""
+
+    def __init__(self, at: Optional[datetime] = None):
+        self.at = at or datetime.utcnow()
+        self._deltas: Dict[int, List[int]] = {}
+
+    def add(self, referrer_id: Optional[int], referidos: int = 0, closed: int = 0, ranked: int = 0) -> None:
+        if referrer_id is None or not (referidos or closed or ranked):
+            return
+        row = self._deltas.setdefault(referrer_id, [0, 0, 0])
+        row[0] += referidos
+        row[1] += closed
+        row[2] += ranked
+
+    def status_change(self, referrer_id: Optional[int], old: Optional[LeadStatus], new: LeadStatus) -> None:
+        self.add(referrer_id, closed=int(new == LeadStatus.GANADA) - int(old == LeadStatus.GANADA))
+
+    def payment_date_change(self, referrer_id: Optional[int], old, new) -> None:
+        self.add(referrer_id, ranked=int(new is not None) - int(old is not None))
+
+    async def flush(self, db: AsyncSession) -> None:
+        """Write the deltas and move the leaderboard; call before the commit of the change."""
+        deltas = {referrer_id: row for referrer_id, row in self._deltas.items() if any(row)}
+        self._deltas = {}
+        if not deltas:
+            return
+        rows = [
+            {
+                "referrer_id": referrer_id, "total_referidos": referidos, "closed_count": closed,
+                "ranked_count": ranked, "badge_flags": badge_flags(referidos, closed), "updated_at": self.at,
+            }
+            for referrer_id, (referidos, closed, ranked) in deltas.items()
+        ]
+        ranked_now = {}
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            ranked_now.update((await db.execute(_upsert_counts(db, rows[start:start + UPSERT_CHUNK_ROWS]))).all())
+        # Referidores inactivos (o usuarios que no son referidores) no tienen fila ni puesto
+        moved = [referrer_id for referrer_id, row in deltas.items() if row[2] and referrer_id in ranked_now]
+        if len(moved) == 1:
+            referrer_id = moved[0]
+            new = ranked_now[referrer_id]
+            await _shift_rank(db, referrer_id, new - deltas[referrer_id][2], new)
+        elif moved:
+            await refresh_ranks(db)
+
+
+async def record_payment_date_change(db: AsyncSession, lead: Lead, old_payment_date) -> None:
+    stats = StatsBatch()
+    stats.payment_date_change(lead.referrer_id, old_payment_date, lead.payment_date)
+    await stats.flush(db)
+
+
+async def record_event_confirmation(db: AsyncSession, referrer_id: int, evento_slug: str) -> None:
+    stmt = _insert(db).values(referrer_id=referrer_id, confirmed_event_slug=evento_slug, updated_at=datetime.utcnow())
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["referrer_id"],
+        set_={"confirmed_event_slug": stmt.excluded.confirmed_event_slug, "updated_at": stmt.excluded.updated_at},
+    ))
+
+
+# --- Lectura -----------------------------------------------------------------
+
+class ReferrerOverview(NamedTuple):
+    total_referidos: int = 0
+    closed_count: int = 0
+    leaderboard_rank: Optional[int] = None
+    badge_flags: int = 0
+    confirmed_event_slug: Optional[str] = None
+    unpaid_commission: float = 0.0
+    paid_commission: float = 0.0
+
+
+async def referrer_overview(db: AsyncSession, referrer_id: int) -> ReferrerOverview:
+    """Counters, rank, badges and commission balances of one referrer, in one query."""
+    result = await db.execute(
+        select(
+            ReferrerStats.total_referidos, ReferrerStats.closed_count, ReferrerStats.leaderboard_rank,
+            ReferrerStats.badge_flags, ReferrerStats.confirmed_event_slug,
+            CommissionBalance.unpaid, CommissionBalance.paid,
+        )
+        .select_from(User)
+        .outerjoin(ReferrerStats, ReferrerStats.referrer_id == User.id)
+        .outerjoin(CommissionBalance, and_(
+            CommissionBalance.scope == "referrer", CommissionBalance.referrer_id == User.id,
+        ))
+        .where(User.id == referrer_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return ReferrerOverview()
+    # Referidor sin leads ni comisiones todavía: sin filas en las tablas unidas
+    return ReferrerOverview(*(
+        default if value is None else value for value, default in zip(row, ReferrerOverview())
+    ))
+
+
+# --- Reconstrucción -------------------------------------------------------------
+
+async def _referrer_rows(db: AsyncSession, referrer_ids: List[int]) -> List[dict]:
+    """Rows recomputed from `leads` and evento_asistencia for `referrer_ids`."""
+    counts_query = (
+        select(
+            Lead.referrer_id,
+            func.count(Lead.id),
+            func.coalesce(func.sum(case((Lead.status == LeadStatus.GANADA, 1), else_=0)), 0),
+            func.count(Lead.payment_date),
+        ).where(Lead.referrer_id.isnot(None)).group_by(Lead.referrer_id)
+    )
+    # La última confirmación de cada referidor
+    events_query = (
+        select(EventoAsistencia.user_id, EventoAsistencia.evento_slug)
+        .order_by(EventoAsistencia.confirmed_at, EventoAsistencia.id)
+    )
+    if len(referrer_ids) == 1:
+        counts_query = counts_query.where(Lead.referrer_id == referrer_ids[0])
+        events_query = events_query.where(EventoAsistencia.user_id == referrer_ids[0])
+    counts = {row[0]: row[1:] for row in (await db.execute(counts_query)).all()}
+    events = dict((await db.execute(events_query)).all())
+
+    now = datetime.utcnow()
+    rows = []
+    for referrer_id in referrer_ids:
+        total, closed, ranked = counts.get(referrer_id, (0, 0, 0))
+        rows.append({
+            "referrer_id": referrer_id, "total_referidos": total, "closed_count": closed, "ranked_count": ranked,
+            "leaderboard_rank": None, "badge_flags": badge_flags(total, closed),
+            "confirmed_event_slug": events.get(referrer_id), "updated_at": now,
+        })
+    return rows
+
+
+async def rebuild_referrer_stats(db: AsyncSession) -> Dict[str, int]:
+    """
+    Recompute every referrer's row from `leads` and evento_asistencia, rank
+    them again and commit. Only active referrers get a row (the leaderboard
+    leaves inactive ones out).
+    """
+    referrer_ids = (await db.execute(
+        select(User.id).where(User.role == UserRole.REFERIDOR, User.is_active == True)  # noqa: E712
+    )).scalars().all()
+    rows = await _referrer_rows(db, list(referrer_ids))
+    await db.execute(delete(ReferrerStats))
+    for start in range(0, len(rows), INSERT_CHUNK_ROWS):
+        await db.execute(insert(ReferrerStats), rows[start:start + INSERT_CHUNK_ROWS])
+    await refresh_ranks(db)
+    await db.commit()
+    return {"referrers": len(rows), "ranked": sum(1 for row in rows if row["ranked_count"])}
+
+
+async def sync_referrer_stats(db: AsyncSession, user: User) -> None:
+    """
+    Drop `user`'s row, rebuild it when they are an active referrer and rank
+    everyone again; call before the commit of an (de)activation.
+    """
+    await db.execute(delete(ReferrerStats).where(ReferrerStats.referrer_id == user.id))
+    if user.role == UserRole.REFERIDOR and user.is_active:
+        await db.execute(insert(ReferrerStats), await _referrer_rows(db, [user.id]))
+    await refresh_ranks(db)
+
+
+async def open_referrer_stats(db: AsyncSession) -> Optional[Dict[str, int]]:
+    """Rebuild once when the table is still empty (first start after it exists)."""
+    if (await db.execute(select(ReferrerStats.referrer_id).limit(1))).first() is not None:
+        return None
+    return await rebuild_referrer_stats(db)
@@ -0,0 +1,289 @@
+"""
+Daily lead rollups (lead_daily_rollups).
+
+Writes that create leads, change their status, advisor or commission add
+their deltas to a RollupBatch, flushed with one upsert in the same
+transaction as the change. Each event is booked once per dimension: "all"
+plus the lead's advisor, referrer, project, utm_source and utm_campaign at
+that moment. Admin charts sum rows over a date range, so their cost depends
+on the range and not on the size of `leads`.
+
+On first start the whole history is caught up once (open_daily_rollups).
+The nightly catch-up (scripts/rollup_catchup.py) rebuilds `created` and
+`transitions` for recent days from leads.created_at and lead_status_events,
+and books any drift between the rollups and the current won / lost /
+commission totals on its last day, so writes that bypass the app (SQL
+fixes, seeds) are absorbed.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Lead, LeadDailyRollup, LeadStatus, LeadStatusEvent
+
+DIMENSIONS = ("all", "advisor", "referrer", "project", "utm_source", "utm_campaign")
+METRICS = ("created", "transitions", "won", "lost", "commission")
+# Columna de Lead que define cada dimensión ("all" no tiene)
+DIMENSION_ATTRS = {
+    "advisor": "advisor_id",
+    "referrer": "referrer_id",
+    "project": "project_id",
+    "utm_source": "utm_source",
+    "utm_campaign": "utm_campaign",
+}
+# Filas por INSERT ... ON CONFLICT (8 parámetros por fila)
+UPSERT_CHUNK_ROWS = 500
+# Diferencia de comisión que la conciliación ignora (redondeo de floats)
+COMMISSION_TOLERANCE = 0.005
+
+
+class RollupTotals(NamedTuple):
+    created: int = 0
+    transitions: int = 0
+    won: int = 0
+    lost: int = 0
+    commission: float = 0.0
+
+
+def _attr(lead, name: str):
+    return lead.get(name) if isinstance(lead, Mapping) else getattr(lead, name)
+
+
+def _key(value) -> str:
+    return "" if value is None else str(value)[:255]
+
+
+def dimension_keys(lead) -> List[Tuple[str, str]]:
+    """(dimension, key) pairs an event of `lead` (ORM object, row or dict) is booked under."""
+    return [("all", "")] + [(dimension, _key(_attr(lead, attr))) for dimension, attr in DIMENSION_ATTRS.items()]
+
+
+def _upsert(db: AsyncSession, rows: List[dict], replace: Sequence[str]):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(LeadDailyRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["day", "dimension", "key"],
+        set_={
+            metric: stmt.excluded[metric] if metric in replace
+            else getattr(LeadDailyRollup, metric) + stmt.excluded[metric]
+            for metric in METRICS
+        },
+    )
+
+
+class RollupBatch:
+    """Deltas accumulated in memory and written with one upsert (per UPSERT_CHUNK_ROWS rows)."""
+
+    def __init__(self):
+        self._rows: Dict[Tuple[date, str, str], dict] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._rows)
+
+    def add_key(self, day: date, dimension: str, key: str, **deltas) -> None:
+        row = self._rows.setdefault((day, dimension, key), dict.fromkeys(METRICS, 0))
+        for metric, delta in deltas.items():
+            row[metric] += delta
+
+    def add(self, day: date, lead, **deltas) -> None:
+        for dimension, key in dimension_keys(lead):
+            self.add_key(day, dimension, key, **deltas)
+
+    def status_change(self, day: date, lead, old: Optional[LeadStatus], new: LeadStatus) -> None:
+        if old == new:
+            return
+        self.add(
+            day, lead, transitions=1,
+            won=int(new == LeadStatus.GANADA) - int(old == LeadStatus.GANADA),
+            lost=int(new == LeadStatus.PERDIDA) - int(old == LeadStatus.PERDIDA),
+        )
+
+    def advisor_change(self, day: date, lead, old_advisor_id: Optional[int]) -> None:
+        """
+        Move `lead` (carrying its new advisor) out of old_advisor_id's totals:
+        `created` on its creation day, as the catch-up rebuilds it, and its
+        current won / lost / commission on `day`. Pending leads leave key "".
+        """
+        new_advisor_id = _attr(lead, "advisor_id")
+        if old_advisor_id == new_advisor_id:
+            return
+        status = _attr(lead, "status")
+        moved = {
+            "won": int(status == LeadStatus.GANADA),
+            "lost": int(status == LeadStatus.PERDIDA),
+            "commission": _attr(lead, "commission_amount") or 0.0,
+        }
+        created_day = _attr(lead, "created_at").date()
+        for key, sign in ((_key(old_advisor_id), -1), (_key(new_advisor_id), 1)):
+            self.add_key(created_day, "advisor", key, created=sign)
+            self.add_key(day, "advisor", key, **{metric: sign * value for metric, value in moved.items()})
+
+    def commission_change(self, day: date, lead, old: Optional[float], new: Optional[float]) -> None:
+        delta = (new or 0.0) - (old or 0.0)
+        if delta:
+            self.add(day, lead, commission=delta)
+
+    async def flush(self, db: AsyncSession, replace: Sequence[str] = ()) -> None:
+        """Write the deltas; call before the commit of the change. Metrics in `replace` overwrite."""
+        rows = [
+            {"day": day, "dimension": dimension, "key": key, **metrics}
+            for (day, dimension, key), metrics in self._rows.items()
+        ]
+        self._rows = {}
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            await db.execute(_upsert(db, rows[start:start + UPSERT_CHUNK_ROWS], replace))
+
+
+async def rollup_commission_change(db: AsyncSession, lead: Lead, old_amount: Optional[float]) -> None:
+    rollups = RollupBatch()
+    rollups.commission_change(datetime.utcnow().date(), lead, old_amount, lead.commission_amount)
+    await rollups.flush(db)
+
+
+# --- Lectura -----------------------------------------------------------------
+
+def _totals_columns():
+    return (
+        func.coalesce(func.sum(LeadDailyRollup.created), 0),
+        func.coalesce(func.sum(LeadDailyRollup.transitions), 0),
+        func.coalesce(func.sum(LeadDailyRollup.won), 0),
+        func.coalesce(func.sum(LeadDailyRollup.lost), 0),
+        func.coalesce(func.sum(LeadDailyRollup.commission), 0.0),
+    )
+
+
+def _in_range(query, since: Optional[date], until: Optional[date]):
+    if since is not None:
+        query = query.where(LeadDailyRollup.day >= since)
+    if until is not None:
+        query = query.where(LeadDailyRollup.day <= until)
+    return query
+
+
+async def rollup_totals(
+    db: AsyncSession, dimension: str, since: Optional[date] = None, until: Optional[date] = None,
+) -> Dict[str, RollupTotals]:
+    """Totals per key of `dimension` over [since, until] (open ends = all history)."""
+    query = _in_range(
+        select(LeadDailyRollup.key, *_totals_columns()).where(LeadDailyRollup.dimension == dimension),
+        since, until,
+    ).group_by(LeadDailyRollup.key)
+    result = await db.execute(query)
+    return {row[0]: RollupTotals(*row[1:]) for row in result.all()}
+
+
+async def daily_series(
+    db: AsyncSession, since: date, until: date, dimension: str = "all", key: str = "",
+) -> List[Tuple[date, RollupTotals]]:
+    """One entry per day in [since, until], days without activity included."""
+    query = _in_range(
+        select(LeadDailyRollup.day, *_totals_columns())
+        .where(LeadDailyRollup.dimension == dimension, LeadDailyRollup.key == key),
+        since, until,
+    ).group_by(LeadDailyRollup.day)
+    by_day = {row[0]: RollupTotals(*row[1:]) for row in (await db.execute(query)).all()}
+    return [
+        (day, by_day.get(day, RollupTotals()))
+        for day in (since + timedelta(days=i) for i in range((until - since).days + 1))
+    ]
+
+
+# --- Conciliación nocturna ------------------------------------------------------
+
+def _as_date(value) -> date:
+    # func.date() devuelve texto en SQLite y date en Postgres
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _group_columns(dimension: str) -> list:
+    return [] if dimension == "all" else [getattr(Lead, DIMENSION_ATTRS[dimension])]
+
+
+def _event_group_columns(dimension: str) -> list:
+    # El asesor del evento es el de ese momento, no el actual del lead
+    return [LeadStatusEvent.advisor_id] if dimension == "advisor" else _group_columns(dimension)
+
+
+async def catch_up_rollups(db: AsyncSession, since: date, until: date) -> Dict[str, int]:
+    """
+    Rebuild `created` and `transitions` for [since, until] and correct net drift.
+
+    `created` is recomputed per day with the lead's current dimensions and
+    `transitions` from lead_status_events (advisor at event time, the other
+    dimensions as the lead has them now). Won, lost and commission are
+    compared, per dimension value, with the current state of `leads`;
+    differences are booked on `until`.
+    """
+    start, end = datetime.combine(since, time.min), datetime.combine(until + timedelta(days=1), time.min)
+    await db.execute(
+        update(LeadDailyRollup)
+        .where(LeadDailyRollup.day >= since, LeadDailyRollup.day <= until)
+        .values(created=0, transitions=0)
+    )
+    rebuilt = RollupBatch()
+    created = 0
+    for dimension in DIMENSIONS:
+        columns = _group_columns(dimension)
+        result = await db.execute(
+            select(func.date(Lead.created_at), *columns, func.count(Lead.id))
+            .where(Lead.created_at >= start, Lead.created_at < end)
+            .group_by(func.date(Lead.created_at), *columns)
+        )
+        for row in result.all():
+            rebuilt.add_key(_as_date(row[0]), dimension, _key(row[1]) if columns else "", created=row[-1])
+            if dimension == "all":
+                created += row[-1]
+        columns = _event_group_columns(dimension)
+        result = await db.execute(
+            select(func.date(LeadStatusEvent.at), *columns, func.count(LeadStatusEvent.id))
+            .join(Lead, Lead.id == LeadStatusEvent.lead_id)
+            .where(LeadStatusEvent.at >= start, LeadStatusEvent.at < end)
+            .group_by(func.date(LeadStatusEvent.at), *columns)
+        )
+        for row in result.all():
+            rebuilt.add_key(_as_date(row[0]), dimension, _key(row[1]) if columns else "", transitions=row[-1])
+    await rebuilt.flush(db, replace=("created", "transitions"))
+
+    corrections = RollupBatch()
+    corrected = 0
+    for dimension in DIMENSIONS:
+        columns = _group_columns(dimension)
+        result = await db.execute(
+            select(
+                *columns,
+                func.coalesce(func.sum(case((Lead.status == LeadStatus.GANADA, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((Lead.status == LeadStatus.PERDIDA, 1), else_=0)), 0),
+                func.coalesce(func.sum(Lead.commission_amount), 0.0),
+            ).group_by(*columns)
+        )
+        actual = {(_key(row[0]) if columns else ""): row[-3:] for row in result.all()}
+        booked = await rollup_totals(db, dimension)
+        for key in actual.keys() | booked.keys():
+            won, lost, commission = actual.get(key, (0, 0, 0.0))
+            totals = booked.get(key, RollupTotals())
+            drift = {
+                "won": won - totals.won,
+                "lost": lost - totals.lost,
+                "commission": commission - totals.commission,
+            }
+            if abs(drift["commission"]) < COMMISSION_TOLERANCE:
+                drift["commission"] = 0.0
+            if any(drift.values()):
+                corrections.add_key(until, dimension, key, **drift)
+                corrected += 1
+    await corrections.flush(db)
+    await db.commit()
+    return {"days": (until - since).days + 1, "created": created, "corrections": corrected}
+
+
+async def open_daily_rollups(db: AsyncSession) -> Optional[Dict[str, int]]:
+    """Catch up the whole history once when the rollups are still empty (first start after the table exists)."""
+    if (await db.execute(select(LeadDailyRollup.day).limit(1))).first() is not None:
+        return None
+    first = (await db.execute(select(func.min(Lead.created_at)))).scalar()
+    if first is None:
+        return None
+    return await catch_up_rollups(db, first.date(), datetime.utcnow().date())
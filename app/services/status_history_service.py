@@ -0,0 +1,177 @@
+"""
+Lead status history (lead_status_events) and per-advisor stage velocity.
+
+Every status change goes through a StatusChangeBatch, flushed before the
+commit of the change: one INSERT into the append-only event log, one upsert
+into the advisor_stage_velocity histograms and the daily rollups, and one
+into the referrer counters when a lead enters or leaves GANADA. The admin
+funnel reads medians from the histograms (a few rows per advisor) instead
+of scanning the history.
+
+Hours in a stage are measured from Lead.status_changed_at, or created_at
+for leads that predate the history.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+from sqlalchemy import insert, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import AdvisorStageVelocity, Lead, LeadStatus, LeadStatusEvent
+from app.services.referrer_stats_service import StatsBatch
+from app.services.rollup_service import RollupBatch
+
+# Límites superiores (horas) de los buckets del histograma; el último bucket no tiene tope
+VELOCITY_BUCKETS = (1, 2, 4, 8, 12, 24, 36, 48, 72, 120, 168, 336, 720, 1440)
+
+Transition = Tuple[LeadStatus, LeadStatus]
+Histogram = Dict[int, Tuple[int, float]]   # bucket -> (leads, horas acumuladas)
+
+
+class VelocityStat(NamedTuple):
+    count: int
+    median_hours: float
+    mean_hours: float
+
+
+def velocity_bucket(hours: float) -> int:
+    return bisect_left(VELOCITY_BUCKETS, hours)
+
+
+def _attr(lead, name: str):
+    return lead.get(name) if isinstance(lead, Mapping) else getattr(lead, name)
+
+
+def _upsert_velocity(db: AsyncSession, rows: List[dict]):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(AdvisorStageVelocity).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=["advisor_id", "from_status", "to_status", "bucket"],
+        set_={
+            "count": AdvisorStageVelocity.count + stmt.excluded.count,
+            "hours_total": AdvisorStageVelocity.hours_total + stmt.excluded.hours_total,
+        },
+    )
+
+
+class StatusChangeBatch:
+    """Status changes of one request, written with a fixed number of statements whatever their number."""
+
+    def __init__(self, at: Optional[datetime] = None, changed_by_id: Optional[int] = None):
+        self.at = at or datetime.utcnow()
+        self.changed_by_id = changed_by_id
+        self._events: List[dict] = []
+        self._velocity: Dict[Tuple[int, LeadStatus, LeadStatus, int], List] = {}
+        self._rollups = RollupBatch()
+        self._referrers = StatsBatch(self.at)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, lead, old_status: Optional[LeadStatus], new_status: LeadStatus) -> None:
+        """
+        Record `lead` (ORM object, row or dict) moving from old_status to new_status.
+
+        `lead` must carry the advisor the lead has after the change. For ORM
+        objects status_changed_at is moved forward here.
+        """
+        if old_status == new_status:
+            return
+        entered_at = _attr(lead, "status_changed_at") or _attr(lead, "created_at")
+        hours = max((self.at - entered_at).total_seconds() / 3600, 0.0) if entered_at else None
+        advisor_id = _attr(lead, "advisor_id")
+        self._events.append({
+            "lead_id": _attr(lead, "id"),
+            "advisor_id": advisor_id,
+            "changed_by_id": self.changed_by_id,
+            "from_status": old_status,
+            "to_status": new_status,
+            "at": self.at,
+            "hours_in_stage": hours,
+        })
+        if advisor_id is not None and old_status is not None and hours is not None:
+            row = self._velocity.setdefault((advisor_id, old_status, new_status, velocity_bucket(hours)), [0, 0.0])
+            row[0] += 1
+            row[1] += hours
+        self._rollups.status_change(self.at.date(), lead, old_status, new_status)
+        self._referrers.status_change(_attr(lead, "referrer_id"), old_status, new_status)
+        if isinstance(lead, Lead):
+            lead.status_changed_at = self.at
+
+    def advisor_change(self, lead, old_advisor_id: Optional[int]) -> None:
+        """Move `lead` (carrying its new advisor) between advisors in the rollups of this batch."""
+        self._rollups.advisor_change(self.at.date(), lead, old_advisor_id)
+
+    async def flush(self, db: AsyncSession) -> None:
+        """Write the events, histograms, rollups and referrer counters; call before the commit of the change."""
+        if self._events:
+            # render_nulls: eventos con y sin asesor/estado anterior en el mismo INSERT
+            await db.execute(insert(LeadStatusEvent).execution_options(render_nulls=True), self._events)
+        if self._velocity:
+            await db.execute(_upsert_velocity(db, [
+                {
+                    "advisor_id": advisor_id, "from_status": old, "to_status": new, "bucket": bucket,
+                    "count": count, "hours_total": hours,
+                }
+                for (advisor_id, old, new, bucket), (count, hours) in self._velocity.items()
+            ]))
+        await self._rollups.flush(db)
+        await self._referrers.flush(db)
+        self._events, self._velocity = [], {}
+
+
+async def record_status_change(
+    db: AsyncSession, lead: Lead, old_status: Optional[LeadStatus], changed_by_id: Optional[int] = None,
+) -> None:
+    batch = StatusChangeBatch(changed_by_id=changed_by_id)
+    batch.add(lead, old_status, lead.status)
+    await batch.flush(db)
+
+
+# --- Lectura -----------------------------------------------------------------
+
+async def velocity_histograms(db: AsyncSession, advisor_id: Optional[int] = None) -> Dict[Transition, Histogram]:
+    """Histograms per transition for one advisor, or for the whole team when advisor_id is None."""
+    query = select(
+        AdvisorStageVelocity.from_status, AdvisorStageVelocity.to_status, AdvisorStageVelocity.bucket,
+        func.sum(AdvisorStageVelocity.count), func.sum(AdvisorStageVelocity.hours_total),
+    ).group_by(AdvisorStageVelocity.from_status, AdvisorStageVelocity.to_status, AdvisorStageVelocity.bucket)
+    if advisor_id is not None:
+        query = query.where(AdvisorStageVelocity.advisor_id == advisor_id)
+    histograms: Dict[Transition, Histogram] = {}
+    for old, new, bucket, count, hours in (await db.execute(query)).all():
+        histograms.setdefault((old, new), {})[bucket] = (count, hours)
+    return histograms
+
+
+def summarize(histogram: Histogram) -> VelocityStat:
+    """Count, mean and median (interpolated inside its bucket) of one histogram."""
+    total = sum(count for count, _hours in histogram.values())
+    if not total:
+        return VelocityStat(0, 0.0, 0.0)
+    mean = sum(hours for _count, hours in histogram.values()) / total
+    half, seen = total / 2, 0
+    for bucket in sorted(histogram):
+        count, hours = histogram[bucket]
+        if count and seen + count >= half:
+            if bucket >= len(VELOCITY_BUCKETS):
+                # Bucket sin tope: su promedio
+                return VelocityStat(total, hours / count, mean)
+            lower = VELOCITY_BUCKETS[bucket - 1] if bucket else 0.0
+            upper = VELOCITY_BUCKETS[bucket]
+            return VelocityStat(total, lower + (upper - lower) * (half - seen) / count, mean)
+        seen += count
+    return VelocityStat(total, mean, mean)
+
+
+def merge_by_stage(histograms: Dict[Transition, Histogram]) -> Dict[LeadStatus, Histogram]:
+    """Time in stage: histograms of every transition out of each from_status added together."""
+    stages: Dict[LeadStatus, Histogram] = {}
+    for (old, _new), histogram in histograms.items():
+        merged = stages.setdefault(old, {})
+        for bucket, (count, hours) in histogram.items():
+            prev_count, prev_hours = merged.get(bucket, (0, 0.0))
+            merged[bucket] = (prev_count + count, prev_hours + hours)
+    return stages
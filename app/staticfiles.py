@@ -0,0 +1,351 @@
+import mmap
+import os
+import re
+import secrets
+from email.utils import parsedate
+from mimetypes import guess_type
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+# Archivos con hash en el nombre (style.3f9a1c2b.css) o versionados con ?v=
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Orden de preferencia de las variantes precomprimidas (generadas en el build)
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def cache_control_for(full_path: str, scope) -> str:
+    """Immutable caching for fingerprinted / `?v=` assets, revalidation otherwise."""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if "v" in query or FINGERPRINT_RE.search(os.path.basename(full_path)):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def parse_accept_encoding(header: str) -> set:
+    """Return the set of content-codings the client accepts (q > 0)."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a `Range: bytes=...` header into inclusive (start, end) pairs.
+    Returns None when the header is malformed (it must be ignored) and an
+    empty list when no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        try:
+            if not first:
+                # Sufijo: los últimos N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else None
+        except ValueError:
+            return None
+        if end is None:
+            end = size - 1
+        elif start > end:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def if_range_matches(if_range: Optional[str], response_headers: Headers) -> bool:
+    """Evaluate `If-Range` against the validators of the full representation."""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == response_headers.get("etag")
+    return if_range == response_headers.get("last-modified")
+
+
+def coalesce_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort and merge overlapping or adjacent ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """Conditional GET: True if a 304 can be sent (same rules as StaticFiles)."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response_headers.get("etag")
+        return etag in [tag.strip(" W/") for tag in if_none_match.split(",")]
+
+    if_modified_since = parsedate(request_headers.get("if-modified-since", ""))
+    last_modified = parsedate(response_headers.get("last-modified", ""))
+    return (
+        if_modified_since is not None
+        and last_modified is not None
+        and if_modified_since >= last_modified
+    )
+
+
+class RangeFileResponse(FileResponse):
+    """
+    FileResponse for `206 Partial Content`. One range is sent as-is; several
+    ranges go out as `multipart/byteranges`. Uses the ASGI zero-copy send
+    extension when the server offers it and bounded mmap reads otherwise,
+    so memory per connection does not depend on the size of the ranges.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        ranges: List[Tuple[int, int]],
+        stat_result: os.stat_result,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+    ) -> None:
+        media_type = media_type or guess_type(str(path))[0] or "text/plain"
+        size = stat_result.st_size
+        self.ranges = ranges
+        self.parts = []  # (preámbulo multipart, start, end)
+        self.epilogue = b""
+        if len(ranges) == 1:
+            part_media_type = media_type
+        else:
+            boundary = secrets.token_hex(12)
+            part_media_type = f"multipart/byteranges; boundary={boundary}"
+            for start, end in ranges:
+                preamble = (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((preamble, start, end))
+            self.epilogue = f"--{boundary}--\r\n".encode("latin-1")
+
+        super().__init__(
+            path,
+            status_code=206,
+            headers=headers,
+            media_type=part_media_type,
+            stat_result=stat_result,
+        )
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.parts.append((b"", start, end))
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+            content_length = end - start + 1
+        else:
+            # Cada parte termina en CRLF antes del siguiente delimitador
+            content_length = len(self.epilogue) + sum(
+                len(preamble) + (end - start + 1) + 2 for preamble, start, end in self.parts
+            )
+        self.headers["content-length"] = str(content_length)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        multipart = len(self.parts) > 1
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            for index, (preamble, start, end) in enumerate(self.parts):
+                if preamble:
+                    await send({"type": "http.response.body", "body": preamble, "more_body": True})
+                last = index == len(self.parts) - 1 and not multipart
+                if zerocopy:
+                    await send({
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": end - start + 1,
+                        "more_body": not last,
+                    })
+                else:
+                    await self._send_mmap(file, start, end, send, more_body=not last)
+                if multipart:
+                    await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+            if multipart:
+                await send({"type": "http.response.body", "body": self.epilogue, "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+        if self.background is not None:
+            await self.background()
+
+    async def _send_mmap(self, file, start: int, end: int, send, more_body: bool) -> None:
+        """Send [start, end] in `chunk_size` slices, each read through its own mmap window."""
+        position = start
+        stop = end + 1
+        while position < stop:
+            chunk_end = min(position + self.chunk_size, stop)
+            # La copia desde el mmap puede producir page faults: fuera del event loop
+            chunk = await anyio.to_thread.run_sync(_read_mmap_window, file, position, chunk_end)
+            position = chunk_end if chunk else stop
+            await send({
+                "type": "http.response.body",
+                "body": chunk,
+                "more_body": more_body or position < stop,
+            })
+
+
+def _read_mmap_window(file, start: int, end: int) -> bytes:
+    """Map only the pages covering [start, end) so resident memory stays bounded."""
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+    try:
+        with mmap.mmap(file.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset) as window:
+            return window[start - offset:]
+    except ValueError:
+        # El archivo se truncó mientras se servía
+        return b""
+
+
+MAX_RANGES = 16
+
+
+def partial_file_response(
+    request_headers: Headers,
+    response: FileResponse,
+    full_path: str,
+    stat_result: os.stat_result,
+    headers: dict,
+    media_type: str,
+) -> Optional[Response]:
+    """
+    Answer a `Range` request for the identity representation in `response`.
+    Returns None when the full file must be sent instead (no/ignored Range,
+    stale If-Range, too many ranges).
+    """
+    range_header = request_headers.get("range")
+    if not range_header or response.status_code != 200:
+        return None
+    if not if_range_matches(request_headers.get("if-range"), response.headers):
+        return None
+    ranges = parse_range_header(range_header, stat_result.st_size)
+    if ranges is None:
+        return None
+    if not ranges:
+        return Response(
+            status_code=416,
+            headers={"content-range": f"bytes */{stat_result.st_size}"},
+        )
+    ranges = coalesce_ranges(ranges)
+    if len(ranges) > MAX_RANGES:
+        return None
+    return RangeFileResponse(
+        full_path, ranges, stat_result, headers=headers, media_type=media_type,
+    )
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves `.br` / `.gz` siblings when the client accepts them,
+    answers byte-range requests and sets long-lived cache headers for
+    fingerprinted or `?v=` versioned assets.
+    """
+
+    def compressed_variants(self, full_path: str, stat_result: os.stat_result) -> list:
+        """Return (encoding, path, stat) for fresh precompressed siblings."""
+        variants = []
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            try:
+                variant_stat = os.stat(str(full_path) + suffix)
+            except OSError:
+                continue
+            # Ignorar variantes más viejas que el original (build desactualizado)
+            if variant_stat.st_mtime >= stat_result.st_mtime:
+                variants.append((encoding, str(full_path) + suffix, variant_stat))
+        return variants
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        media_type = guess_type(str(full_path))[0] or "text/plain"
+        headers = {
+            "accept-ranges": "bytes",
+            "cache-control": cache_control_for(str(full_path), scope),
+        }
+
+        variants = self.compressed_variants(full_path, stat_result)
+        if variants:
+            headers["vary"] = "Accept-Encoding"
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+
+        if request_headers.get("range"):
+            if self.is_not_modified(response.headers, request_headers):
+                return NotModifiedResponse(response.headers)
+            partial = partial_file_response(
+                request_headers, response, full_path, stat_result, headers, media_type,
+            )
+            return partial or response
+
+        accepted = parse_accept_encoding(request_headers.get("accept-encoding", ""))
+        for encoding, variant_path, variant_stat in variants:
+            if encoding in accepted:
+                response = FileResponse(
+                    variant_path,
+                    status_code=status_code,
+                    headers={**headers, "content-encoding": encoding},
+                    media_type=media_type,
+                    stat_result=variant_stat,
+                )
+                break
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1 @@
+"""Benchmarks de rendimiento. Cada módulo se ejecuta con `python -m benchmarks.<nombre>`."""
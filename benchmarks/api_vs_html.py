@@ -0,0 +1,89 @@
+"""
+Tamaño de respuesta y latencia: páginas HTML vs la API JSON /api/v1/leads.
+
+Para cada rol compara el dashboard HTML con la primera página de la API,
+completa y con `fields=` reducido. Reporta bytes sin comprimir y con gzip
+(nivel 6, como el middleware) y p50/p95 de `--requests` peticiones.
+
+    python -m benchmarks.api_vs_html [--leads 3000] [--requests 100]
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import time
+
+from benchmarks.dataset import auth_headers, configure_database, seed_dataset
+from benchmarks.endpoints import percentile
+
+SPARSE_FIELDS = "id,first_name,last_name,status,created_at"
+
+
+def build_cases(ids: dict) -> list:
+    advisor = auth_headers(ids["advisor_ids"][0], "ASESOR")
+    referrer = auth_headers(ids["referrer_ids"][0], "REFERIDOR")
+    admin = auth_headers(ids["admin_id"], "ADMIN")
+    return [
+        ("asesor", "html", "/dashboard/asesor", advisor),
+        ("asesor", "json", "/api/v1/leads", advisor),
+        ("asesor", "json sparse", f"/api/v1/leads?fields={SPARSE_FIELDS}", advisor),
+        ("referidor", "html", "/dashboard/referidor", referrer),
+        ("referidor", "json", "/api/v1/leads", referrer),
+        ("referidor", "json sparse", f"/api/v1/leads?fields={SPARSE_FIELDS}", referrer),
+        ("admin", "html", "/admin", admin),
+        ("admin", "json", "/api/v1/leads", admin),
+        ("admin", "json sparse", f"/api/v1/leads?fields={SPARSE_FIELDS}", admin),
+    ]
+
+
+async def measure(client, path: str, headers: dict, requests: int) -> dict:
+    # Sin Accept-Encoding: el tamaño comprimido se calcula aquí para comparar igual
+    headers = {**headers, "accept-encoding": "identity"}
+    response = await client.get(path, headers=headers)
+    response.raise_for_status()
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "bytes": len(response.content),
+        "gzip_bytes": len(gzip.compress(response.content, compresslevel=6)),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+async def run(args) -> list:
+    import httpx
+
+    configure_database(args.database_url)
+    ids = await seed_dataset(referidores=args.referidores, asesores=args.asesores, leads=args.leads)
+
+    from app.main import app
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app.timing").setLevel(logging.WARNING)
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for role, kind, path, headers in build_cases(ids):
+            rows.append((role, kind, await measure(client, path, headers, args.requests)))
+    return rows
+
+
+def print_report(rows: list) -> None:
+    print(f"\n  {'rol':<10} {'respuesta':<12} {'bytes':>10} {'gzip':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for role, kind, r in rows:
+        print(f"  {role:<10} {kind:<12} {r['bytes']:>10} {r['gzip_bytes']:>9} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="por defecto, SQLite en un directorio temporal")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--referidores", type=int, default=200)
+    parser.add_argument("--asesores", type=int, default=10)
+    parser.add_argument("--leads", type=int, default=3000)
+    print_report(asyncio.run(run(parser.parse_args())))
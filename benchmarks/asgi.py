@@ -0,0 +1,61 @@
+"""Minimal in-process ASGI driver that discards response bodies."""
+import asyncio
+
+
+async def asgi_request(
+    app,
+    path: str,
+    headers: dict = None,
+    method: str = "GET",
+    body: bytes = b"",
+    body_sink: bytearray = None,
+) -> tuple:
+    """
+    Run one request against `app` and return (status, headers, body_bytes).
+    Body chunks are counted but not kept (unless `body_sink` is given), so
+    the client side adds no memory.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+        "extensions": {},
+    }
+    sent_request = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal sent_request
+        if not sent_request:
+            sent_request = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    result = {"status": None, "headers": [], "bytes": 0}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            result["bytes"] += len(chunk)
+            if body_sink is not None:
+                body_sink.extend(chunk)
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        disconnected.set()
+    return result["status"], result["headers"], result["bytes"]
@@ -0,0 +1,90 @@
+"""
+Bytes saved and CPU cost of CompressionMiddleware on the big dynamic pages.
+
+Each page is rendered once without compression; its body is then replayed
+through CompressionMiddleware at several gzip levels / Brotli qualities to
+measure the compressed size and the CPU time spent per response.
+
+    python -m benchmarks.compression [--iterations 50]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.dataset import auth_headers, configure_database, seed_dataset
+
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 11)
+
+
+def _replay_app(body: bytes, content_type: str):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body, "more_body": False})
+    return app
+
+
+async def _measure(body: bytes, encoding: str, level: int, iterations: int) -> dict:
+    from app.middleware import CompressionMiddleware
+    from benchmarks.asgi import asgi_request
+
+    kwargs = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+    app = CompressionMiddleware(_replay_app(body, "text/html; charset=utf-8"), **kwargs)
+    size = 0
+    started = time.process_time()
+    for _ in range(iterations):
+        _status, _headers, size = await asgi_request(app, "/", {"accept-encoding": encoding})
+    cpu = (time.process_time() - started) / iterations
+    return {"encoding": encoding, "level": level, "bytes": size, "cpu_ms": cpu * 1000}
+
+
+async def run(iterations: int) -> list:
+    configure_database()
+    ids = await seed_dataset(referidores=50, asesores=3, leads=300)
+
+    from app.main import app
+    from app.middleware import brotli
+    from benchmarks.asgi import asgi_request
+
+    pages = {
+        "/": {},
+        f"/r/{ids['referral_codes'][0]}?utm_source=facebook": {},
+        "/leaderboard": {},
+        "/dashboard/asesor": auth_headers(ids["advisor_ids"][0], "ASESOR"),
+        "/dashboard/referidor": auth_headers(ids["referrer_ids"][0], "REFERIDOR"),
+        "/admin": auth_headers(ids["admin_id"], "ADMIN"),
+    }
+    results = []
+    for path, headers in pages.items():
+        body = bytearray()
+        status, _headers, _size = await asgi_request(
+            app, path, {**headers, "accept-encoding": "identity"}, body_sink=body,
+        )
+        row = {"path": path, "status": status, "identity_bytes": len(body), "variants": []}
+        for level in GZIP_LEVELS:
+            row["variants"].append(await _measure(bytes(body), "gzip", level, iterations))
+        if brotli is not None:
+            for quality in BROTLI_QUALITIES:
+                row["variants"].append(await _measure(bytes(body), "br", quality, iterations))
+        results.append(row)
+    return results
+
+
+def print_report(results: list) -> None:
+    for row in results:
+        print(f"\n{row['path']}  (status {row['status']}, {row['identity_bytes']} bytes sin comprimir)")
+        print(f"  {'enc':<5} {'nivel':>5} {'bytes':>9} {'ahorro':>8} {'CPU ms':>8}")
+        for v in row["variants"]:
+            saved = 100 * (1 - v["bytes"] / row["identity_bytes"]) if row["identity_bytes"] else 0
+            print(f"  {v['encoding']:<5} {v['level']:>5} {v['bytes']:>9} {saved:>7.1f}% {v['cpu_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    print_report(asyncio.run(run(args.iterations)))
@@ -0,0 +1,98 @@
+"""
+Base de datos temporal con datos sembrados para los benchmarks.
+
+`configure_database()` debe llamarse antes de importar `app.main`, porque el
+engine se crea a partir de `DATABASE_URL` al importar `app.database`.
+"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# Hash bcrypt de "Bench123!" precalculado: hashear miles de usuarios domina el seed
+BENCH_PASSWORD = "Bench123!"
+BENCH_PASSWORD_HASH = "$2b$12$NMFlyh2oVYe7n0zq61.dROjpTOpDdBD1j3qaRMqFg9afZdrTEmMca"
+
+PROJECTS = ["Isla Barú", "Barú Beach", "El Nogal", "Palmas de Mallorca", "Prado Norte", "Coveñas Beach Club"]
+CITIES = ["Cartagena", "Bogotá", "Medellín", "Barranquilla", "Cali", None]
+
+
+def configure_database(url: str = None) -> str:
+    """Point the app at `url` (default: a fresh SQLite file in a temp dir)."""
+    if url is None:
+        directory = tempfile.mkdtemp(prefix="egp-bench-")
+        url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ["DATABASE_URL"] = url
+    return url
+
+
+async def seed_dataset(referidores: int = 50, asesores: int = 5, leads: int = 500, seed: int = 42) -> dict:
+    """Create tables and insert a small but realistic dataset. Returns ids and codes."""
+    from app.database import engine, Base, AsyncSessionLocal
+    from app.models.models import (
+        User, UserRole, Lead, LeadStatus, LeadNote, LeadAdminTask, AssignmentState, LossReason,
+    )
+
+    rng = random.Random(seed)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        admin = User(
+            name="Admin", last_name="Bench", email="admin@bench.test",
+            password_hash=BENCH_PASSWORD_HASH, role=UserRole.ADMIN,
+        )
+        advisors = [
+            User(
+                name=f"Asesor{i}", last_name="Bench", email=f"asesor{i}@bench.test",
+                password_hash=BENCH_PASSWORD_HASH, role=UserRole.ASESOR,
+            )
+            for i in range(asesores)
+        ]
+        referrers = [
+            User(
+                name=f"Referidor{i}", last_name="Bench", email=f"ref{i}@bench.test",
+                phone=f"300{i:07d}", password_hash=BENCH_PASSWORD_HASH,
+                role=UserRole.REFERIDOR, referral_code=f"BENCH{i:04d}",
+            )
+            for i in range(referidores)
+        ]
+        db.add_all([admin, *advisors, *referrers])
+        db.add(AssignmentState(id=1))
+        await db.flush()
+
+        statuses = [s for s in LeadStatus if s != LeadStatus.PENDING_ASSIGNMENT]
+        now = datetime.utcnow()
+        for i in range(leads):
+            status = rng.choice(statuses)
+            lead = Lead(
+                first_name=f"Lead{i}", last_name="Bench", email=f"lead{i}@bench.test",
+                phone=f"310{i:07d}", city=rng.choice(CITIES),
+                notes_public=rng.choice(PROJECTS), status=status,
+                loss_reason=rng.choice(list(LossReason)).value if status == LeadStatus.PERDIDA else None,
+                referrer_id=rng.choice(referrers).id, advisor_id=rng.choice(advisors).id,
+                assigned_at=now, created_at=now - timedelta(minutes=rng.randrange(0, 60 * 24 * 90)),
+                utm_source=rng.choice(["facebook", "instagram", "google", None]),
+                commission_amount=rng.choice([None, 500000.0, 1000000.0]) if status == LeadStatus.GANADA else None,
+            )
+            db.add(lead)
+            await db.flush()
+            db.add(LeadNote(lead_id=lead.id, advisor_id=lead.advisor_id, note="Llamada de seguimiento"))
+            db.add(LeadAdminTask(lead_id=lead.id, task="Enviar brochure"))
+        await db.commit()
+
+        return {
+            "admin_id": admin.id,
+            "advisor_ids": [a.id for a in advisors],
+            "referrer_ids": [r.id for r in referrers],
+            "referral_codes": [r.referral_code for r in referrers],
+        }
+
+
+def auth_headers(user_id: int, role: str) -> dict:
+    """Cookie header with a valid access token for `user_id`."""
+    from app.services.auth_service import create_access_token
+
+    token = create_access_token({"sub": str(user_id), "role": role})
+    return {"cookie": f"access_token={token}"}
@@ -0,0 +1,91 @@
+"""
+Memoria y duración de la exportación de leads (CSV y XLSX).
+
+Siembra `--leads` leads con scripts.seed_data y descarga
+/admin/export/leads.{csv,xlsx} en streaming desde un uvicorn real
+(ASGITransport acumula el cuerpo entero), descartando los bytes. Reporta el
+pico de memoria Python (tracemalloc) durante la descarga, que debe
+mantenerse estable al crecer el número de filas, y la latencia hasta el
+primer byte y total.
+
+    python -m benchmarks.export_memory [--leads 1000000] [--formats csv xlsx]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+
+async def measure(client, path: str, headers: dict) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    async with client.stream("GET", path, headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+    total = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"mb": size / 1e6, "peak_mb": peak / 1e6, "ttfb_ms": (first_byte or 0) * 1000, "total_s": total}
+
+
+async def run(args) -> dict:
+    import httpx
+
+    directory = tempfile.mkdtemp(prefix="egp-export-")
+    url = f"sqlite+aiosqlite:///{os.path.join(directory, 'export.db')}"
+    os.environ["DATABASE_URL"] = url
+
+    from scripts.seed_data import seed
+    await seed(url, max(args.leads // 50, 10), 20, args.leads, 42, datetime(2026, 1, 1), "Bench123!", True)
+
+    from sqlalchemy import select
+    from app.database import AsyncSessionLocal, engine
+    from app.main import app
+    from app.models.models import User, UserRole
+    from benchmarks.dataset import auth_headers
+    from benchmarks.endpoints import UvicornThread
+
+    async with AsyncSessionLocal() as db:
+        admin_id = (await db.execute(select(User.id).where(User.role == UserRole.ADMIN).limit(1))).scalar()
+        if admin_id is None:
+            admin = User(name="Admin", last_name="Bench", email="admin-export@bench.test", password_hash="x",
+                         role=UserRole.ADMIN)
+            db.add(admin)
+            await db.commit()
+            admin_id = admin.id
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app.timing").setLevel(logging.WARNING)
+    headers = {**auth_headers(admin_id, "ADMIN"), "accept-encoding": "identity"}
+    results = {}
+    # Las conexiones abiertas en este loop no sirven en el del servidor
+    await engine.dispose()
+    with UvicornThread(app) as base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            for fmt in args.formats:
+                results[fmt] = await measure(client, f"/admin/export/leads.{fmt}", headers)
+    return results
+
+
+def print_report(results: dict, args) -> None:
+    print(f"\n{args.leads} leads")
+    print(f"  {'formato':<8} {'MB':>9} {'pico MB':>9} {'TTFB ms':>9} {'total s':>9}")
+    for fmt, r in results.items():
+        print(f"  {fmt:<8} {r['mb']:>9.1f} {r['peak_mb']:>9.1f} {r['ttfb_ms']:>9.1f} {r['total_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=200000)
+    parser.add_argument("--formats", nargs="*", default=["csv", "xlsx"])
+    args = parser.parse_args()
+    print_report(asyncio.run(run(args)), args)
@@ -0,0 +1,101 @@
+"""
+Concurrent seek-heavy clients against /media/videos.
+
+Each client issues random `Range` requests (bounded and open-ended, like a
+video player scrubbing). The report shows that peak Python memory per
+connection stays flat as concurrency grows, because ranges are streamed in
+fixed-size chunks instead of being read into memory.
+
+    python -m benchmarks.media_seek [--size-mb 64] [--requests 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+CONCURRENCY_LEVELS = (1, 8, 32, 128)
+
+
+def _make_video(directory: str, size_mb: int) -> str:
+    path = os.path.join(directory, "bench.mp4")
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+async def _client(app, size: int, requests: int, rng: random.Random) -> int:
+    from benchmarks.asgi import asgi_request
+
+    total = 0
+    for _ in range(requests):
+        start = rng.randrange(0, size - 1)
+        kind = rng.random()
+        if kind < 0.6:
+            range_header = f"bytes={start}-{min(start + 2 * 1024 * 1024, size - 1)}"
+        elif kind < 0.9:
+            range_header = f"bytes={start}-"
+        else:
+            range_header = f"bytes=0-1023,{start}-{min(start + 65535, size - 1)}"
+        status, _headers, sent = await asgi_request(app, "/media/videos/bench.mp4", {"range": range_header})
+        assert status == 206, status
+        total += sent
+    return total
+
+
+async def _run_level(app, size: int, concurrency: int, requests: int) -> dict:
+    rng = random.Random(concurrency)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    sent = await asyncio.gather(*[
+        _client(app, size, requests, random.Random(rng.random())) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total_bytes = sum(sent)
+    return {
+        "concurrency": concurrency,
+        "requests": concurrency * requests,
+        "elapsed_s": elapsed,
+        "throughput_mb_s": total_bytes / elapsed / 1024 / 1024,
+        "peak_kb": peak / 1024,
+        "peak_kb_per_conn": peak / 1024 / concurrency,
+    }
+
+
+async def main(size_mb: int, requests: int) -> list:
+    with tempfile.TemporaryDirectory() as directory:
+        path = _make_video(directory, size_mb)
+        os.environ["MEDIA_VIDEOS_DIR"] = directory
+        from app.main import app
+        from app.routers import media
+        media.settings.MEDIA_VIDEOS_DIR = directory
+
+        size = os.path.getsize(path)
+        results = []
+        for concurrency in CONCURRENCY_LEVELS:
+            results.append(await _run_level(app, size, concurrency, requests))
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20, help="requests por cliente")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args.size_mb, args.requests))
+    print(f"{'conc':>5} {'reqs':>6} {'MB/s':>9} {'peak KB':>10} {'KB/conn':>9}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['requests']:>6} {r['throughput_mb_s']:>9.1f} "
+            f"{r['peak_kb']:>10.1f} {r['peak_kb_per_conn']:>9.1f}"
+        )
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
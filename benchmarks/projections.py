@@ -0,0 +1,121 @@
+"""
+Entidades ORM vs proyecciones en las vistas de lista.
+
+Para cada lista (kanban del asesor, lista del referidor, pestaña de leads del
+admin) compara la consulta anterior, que hidrataba entidades `Lead`, con la
+proyección a tuplas con nombre de app/services/lead_service.py. Reporta ms y
+objetos asignados (bloques vivos de tracemalloc al terminar la consulta,
+con la sesión aún abierta como en una petición) por cada 1.000 filas.
+
+    python -m benchmarks.projections [--leads 20000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+
+async def _entity_queries(db, advisor_id: int, referrer_id: int) -> dict:
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from app.models.models import Lead
+
+    async def asesor():
+        result = await db.execute(
+            select(Lead).options(selectinload(Lead.referrer))
+            .where(Lead.advisor_id == advisor_id).order_by(Lead.created_at.desc())
+        )
+        return result.scalars().all()
+
+    async def referidor():
+        result = await db.execute(
+            select(Lead).where(Lead.referrer_id == referrer_id).order_by(Lead.created_at.desc())
+        )
+        return result.scalars().all()
+
+    async def admin():
+        return (await db.execute(select(Lead).order_by(Lead.created_at.desc()))).scalars().all()
+
+    return {"asesor": asesor, "referidor": referidor, "admin": admin}
+
+
+async def _projection_queries(db, advisor_id: int, referrer_id: int) -> dict:
+    from app.services.lead_service import admin_lead_rows, asesor_lead_cards, referidor_lead_rows
+
+    return {
+        "asesor": lambda: asesor_lead_cards(db, advisor_id),
+        "referidor": lambda: referidor_lead_rows(db, referrer_id),
+        "admin": lambda: admin_lead_rows(db),
+    }
+
+
+async def _measure(session_factory, build, view: str, advisor_id: int, referrer_id: int, repeat: int) -> dict:
+    best_ms, blocks, rows = None, 0, 0
+    for _ in range(repeat):
+        async with session_factory() as db:
+            queries = await build(db, advisor_id, referrer_id)
+            gc.collect()
+            tracemalloc.start()
+            before = len(tracemalloc.take_snapshot().traces)
+            result = await queries[view]()
+            blocks = len(tracemalloc.take_snapshot().traces) - before
+            tracemalloc.stop()
+            del result
+        # El tiempo se mide aparte, sin el costo de tracemalloc
+        async with session_factory() as db:
+            queries = await build(db, advisor_id, referrer_id)
+            started = time.perf_counter()
+            rows = len(await queries[view]())
+            elapsed = time.perf_counter() - started
+        best_ms = elapsed * 1000 if best_ms is None else min(best_ms, elapsed * 1000)
+    per_k = 1000 / rows if rows else 0
+    return {"rows": rows, "ms_per_1k": best_ms * per_k, "objects_per_1k": blocks * per_k}
+
+
+async def run(leads: int, repeat: int) -> dict:
+    from sqlalchemy import func, select
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.models.models import Lead
+    from benchmarks.dataset import configure_database
+    from scripts.seed_data import seed
+
+    url = configure_database()
+    await seed(url, 200, 5, leads, 42, datetime(2026, 1, 1), "Bench123!", True)
+    engine = build_engine(url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        advisor_id = (await db.execute(
+            select(Lead.advisor_id).where(Lead.advisor_id.isnot(None))
+            .group_by(Lead.advisor_id).order_by(func.count().desc()).limit(1)
+        )).scalar()
+        referrer_id = (await db.execute(
+            select(Lead.referrer_id).where(Lead.referrer_id.isnot(None))
+            .group_by(Lead.referrer_id).order_by(func.count().desc()).limit(1)
+        )).scalar()
+
+    results = {}
+    for view in ("asesor", "referidor", "admin"):
+        results[view] = {
+            "entidades": await _measure(session_factory, _entity_queries, view, advisor_id, referrer_id, repeat),
+            "proyección": await _measure(session_factory, _projection_queries, view, advisor_id, referrer_id, repeat),
+        }
+    await engine.dispose()
+    return results
+
+
+def print_report(results: dict) -> None:
+    print(f"\n  {'vista':<10} {'modo':<11} {'filas':>7} {'ms/1k':>8} {'objetos/1k':>11}")
+    for view, modes in results.items():
+        for mode, r in modes.items():
+            print(f"  {view:<10} {mode:<11} {r['rows']:>7} {r['ms_per_1k']:>8.1f} {r['objects_per_1k']:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print_report(asyncio.run(run(args.leads, args.repeat)))
@@ -0,0 +1,132 @@
+"""
+Lecturas y escrituras concurrentes sobre SQLite, antes y después de los PRAGMAs.
+
+Varios lectores hacen consultas tipo dashboard mientras varios escritores
+insertan leads como el formulario de referidos (un commit por lead). La
+misma base sembrada se copia para cada configuración:
+
+- `default`: journal_mode=DELETE, synchronous=FULL (valores por defecto de SQLite)
+- `tuned`:   los PRAGMAs de la configuración (WAL, synchronous=NORMAL, ...)
+
+    python -m benchmarks.sqlite_concurrency [--seconds 10] [--readers 8] [--writers 2] [--leads 50000]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+CONFIGS = {
+    "default": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "tuned": None,  # sqlite_pragmas() de app.database
+}
+
+
+def _p95(values: list) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * 0.95), len(values) - 1)]
+
+
+async def _reader(session_factory, stop_at: float, latencies: list, errors: list) -> None:
+    from app.models.models import Lead, User
+
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        try:
+            async with session_factory() as db:
+                await db.execute(select(Lead.status, func.count(Lead.id)).group_by(Lead.status))
+                referrer_id = (await db.execute(select(func.min(User.id)).where(User.referral_code.isnot(None)))).scalar()
+                await db.execute(
+                    select(Lead).where(Lead.referrer_id == referrer_id).order_by(Lead.created_at.desc()).limit(50)
+                )
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def _writer(session_factory, stop_at: float, latencies: list, errors: list, worker: int) -> None:
+    from app.models.models import Lead, LeadStatus
+
+    n = 0
+    while time.perf_counter() < stop_at:
+        n += 1
+        started = time.perf_counter()
+        try:
+            async with session_factory() as db:
+                db.add(Lead(
+                    first_name="Bench", last_name=f"W{worker}", email=f"w{worker}-{n}@bench.test",
+                    notes_public="Prado Norte", status=LeadStatus.NUEVO, created_at=datetime.utcnow(),
+                ))
+                await db.commit()
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_config(path: str, pragmas, seconds: float, readers: int, writers: int) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+
+    engine = build_engine(f"sqlite+aiosqlite:///{path}", pragmas=pragmas, pool_size=readers + writers)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    read_latencies, write_latencies, errors = [], [], []
+    stop_at = time.perf_counter() + seconds
+    try:
+        await asyncio.gather(
+            *(_reader(session_factory, stop_at, read_latencies, errors) for _ in range(readers)),
+            *(_writer(session_factory, stop_at, write_latencies, errors, i) for i in range(writers)),
+        )
+    finally:
+        await engine.dispose()
+    return {
+        "reads_per_s": len(read_latencies) / seconds,
+        "writes_per_s": len(write_latencies) / seconds,
+        "read_p95_ms": _p95(read_latencies) * 1000,
+        "write_p95_ms": _p95(write_latencies) * 1000,
+        "errors": len(errors),
+    }
+
+
+async def run(args) -> dict:
+    from scripts.seed_data import seed
+
+    directory = tempfile.mkdtemp(prefix="egp-sqlite-")
+    seeded = os.path.join(directory, "seeded.db")
+    await seed(f"sqlite+aiosqlite:///{seeded}", 2000, 20, args.leads, 42, datetime(2026, 1, 1), "Bench123!", True)
+
+    results = {}
+    for name, pragmas in CONFIGS.items():
+        path = os.path.join(directory, f"{name}.db")
+        shutil.copy(seeded, path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(seeded + suffix):
+                shutil.copy(seeded + suffix, path + suffix)
+        results[name] = await run_config(path, pragmas, args.seconds, args.readers, args.writers)
+    shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def print_report(results: dict, args) -> None:
+    print(f"\n{args.readers} lectores + {args.writers} escritores, {args.seconds:.0f}s, {args.leads} leads sembrados")
+    print(f"  {'config':<8} {'lect/s':>9} {'escr/s':>9} {'lect p95 ms':>12} {'escr p95 ms':>12} {'errores':>8}")
+    for name, r in results.items():
+        print(f"  {name:<8} {r['reads_per_s']:>9.1f} {r['writes_per_s']:>9.1f} "
+              f"{r['read_p95_ms']:>12.1f} {r['write_p95_ms']:>12.1f} {r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--leads", type=int, default=50000)
+    args = parser.parse_args()
+    print_report(asyncio.run(run(args)), args)
@@ -0,0 +1,51 @@
+"""
+Asigna `project_id` a los leads creados antes de la tabla de proyectos.
+
+Reconoce el proyecto en el texto libre de `notes_public` (mismas reglas que
+al crear un lead: sin tildes ni mayúsculas, variantes como "Palma de
+Mallorca" o "Isla Baru") y recalcula los contadores de `projects`. Se puede
+correr varias veces: solo toca leads sin proyecto.
+
+    python -m scripts.backfill_projects
+    python -m scripts.backfill_projects --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+
+async def run_backfill(database_url: str) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.project_service import backfill_lead_projects, seed_projects
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            await seed_projects(db)
+            return await backfill_lead_projects(db)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    started = time.perf_counter()
+    report = asyncio.run(run_backfill(args.database_url or get_settings().DATABASE_URL))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{report['leads_updated']} leads con proyecto en {elapsed:.1f}s: "
+        f"{report['matched_values']} de {report['values']} textos distintos reconocidos"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
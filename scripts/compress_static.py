@@ -0,0 +1,78 @@
+"""
+Genera variantes precomprimidas (.br / .gz) de los assets estáticos.
+
+Se ejecuta en el build, antes de arrancar la app:
+
+    python -m scripts.compress_static [directorio]
+
+`PrecompressedStaticFiles` las sirve cuando el cliente las acepta.
+"""
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt", ".xml", ".ico", ".map"}
+MIN_SIZE = 1024
+
+
+def _write_if_smaller(path: str, data: bytes, original_size: int) -> bool:
+    if len(data) >= original_size:
+        # No vale la pena: se eliminaría una variante vieja si existiera
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def compress_file(path: str) -> list:
+    """Write `.gz` (and `.br` if available) siblings for a single file."""
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    written = []
+    # mtime=0 para que el resultado sea reproducible entre builds
+    if _write_if_smaller(path + ".gz", gzip.compress(raw, compresslevel=9, mtime=0), len(raw)):
+        written.append(path + ".gz")
+    if brotli is not None:
+        if _write_if_smaller(path + ".br", brotli.compress(raw, quality=11), len(raw)):
+            written.append(path + ".br")
+    return written
+
+
+def compress_directory(directory: str) -> list:
+    written = []
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            if os.path.getsize(path) < MIN_SIZE:
+                continue
+            written.extend(compress_file(path))
+    return written
+
+
+def main(argv: list) -> int:
+    directory = argv[1] if len(argv) > 1 else "static"
+    if brotli is None:
+        print("brotli no está instalado: solo se generan variantes .gz")
+    written = compress_directory(directory)
+    for path in written:
+        print(f"  {path} ({os.path.getsize(path)} bytes)")
+    print(f"{len(written)} archivos precomprimidos en {directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,61 @@
+"""
+Importa leads desde un CSV (eventos, listas de aliados) sin pasar por el formulario.
+
+Mismas reglas que POST /admin/import/leads: validación con LeadCreateRequest,
+duplicados por email o teléfono omitidos, asesores por round-robin en bloque
+e inserción por lotes. Acepta los encabezados de LeadCreateRequest o los de la
+exportación (nombre, apellido, telefono, ciudad, proyecto, ...).
+
+    python -m scripts.import_leads leads.csv
+    python -m scripts.import_leads leads.csv --database-url postgresql+asyncpg://... --chunk-size 5000
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from app.services.import_service import IMPORT_CHUNK_SIZE, ImportReport
+
+
+async def run_import(database_url: str, path: str, chunk_size: int) -> ImportReport:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.import_service import import_leads, read_csv_rows
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            async with session_factory() as db:
+                return await import_leads(db, read_csv_rows(f), chunk_size=chunk_size)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="archivo CSV en UTF-8 con fila de encabezados")
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    started = time.perf_counter()
+    report = asyncio.run(run_import(args.database_url or get_settings().DATABASE_URL, args.path, args.chunk_size))
+    elapsed = time.perf_counter() - started
+
+    for error in report.errors:
+        print(f"  línea {error.line} ({error.email or 'sin email'}): {'; '.join(error.errors)}")
+    if report.error_count > len(report.errors):
+        print(f"  ... y {report.error_count - len(report.errors)} errores más")
+    print(
+        f"{report.imported} importados de {report.total} filas en {elapsed:.1f}s: "
+        f"{report.duplicates} duplicados, {report.error_count} con errores, "
+        f"{report.pending_assignment} sin asesor, {report.unknown_referral_codes} con código de referido desconocido"
+    )
+    return 1 if report.error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,66 @@
+"""
+Exporter de métricas en un puerto aparte, sin autenticación.
+
+Lee los archivos que los workers vuelcan en METRICS_DIR (ver app/metrics.py),
+así que corre como un proceso independiente y se enlaza a una interfaz
+interna para que solo Prometheus lo alcance:
+
+    python -m scripts.metrics_exporter [--host 127.0.0.1] [--port 9100]
+    python -m scripts.metrics_exporter --clear   # al desplegar, antes de los workers
+"""
+import argparse
+import sys
+
+from app.config import get_settings
+from app.metrics import CONTENT_TYPE, clear_metrics_dir, collect, render
+
+settings = get_settings()
+
+
+def make_exporter_app(directory: str):
+    """Minimal ASGI app: GET /metrics aggregates `directory`, 404 otherwise."""
+
+    async def exporter_app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["path"] != "/metrics":
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        body = render(collect(directory, include_current=False)).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", CONTENT_TYPE.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return exporter_app
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=settings.METRICS_EXPORTER_HOST)
+    parser.add_argument("--port", type=int, default=settings.METRICS_EXPORTER_PORT)
+    parser.add_argument("--dir", default=settings.METRICS_DIR)
+    parser.add_argument("--clear", action="store_true", help="vaciar el directorio y salir")
+    args = parser.parse_args(argv[1:])
+
+    if not args.dir:
+        print("METRICS_DIR no está configurado: los workers no comparten métricas")
+        return 1
+    if args.clear:
+        print(f"{clear_metrics_dir(args.dir)} archivos eliminados de {args.dir}")
+        return 0
+
+    import uvicorn
+
+    uvicorn.run(make_exporter_app(args.dir), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
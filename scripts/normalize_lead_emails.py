@@ -0,0 +1,47 @@
+"""
+Pasa a minúsculas los emails de los leads guardados antes de la normalización.
+
+Los formularios, la API, el webhook y la importación ya guardan el email en
+minúsculas (LeadCreateRequest); este script corrige los leads anteriores para
+que la detección de duplicados los reconozca. Se corre una vez después del
+despliegue y se puede repetir: solo toca emails con mayúsculas.
+
+    python -m scripts.normalize_lead_emails
+    python -m scripts.normalize_lead_emails --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+
+async def run_normalize(database_url: str) -> int:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.lead_service import normalize_lead_emails
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            return await normalize_lead_emails(db)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    started = time.perf_counter()
+    updated = asyncio.run(run_normalize(args.database_url or get_settings().DATABASE_URL))
+    elapsed = time.perf_counter() - started
+    print(f"{updated} emails de leads pasados a minúsculas en {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
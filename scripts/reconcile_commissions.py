@@ -0,0 +1,48 @@
+"""
+Concilia el libro de comisiones (commission_ledger) con los leads.
+
+Registra como asiento de conciliación la diferencia entre la comisión de
+cada lead (monto y si está pagada) y lo que el libro tiene para ese lead:
+cambios hechos por SQL, cargas con scripts.seed_data, leads anteriores al
+libro. Actualiza los saldos por referidor y el total. Se puede correr varias
+veces: una segunda corrida no registra asientos.
+
+    python -m scripts.reconcile_commissions
+    python -m scripts.reconcile_commissions --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+
+async def run_reconcile(database_url: str) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.commission_service import reconcile_commission_ledger
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            return await reconcile_commission_ledger(db)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    started = time.perf_counter()
+    report = asyncio.run(run_reconcile(args.database_url or get_settings().DATABASE_URL))
+    elapsed = time.perf_counter() - started
+    print(f"{report['entries']} asientos de conciliación en {elapsed:.1f}s ({report['leads']} leads revisados)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
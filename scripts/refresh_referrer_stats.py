@@ -0,0 +1,47 @@
+"""
+Reconstruye los contadores del panel de referidores (referrer_stats).
+
+Recalcula desde la tabla leads el total de referidos, los cierres y los
+leads con fecha de pago de cada referidor activo, sus medallas y su puesto
+en el ranking. Corrige cambios hechos por SQL, cargas con scripts.seed_data
+y referidores desactivados. Se puede correr varias veces.
+
+    python -m scripts.refresh_referrer_stats
+    python -m scripts.refresh_referrer_stats --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+
+async def run_refresh(database_url: str) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.referrer_stats_service import rebuild_referrer_stats
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            return await rebuild_referrer_stats(db)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    started = time.perf_counter()
+    report = asyncio.run(run_refresh(args.database_url or get_settings().DATABASE_URL))
+    elapsed = time.perf_counter() - started
+    print(f"{report['referrers']} referidores reconstruidos en {elapsed:.1f}s ({report['ranked']} en el ranking)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,58 @@
+"""
+Conciliación nocturna de los resúmenes diarios de leads (lead_daily_rollups).
+
+Recalcula `created` y `transitions` de los últimos días desde leads.created_at
+y el historial de estados (lead_status_events), y registra en
+el último día cualquier diferencia entre los resúmenes y los ganados,
+perdidos y comisiones actuales (cambios hechos por fuera de la app). Se
+puede correr varias veces: una segunda corrida no registra correcciones.
+Si la tabla de resúmenes está vacía, reconstruye todo el historial.
+
+    python -m scripts.rollup_catchup                 # ayer y hoy
+    python -m scripts.rollup_catchup --days 30
+    python -m scripts.rollup_catchup --since 2026-01-01 --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+
+async def run_catch_up(database_url: str, since: date, until: date) -> dict:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.database import build_engine
+    from app.services.rollup_service import catch_up_rollups, open_daily_rollups
+
+    engine = build_engine(database_url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            return await open_daily_rollups(db) or await catch_up_rollups(db, since, until)
+    finally:
+        await engine.dispose()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=2, help="días hacia atrás incluyendo hoy (por defecto 2)")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, help="fecha inicial AAAA-MM-DD")
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    until = datetime.utcnow().date()
+    since = args.since or until - timedelta(days=max(args.days, 1) - 1)
+    started = time.perf_counter()
+    report = asyncio.run(run_catch_up(args.database_url or get_settings().DATABASE_URL, since, until))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{report['days']} días conciliados en {elapsed:.1f}s: "
+        f"{report['created']} leads nuevos, {report['corrections']} correcciones"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,335 @@
+"""
+Siembra volúmenes de producción con datos sintéticos deterministas.
+
+Mismo `--seed` y mismo `--until` producen exactamente las mismas filas. Los
+estados, motivos de pérdida y UTM salen de los enums reales de
+app/models/models.py. La carga es por lotes: `executemany` en SQLite y
+`COPY` (copy_records_to_table) en asyncpg.
+
+    python -m scripts.seed_data --reset                        # 50k referidores, 200 asesores, 1M leads
+    python -m scripts.seed_data --referidores 500 --leads 10000 --database-url sqlite+aiosqlite:///./dev.db
+
+Sin `--reset` las filas se agregan después de los ids existentes. Todos los
+usuarios sembrados tienen la contraseña `--password`.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Sequence
+
+from app.models.models import LeadStatus, LossReason, UserRole
+from app.services.project_service import PROJECTS as PROJECT_INFO
+
+CHUNK_SIZE = 20000
+DEFAULT_UNTIL = "2026-01-01"
+HISTORY_DAYS = 730
+
+PROJECTS = [(p.name, p.id) for p in PROJECT_INFO]
+CITIES = ["Cartagena", "Bogotá", "Medellín", "Barranquilla", "Cali", "Bucaramanga", "Santa Marta", None]
+FIRST_NAMES = ["Camila", "Santiago", "Valentina", "Sebastián", "Mariana", "Andrés", "Laura", "Juan",
+               "Daniela", "Carlos", "Isabella", "Felipe", "Sofía", "Mateo", "Paula", "Diego"]
+LAST_NAMES = ["García", "Rodríguez", "Martínez", "López", "González", "Pérez", "Gómez", "Díaz",
+              "Torres", "Ramírez", "Vargas", "Castro", "Rojas", "Moreno", "Ortiz", "Herrera"]
+
+# Mezcla de estados como en producción: muchos nuevos y perdidos, pocas ventas
+STATUS_WEIGHTS = {
+    LeadStatus.NUEVO: 16,
+    LeadStatus.CONTACTANDO: 14,
+    LeadStatus.CONTACTO_ESTABLECIDO: 9,
+    LeadStatus.PERFILADO: 7,
+    LeadStatus.LLAMADA_AGENDADA: 5,
+    LeadStatus.VISITA_AGENDADA: 4,
+    LeadStatus.PROPUESTA_REALIZADA: 4,
+    LeadStatus.CALIFICADO_FRIO: 8,
+    LeadStatus.GANADA: 4,
+    LeadStatus.PERDIDA: 27,
+    LeadStatus.PENDING_ASSIGNMENT: 2,
+}
+LOSS_REASON_WEIGHTS = {
+    LossReason.NUNCA_CONTESTO: 22, LossReason.DATOS_INCORRECTOS: 8, LossReason.YA_COMPRO: 4,
+    LossReason.NO_ES_EL_MOMENTO: 15, LossReason.SPAM: 3, LossReason.DEJO_DE_RESPONDER: 14,
+    LossReason.PRECIO: 10, LossReason.TIEMPO_DE_ENTREGA: 3, LossReason.UBICACION: 5,
+    LossReason.AMENIDADES: 1, LossReason.NO_LE_INTERESA: 7, LossReason.COMPRO_EN_OTRO_PROYECTO: 3,
+    LossReason.PLAN_PAGO_NO_ACEPTADO: 3, LossReason.MAL_PERFILADO: 2,
+}
+# (utm_source, utm_medium) con su peso; None = tráfico directo del link de referido
+UTM_SOURCES = [
+    (("facebook", "cpc"), 22), (("instagram", "social"), 20), (("google", "cpc"), 12),
+    (("whatsapp", "referral"), 18), (("tiktok", "social"), 5), ((None, None), 23),
+]
+UTM_CAMPAIGNS = ["lanzamiento_isla_baru", "preventa_prado_norte", "vacaciones_2025", "referidos_q4", "feria_vivienda"]
+UTM_CONTENTS = ["video_drone", "carrusel", "testimonio", "banner", None]
+NOTE_TEXTS = [
+    "Llamada de seguimiento", "No contestó, se deja mensaje", "Interesado en apartamento de 2 alcobas",
+    "Envié brochure por WhatsApp", "Pide plan de pagos", "Agendó visita a sala de ventas",
+]
+TASK_TEXTS = ["Enviar brochure", "Confirmar visita", "Validar datos de contacto", "Enviar cotización"]
+COMMISSIONS = [500000.0, 750000.0, 1000000.0, 1500000.0]
+
+USER_COLUMNS = ("id", "role", "name", "last_name", "email", "phone", "password_hash",
+                "is_active", "referral_code", "created_at")
+LEAD_COLUMNS = ("id", "first_name", "last_name", "email", "phone", "city", "notes_public", "project_id", "status",
+                "loss_reason", "referrer_id", "advisor_id", "assigned_at", "utm_source", "utm_medium",
+                "utm_campaign", "utm_content", "payment_date", "commission_amount", "commission_paid",
+                "created_at")
+NOTE_COLUMNS = ("id", "lead_id", "advisor_id", "note", "created_at")
+TASK_COLUMNS = ("id", "lead_id", "task", "is_completed", "created_at", "due_date")
+
+
+def _weighted(rng: random.Random, weights: dict, k: int) -> list:
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+class Seeder:
+    """Generates rows as tuples in `*_COLUMNS` order, chunk by chunk."""
+
+    def __init__(self, seed: int, until: datetime, password_hash: str, offsets: dict):
+        self.rng = random.Random(seed)
+        self.until = until
+        self.password_hash = password_hash
+        self.offsets = offsets
+        self.advisor_ids: List[int] = []
+        self.referrer_ids: List[int] = []
+
+    def _past(self, max_days: int = HISTORY_DAYS) -> datetime:
+        return self.until - timedelta(seconds=self.rng.randrange(max_days * 86400))
+
+    def users(self, referidores: int, asesores: int) -> Iterator[tuple]:
+        next_id = self.offsets["users"]
+        tag = next_id  # evita choques de email/código al agregar sobre datos existentes
+        for i in range(asesores):
+            next_id += 1
+            self.advisor_ids.append(next_id)
+            yield (next_id, UserRole.ASESOR.value, self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+                   f"asesor{tag}-{i}@seed.test", f"31{self.rng.randrange(10 ** 8):08d}", self.password_hash,
+                   self.rng.random() > 0.05, None, self._past())
+        for i in range(referidores):
+            next_id += 1
+            self.referrer_ids.append(next_id)
+            yield (next_id, UserRole.REFERIDOR.value, self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES),
+                   f"referidor{tag}-{i}@seed.test", f"30{self.rng.randrange(10 ** 8):08d}", self.password_hash,
+                   self.rng.random() > 0.02, f"S{tag:x}R{i:x}".upper()[:20], self._past())
+
+    def leads(self, count: int, notes: list, tasks: list) -> Iterator[tuple]:
+        """Yield leads; their notes and tasks are appended to `notes` / `tasks`."""
+        rng = self.rng
+        statuses = _weighted(rng, STATUS_WEIGHTS, count)
+        referrers = self.referrer_ids
+        advisors = list(self.advisor_ids) or [None]
+        sources = [s for s, _w in UTM_SOURCES]
+        source_weights = [w for _s, w in UTM_SOURCES]
+        note_id = self.offsets["lead_notes"]
+        task_id = self.offsets["lead_admin_tasks"]
+        lead_id = self.offsets["leads"]
+        for status in statuses:
+            lead_id += 1
+            created_at = self._past()
+            # Pocos referidores traen la mayoría de los leads
+            referrer_id = referrers[int(len(referrers) * rng.random() ** 3)] if referrers and rng.random() < 0.9 else None
+            pending = status == LeadStatus.PENDING_ASSIGNMENT or advisors[0] is None
+            advisor_id = None if pending else rng.choice(advisors)
+            source, medium = rng.choices(sources, weights=source_weights)[0]
+            won = status == LeadStatus.GANADA
+            project_name, project_id = rng.choice(PROJECTS)
+            yield (
+                lead_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"lead{lead_id}@seed.test",
+                f"3{rng.randrange(10 ** 9):09d}", rng.choice(CITIES), project_name, project_id,
+                (LeadStatus.PENDING_ASSIGNMENT if pending else status).value,
+                _weighted(rng, LOSS_REASON_WEIGHTS, 1)[0].value if status == LeadStatus.PERDIDA else None,
+                referrer_id, advisor_id,
+                None if pending else created_at + timedelta(minutes=rng.randrange(1, 240)),
+                source, medium,
+                rng.choice(UTM_CAMPAIGNS) if source else None,
+                rng.choice(UTM_CONTENTS) if source else None,
+                (created_at + timedelta(days=rng.randrange(5, 90))).date() if won else None,
+                rng.choice(COMMISSIONS) if won else None,
+                won and rng.random() < 0.6,
+                created_at,
+            )
+            if advisor_id is not None:
+                for n in range(rng.choices((0, 1, 2, 3, 4), weights=(20, 30, 25, 15, 10))[0]):
+                    note_id += 1
+                    notes.append((note_id, lead_id, advisor_id, rng.choice(NOTE_TEXTS),
+                                  created_at + timedelta(hours=12 * (n + 1))))
+            if rng.random() < 0.3:
+                for n in range(rng.randint(1, 2)):
+                    task_id += 1
+                    tasks.append((task_id, lead_id, rng.choice(TASK_TEXTS), rng.random() < 0.5,
+                                  created_at + timedelta(hours=n + 1),
+                                  created_at + timedelta(days=rng.randrange(1, 15)) if rng.random() < 0.7 else None))
+
+
+def chunks(rows: Iterator[tuple], size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- Escritura por lotes ------------------------------------------------------
+
+def _sqlite_value(value):
+    # Mismo formato en el que SQLAlchemy guarda DateTime/Date/Boolean en SQLite
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class BulkWriter:
+    """`executemany` on SQLite, binary `COPY` on asyncpg, over the raw driver connection."""
+
+    def __init__(self, raw_connection, dialect: str):
+        self.raw = raw_connection
+        self.dialect = dialect
+
+    async def write(self, table: str, columns: Sequence[str], rows: List[tuple]) -> None:
+        if not rows:
+            return
+        if self.dialect == "postgresql":
+            await self.raw.copy_records_to_table(table, records=rows, columns=list(columns))
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            await self.raw.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                [tuple(_sqlite_value(v) for v in row) for row in rows],
+            )
+
+
+async def _max_ids(conn, tables: Sequence[str]) -> dict:
+    from sqlalchemy import text
+
+    offsets = {}
+    for table in tables:
+        offsets[table] = (await conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}"))).scalar()
+    return offsets
+
+
+async def seed(database_url: str, referidores: int, asesores: int, leads: int, seed_value: int,
+               until: datetime, password: str, reset: bool) -> dict:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(database_url)
+    try:
+        return await _seed(engine, referidores, asesores, leads, seed_value, until, password, reset)
+    finally:
+        await engine.dispose()
+
+
+async def _seed(engine, referidores, asesores, leads, seed_value, until, password, reset) -> dict:
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.database import Base
+    from app.services.auth_service import hash_password
+    from app.services.project_service import refresh_project_counts, seed_projects
+    from app.services.commission_service import reconcile_commission_ledger
+    from app.services.referrer_stats_service import rebuild_referrer_stats
+    from app.services.rollup_service import catch_up_rollups
+
+    dialect = engine.dialect.name
+    async with engine.begin() as conn:
+        if reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        offsets = await _max_ids(conn, ("users", "leads", "lead_notes", "lead_admin_tasks"))
+        if not (await conn.execute(text("SELECT COUNT(*) FROM assignment_state"))).scalar():
+            await conn.execute(text("INSERT INTO assignment_state (id, updated_at) VALUES (1, CURRENT_TIMESTAMP)"))
+    async with AsyncSession(engine) as db:
+        await seed_projects(db)
+
+    # Un solo hash: bcrypt por usuario dominaría el tiempo total
+    seeder = Seeder(seed_value, until, hash_password(password), offsets)
+    counts = {"users": 0, "leads": 0, "lead_notes": 0, "lead_admin_tasks": 0}
+
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        if dialect == "sqlite":
+            # Carga masiva: el archivo se puede regenerar si algo falla
+            await raw.execute("PRAGMA journal_mode=WAL")
+            await raw.execute("PRAGMA synchronous=OFF")
+        writer = BulkWriter(raw, dialect)
+
+        for chunk in chunks(seeder.users(referidores, asesores)):
+            await writer.write("users", USER_COLUMNS, chunk)
+            counts["users"] += len(chunk)
+
+        notes, tasks = [], []
+        for chunk in chunks(seeder.leads(leads, notes, tasks)):
+            await writer.write("leads", LEAD_COLUMNS, chunk)
+            await writer.write("lead_notes", NOTE_COLUMNS, notes)
+            await writer.write("lead_admin_tasks", TASK_COLUMNS, tasks)
+            counts["leads"] += len(chunk)
+            counts["lead_notes"] += len(notes)
+            counts["lead_admin_tasks"] += len(tasks)
+            notes.clear()
+            tasks.clear()
+
+        if dialect == "sqlite":
+            await raw.commit()
+            await raw.execute("PRAGMA synchronous=FULL")
+        else:
+            # COPY con ids explícitos no mueve las secuencias SERIAL
+            for table in counts:
+                await raw.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                )
+        await conn.commit()
+
+    async with AsyncSession(engine) as db:
+        await refresh_project_counts(db)
+        # Resúmenes diarios de todo el rango cargado (gráficas del admin)
+        first = (await db.execute(text("SELECT MIN(created_at) FROM leads"))).scalar()
+        if first is not None:
+            first = datetime.fromisoformat(first) if isinstance(first, str) else first
+            await catch_up_rollups(db, first.date(), max(until.date(), datetime.utcnow().date()))
+        # Saldos de comisiones de los leads cargados
+        await reconcile_commission_ledger(db)
+        # Contadores del panel de referidores
+        await rebuild_referrer_stats(db)
+
+    # Estadísticas del planner al día tras la carga
+    async with engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+    return counts
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--referidores", type=int, default=50000)
+    parser.add_argument("--asesores", type=int, default=200)
+    parser.add_argument("--leads", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--until", default=DEFAULT_UNTIL, help="fecha de la actividad más reciente (YYYY-MM-DD)")
+    parser.add_argument("--password", default="Seed123!")
+    parser.add_argument("--database-url", default=None, help="por defecto DATABASE_URL de la configuración")
+    parser.add_argument("--reset", action="store_true", help="borrar y recrear todas las tablas antes de sembrar")
+    args = parser.parse_args(argv[1:])
+
+    from app.config import get_settings
+
+    database_url = args.database_url or get_settings().DATABASE_URL
+    started = time.perf_counter()
+    counts = asyncio.run(seed(
+        database_url, args.referidores, args.asesores, args.leads, args.seed,
+        datetime.fromisoformat(args.until), args.password, args.reset,
+    ))
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"  {table:<18} {count:>10}")
+    print(f"Sembrado en {elapsed:.1f}s ({counts['leads'] / elapsed:,.0f} leads/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,46 @@
+"""
+Réplica local de SQLite para probar DATABASE_READ_URL sin Postgres.
+
+Copia el archivo primario sobre la réplica con la API de backup de SQLite
+cada `--interval` segundos, lo que además simula el retraso de replicación:
+
+    python -m scripts.sqlite_replica referidos.db referidos-replica.db [--interval 2] [--once]
+
+y en .env: DATABASE_READ_URL=sqlite+aiosqlite:///./referidos-replica.db
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+
+def copy_database(primary: str, replica: str) -> None:
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        # Copia consistente aunque el primario esté recibiendo escrituras
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--interval", type=float, default=2.0, help="segundos entre copias (retraso simulado)")
+    parser.add_argument("--once", action="store_true")
+    args = parser.parse_args(argv[1:])
+
+    while True:
+        started = time.perf_counter()
+        copy_database(args.primary, args.replica)
+        print(f"réplica actualizada en {(time.perf_counter() - started) * 1000:.0f} ms")
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -2,13 +2,20 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db, read_session_factory
 from app.main import app
+from app.models.models import User, UserRole
+from app.services.auth_service import create_access_token
+from app.instrumentation import QueryRecorder, instrument_engine
+from app.services.page_cache import page_cache
+from app.services.project_service import seed_projects
+from app.services.referral_cache import referral_cache
 
 # Test database (in-memory SQLite)
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 test_engine = create_async_engine(TEST_DATABASE_URL, echo=False)
+instrument_engine(test_engine)
 TestSessionLocal = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -21,12 +28,18 @@ async def override_get_db():
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
+app.dependency_overrides[read_session_factory] = lambda: TestSessionLocal
 
 
 @pytest_asyncio.fixture(autouse=True)
 async def setup_db():
+    page_cache.invalidate()
+    referral_cache.invalidate()
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    async with TestSessionLocal() as session:
+        await seed_projects(session)
     yield
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -43,3 +56,42 @@ async def client():
 async def db_session():
     async with TestSessionLocal() as session:
         yield session
+
+
+@pytest.fixture
+def query_recorder():
+    """Records the SQL run against the test engine (see app.instrumentation)."""
+    with QueryRecorder(test_engine) as recorder:
+        yield recorder
+
+
+def login(client: AsyncClient, user: User) -> None:
+    """Authenticate `client` as `user` through the access_token cookie."""
+    client.cookies.set("access_token", create_access_token({"sub": str(user.id), "role": user.role.value}))
+
+
+@pytest_asyncio.fixture
+async def users(db_session: AsyncSession) -> dict:
+    """
+    An admin, two advisors and three referrers (codes REFTEST0..REFTEST2),
+    committed; ids are captured so tests may expire the session afterwards.
+    """
+    admin = User(name="Admin", last_name="Test", email="admin@users.test", password_hash="x", role=UserRole.ADMIN)
+    advisors = [
+        User(name=f"Asesor{i}", last_name="Test", email=f"asesor{i}@users.test", password_hash="x", role=UserRole.ASESOR)
+        for i in range(2)
+    ]
+    referrers = [
+        User(name=f"Ref{i}", last_name="Test", email=f"ref{i}@users.test", password_hash="x",
+             role=UserRole.REFERIDOR, referral_code=f"REFTEST{i}")
+        for i in range(3)
+    ]
+    db_session.add_all([admin, *advisors, *referrers])
+    await db_session.commit()
+    return {
+        "admin": admin, "advisor": advisors[0], "advisors": advisors,
+        "referrer": referrers[0], "referrers": referrers,
+        "admin_id": admin.id, "advisor_id": advisors[0].id, "advisor_ids": [a.id for a in advisors],
+        "referrer_id": referrers[0].id, "referrer_ids": [r.id for r in referrers],
+        "codes": [r.referral_code for r in referrers],
+    }
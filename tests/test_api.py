@@ -214,3 +214,66 @@ async def test_no_advisors_returns_none(db_session: AsyncSession):
     """Test that no active advisors returns None."""
     aid = await get_next_advisor(db_session)
     assert aid is None
+
+
+@pytest.mark.asyncio
+async def test_referral_landing_page_cache(client: AsyncClient, db_session: AsyncSession):
+    """Anonymous landing hits come from the page cache and still set the cookie."""
+    user = User(
+        name="Cached",
+        last_name="Referrer",
+        email="cached@test.com",
+        password_hash=hash_password("Test123!"),
+        role=UserRole.REFERIDOR,
+        referral_code="CACHE123",
+    )
+    db_session.add(user)
+    await db_session.commit()
+
+    first = await client.get("/r/CACHE123?utm_source=facebook")
+    assert first.headers["x-page-cache"] == "miss"
+
+    client.cookies.clear()
+    second = await client.get("/r/CACHE123?utm_source=facebook")
+    assert second.headers["x-page-cache"] == "hit"
+    assert second.text == first.text
+    assert "referral_code=CACHE123" in second.headers["set-cookie"]
+
+    # Different UTM values are a different entry
+    other = await client.get("/r/CACHE123?utm_source=instagram")
+    assert other.headers["x-page-cache"] == "miss"
+
+    # Requests with a session cookie bypass the cache
+    client.cookies.set("access_token", "whatever")
+    bypass = await client.get("/r/CACHE123?utm_source=facebook")
+    assert "x-page-cache" not in bypass.headers
+
+
+@pytest.mark.asyncio
+async def test_referral_code_cache_invalidation(db_session: AsyncSession):
+    """Resolved codes are cached, negatives too, and dropped on deactivation."""
+    from app.services.referral_cache import referral_cache, resolve_referral_code
+
+    assert await resolve_referral_code(db_session, "NOPE0000") is None
+    assert "NOPE0000" in referral_cache
+
+    user = User(
+        name="Cache",
+        last_name="Code",
+        email="cachecode@test.com",
+        password_hash=hash_password("Test123!"),
+        role=UserRole.REFERIDOR,
+        referral_code="CODE0001",
+    )
+    db_session.add(user)
+    await db_session.commit()
+
+    info = await resolve_referral_code(db_session, "CODE0001")
+    assert info.display_name == "Cache Code" and info.is_active
+
+    user.is_active = False
+    await db_session.commit()
+    assert "CODE0001" not in referral_cache
+
+    info = await resolve_referral_code(db_session, "CODE0001")
+    assert info.id == user.id and not info.is_active
@@ -0,0 +1,193 @@
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+from app.models.models import Lead, LeadAdminTask, LeadStatus
+from app.services.lead_service import reassign_values
+from conftest import login
+
+
+@pytest_asyncio.fixture
+async def dataset(db_session: AsyncSession, users) -> dict:
+    advisors, referrer = users["advisors"], users["referrer"]
+    # Mismo created_at en parejas para que el cursor tenga que desempatar por id
+    base = datetime(2026, 3, 1, 12, 0)
+    for i in range(10):
+        db_session.add(Lead(
+            first_name=f"Lead{i}", last_name="Api", email=f"lead{i}@api.test", notes_public="Prado Norte",
+            referrer_id=referrer.id if i % 2 == 0 else None, advisor_id=advisors[i % 2].id,
+            status=LeadStatus.NUEVO if i < 5 else LeadStatus.CONTACTANDO,
+            created_at=base + timedelta(hours=i // 2),
+        ))
+    await db_session.commit()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_list_leads_requires_auth(client: AsyncClient):
+    response = await client.get("/api/v1/leads")
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_list_leads_is_scoped_by_role(client: AsyncClient, dataset):
+    login(client, dataset["admin"])
+    assert len((await client.get("/api/v1/leads")).json()["items"]) == 10
+
+    login(client, dataset["advisors"][0])
+    items = (await client.get("/api/v1/leads?fields=advisor_name")).json()["items"]
+    assert len(items) == 5
+    assert {item["advisor_name"] for item in items} == {"Asesor0 Test"}
+
+    login(client, dataset["referrer"])
+    items = (await client.get("/api/v1/leads?fields=referrer_name&advisor_id=%d" % dataset["advisors"][1].id)).json()["items"]
+    assert items == []
+
+
+@pytest.mark.asyncio
+async def test_list_leads_keyset_pagination(client: AsyncClient, dataset):
+    login(client, dataset["admin"])
+    seen, cursor = [], None
+    while True:
+        url = "/api/v1/leads?fields=id&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = (await client.get(url)).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 10 and len(set(seen)) == 10
+
+    response = await client.get("/api/v1/leads?cursor=no-es-un-cursor")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_advances_within_one_second(client: AsyncClient, users):
+    # Leads del camino normal, creados dentro del mismo segundo
+    created = []
+    for i in range(7):
+        response = await client.post("/api/v1/leads", json={
+            "first_name": "Misma", "last_name": "Hora", "email": f"mismo{i}@example.com",
+        })
+        created.append(response.json()["id"])
+
+    login(client, users["admin"])
+    seen, cursor, pages = [], None, 0
+    while pages < 10:
+        url = "/api/v1/leads?fields=id&limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = (await client.get(url)).json()
+        seen += [item["id"] for item in page["items"]]
+        cursor, pages = page["next_cursor"], pages + 1
+        if cursor is None:
+            break
+    assert seen == sorted(created, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_list_leads_filters_and_fields(client: AsyncClient, dataset):
+    login(client, dataset["admin"])
+    response = await client.get("/api/v1/leads?status=CONTACTANDO&fields=id,status")
+    items = response.json()["items"]
+    assert len(items) == 5
+    assert all(set(item) == {"id", "status"} and item["status"] == "CONTACTANDO" for item in items)
+
+    response = await client.get("/api/v1/leads?created_from=2026-03-01&created_to=2026-03-01&fields=id")
+    assert len(response.json()["items"]) == 10
+    response = await client.get("/api/v1/leads?created_from=2026-03-02")
+    assert response.json()["items"] == []
+
+    assert (await client.get("/api/v1/leads?fields=password_hash")).status_code == 400
+    assert (await client.get("/api/v1/leads?status=inventado")).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_list_leads_etag(client: AsyncClient, dataset):
+    login(client, dataset["admin"])
+    response = await client.get("/api/v1/leads")
+    etag = response.headers["etag"]
+    assert "Cookie" in response.headers["vary"]
+
+    response = await client.get("/api/v1/leads", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_create_lead_api(client: AsyncClient, dataset):
+    response = await client.post("/api/v1/leads", json={
+        "first_name": "Nueva", "last_name": "Api", "email": "nueva@example.com", "referral_code": "REFTEST0",
+    })
+    assert response.status_code == 201
+    assert response.json()["status"] == "NUEVO"
+
+    response = await client.post("/api/v1/leads", json={"first_name": "X", "last_name": "Api", "email": "mal"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_bulk_set_status_checks_ownership(client: AsyncClient, dataset, db_session: AsyncSession):
+    advisor = dataset["advisors"][0]
+    login(client, advisor)
+    own = (await client.get("/api/v1/leads?fields=id")).json()["items"]
+    login(client, dataset["admin"])
+    all_ids = [item["id"] for item in (await client.get("/api/v1/leads?fields=id")).json()["items"]]
+    own_ids = {item["id"] for item in own}
+    other_id = next(i for i in all_ids if i not in own_ids)
+
+    login(client, advisor)
+    response = await client.post("/api/v1/leads/bulk", json={
+        "lead_ids": [*own_ids, other_id, 99999], "operation": "set_status",
+        "status": "PERDIDA", "loss_reason": "Precio",
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == len(own_ids)
+    outcomes = {r["id"]: r["outcome"] for r in body["results"]}
+    assert outcomes[other_id] == "forbidden" and outcomes[99999] == "not_found"
+
+    result = await db_session.execute(select(Lead.status, Lead.loss_reason).where(Lead.id.in_(own_ids)))
+    assert set(result.all()) == {(LeadStatus.PERDIDA, "Precio")}
+
+
+@pytest.mark.asyncio
+async def test_bulk_reassign_and_tasks(client: AsyncClient, dataset, db_session: AsyncSession):
+    pending = Lead(first_name="Pend", last_name="Api", email="pend@api.test", status=LeadStatus.PENDING_ASSIGNMENT)
+    db_session.add(pending)
+    await db_session.commit()
+    target = dataset["advisors"][1]
+
+    login(client, dataset["advisors"][0])
+    response = await client.post("/api/v1/leads/bulk", json={
+        "lead_ids": [pending.id], "operation": "reassign", "advisor_id": target.id,
+    })
+    assert response.status_code == 403
+
+    login(client, dataset["admin"])
+    response = await client.post("/api/v1/leads/bulk", json={
+        "lead_ids": [pending.id], "operation": "reassign", "advisor_id": target.id,
+    })
+    assert response.json()["updated"] == 1
+    response = await client.post("/api/v1/leads/bulk", json={
+        "lead_ids": [pending.id], "operation": "add_task", "task": "Enviar brochure",
+    })
+    assert response.json()["updated"] == 1
+    response = await client.post("/api/v1/leads/bulk", json={"lead_ids": [pending.id], "operation": "add_task"})
+    assert response.status_code == 422
+
+    pending_id, target_id = pending.id, target.id
+    db_session.expire_all()
+    lead = (await db_session.execute(select(Lead).where(Lead.id == pending_id))).scalar_one()
+    assert lead.advisor_id == target_id and lead.status == LeadStatus.NUEVO
+    tasks = (await db_session.execute(select(LeadAdminTask.task).where(LeadAdminTask.lead_id == pending_id))).scalars().all()
+    assert tasks == ["Enviar brochure"]
+
+
+def test_bulk_reassign_status_binds_the_enum_type():
+    # Postgres rechaza un CASE que mezcla VARCHAR con el enum leadstatus
+    stmt = update(Lead).values(**reassign_values(1, datetime(2026, 5, 1)))
+    sql = str(stmt.compile(dialect=postgresql.asyncpg.dialect()))
+    assert "THEN $2::leadstatus ELSE leads.status END" in sql
+    assert "VARCHAR" not in sql
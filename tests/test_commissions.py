@@ -0,0 +1,101 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Lead, LeadStatus, CommissionLedgerEntry
+from app.services.commission_service import (
+    CommissionTotals, commission_totals, open_commission_ledger, reconcile_commission_ledger,
+)
+from conftest import login
+
+
+@pytest_asyncio.fixture
+async def setup(db_session: AsyncSession, users) -> dict:
+    leads = [
+        Lead(first_name=f"Lead{i}", last_name="Com", email=f"lead{i}@example.com", status=LeadStatus.GANADA,
+             advisor_id=users["advisor_id"], referrer_id=users["referrer_ids"][i % 2])
+        for i in range(4)
+    ]
+    db_session.add_all(leads)
+    await db_session.commit()
+    return {**users, "lead_ids": [lead.id for lead in leads]}
+
+
+async def ledger(db: AsyncSession) -> list:
+    return (await db.execute(select(CommissionLedgerEntry).order_by(CommissionLedgerEntry.id))).scalars().all()
+
+
+@pytest.mark.asyncio
+async def test_commission_edits_keep_running_balances(client: AsyncClient, db_session: AsyncSession, setup):
+    lead_id, referrer_id = setup["lead_ids"][0], setup["referrer_ids"][0]
+    login(client, setup["advisor"])
+    base = f"/dashboard/asesor/leads/{lead_id}/commission"
+    await client.post(base, data={"commission": "1000"})
+    await client.post(base, data={"commission": "1500"})
+    await client.post(base, data={"commission": "1500", "commission_paid": "on"})
+    assert await commission_totals(db_session, referrer_id) == CommissionTotals(0.0, 1500.0)
+
+    login(client, setup["admin"])
+    await client.post(f"/admin/leads/{lead_id}/toggle-payment")
+    assert await commission_totals(db_session, referrer_id) == CommissionTotals(1500.0, 0.0)
+    assert await commission_totals(db_session) == CommissionTotals(1500.0, 0.0)
+
+    entries = await ledger(db_session)
+    assert [e.kind for e in entries] == ["accrual", "adjustment", "payout", "reversal"]
+    assert [(e.unpaid_balance, e.paid_balance) for e in entries] == [
+        (1000.0, 0.0), (1500.0, 0.0), (0.0, 1500.0), (1500.0, 0.0),
+    ]
+    assert all(e.referrer_id == referrer_id for e in entries)
+
+
+@pytest.mark.asyncio
+async def test_payout_batch_returns_statement_per_referrer(
+    client: AsyncClient, db_session: AsyncSession, setup, query_recorder,
+):
+    amounts = [100.0, 200.0, 300.0, None]
+    for lead_id, amount in zip(setup["lead_ids"], amounts):
+        await db_session.execute(update(Lead).where(Lead.id == lead_id).values(commission_amount=amount))
+    await db_session.commit()
+    await reconcile_commission_ledger(db_session)
+    ref_a, ref_b = setup["referrer_ids"][:2]
+    assert await commission_totals(db_session, ref_a) == CommissionTotals(400.0, 0.0)
+
+    login(client, setup["admin"])
+    query_recorder.clear()
+    response = await client.post("/api/v1/commissions/payouts", json={"lead_ids": setup["lead_ids"], "note": "Abril"})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["paid_leads"], body["total"]) == (3, 600.0)
+    # Un solo UPDATE marca todos los leads pagados
+    assert sum(1 for sql in query_recorder.statements if sql.lstrip().upper().startswith("UPDATE LEADS")) == 1
+
+    statements = {s["referrer_id"]: s for s in body["statements"]}
+    assert statements[ref_a]["referrer_name"] == "Ref0 Test"
+    assert [line["amount"] for line in statements[ref_a]["lines"]] == [100.0, 300.0]
+    assert (statements[ref_a]["total"], statements[ref_a]["paid_balance"], statements[ref_a]["unpaid_balance"]) == (400.0, 400.0, 0.0)
+    assert (statements[ref_b]["lead_count"], statements[ref_b]["total"]) == (1, 200.0)
+    assert await commission_totals(db_session) == CommissionTotals(0.0, 600.0)
+
+    again = (await client.post("/api/v1/commissions/payouts", json={"referrer_ids": [ref_a, ref_b]})).json()
+    assert again["paid_leads"] == 0 and again["statements"] == []
+
+    login(client, setup["advisor"])
+    assert (await client.post("/api/v1/commissions/payouts", json={"lead_ids": [1]})).status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_reconcile_books_out_of_band_changes(db_session: AsyncSession, setup):
+    # Comisiones anteriores al libro: se abren una sola vez
+    await db_session.execute(update(Lead).values(commission_amount=250.0))
+    await db_session.execute(update(Lead).where(Lead.id == setup["lead_ids"][0]).values(commission_paid=True))
+    await db_session.commit()
+    assert (await open_commission_ledger(db_session))["entries"] == 4
+    assert await open_commission_ledger(db_session) is None
+    assert await commission_totals(db_session) == CommissionTotals(750.0, 250.0)
+
+    await db_session.execute(update(Lead).where(Lead.id == setup["lead_ids"][1]).values(commission_amount=None))
+    await db_session.commit()
+    assert (await reconcile_commission_ledger(db_session))["entries"] == 1
+    assert (await reconcile_commission_ledger(db_session))["entries"] == 0
+    assert await commission_totals(db_session) == CommissionTotals(500.0, 250.0)
@@ -0,0 +1,65 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead, LeadStatus, LeadAdminTask
+from app.services.auth_service import create_access_token
+
+FRAGMENT = {"HX-Request": "true"}
+
+
+@pytest_asyncio.fixture
+async def advisor_lead(client: AsyncClient, db_session: AsyncSession) -> dict:
+    advisor = User(name="Asesor", last_name="Frag", email="asesor@frag.test", password_hash="x", role=UserRole.ASESOR)
+    referrer = User(
+        name="Ref", last_name="Frag", email="ref@frag.test", password_hash="x",
+        role=UserRole.REFERIDOR, referral_code="FRAG0001",
+    )
+    db_session.add_all([advisor, referrer])
+    await db_session.flush()
+    lead = Lead(
+        first_name="Laura", last_name="Frag", email="laura@frag.test", notes_public="El Nogal",
+        referrer_id=referrer.id, advisor_id=advisor.id, status=LeadStatus.NUEVO,
+    )
+    db_session.add(lead)
+    await db_session.flush()
+    task = LeadAdminTask(lead_id=lead.id, task="Llamar")
+    db_session.add(task)
+    await db_session.commit()
+    client.cookies.set("access_token", create_access_token({"sub": str(advisor.id), "role": "ASESOR"}))
+    return {"lead_id": lead.id, "task_id": task.id}
+
+
+@pytest.mark.asyncio
+async def test_status_change_returns_fragment(client: AsyncClient, advisor_lead):
+    lead_id = advisor_lead["lead_id"]
+    response = await client.post(
+        f"/dashboard/asesor/leads/{lead_id}/status", data={"status": "CONTACTANDO"}, headers=FRAGMENT,
+    )
+    assert response.status_code == 200
+    assert f'id="card-{lead_id}"' in response.text
+    assert 'data-status="CONTACTANDO"' in response.text
+    assert f'id="modal-{lead_id}"' in response.text
+    assert "Ref Frag" in response.text
+    assert "<html" not in response.text
+
+
+@pytest.mark.asyncio
+async def test_mutations_without_header_still_redirect(client: AsyncClient, advisor_lead):
+    lead_id = advisor_lead["lead_id"]
+    response = await client.post(f"/dashboard/asesor/leads/{lead_id}/notes", data={"note": "Sin JS"})
+    assert response.status_code == 302
+    assert response.headers["location"] == "/dashboard/asesor"
+
+
+@pytest.mark.asyncio
+async def test_note_and_task_fragments(client: AsyncClient, advisor_lead):
+    lead_id, task_id = advisor_lead["lead_id"], advisor_lead["task_id"]
+    response = await client.post(
+        f"/dashboard/asesor/leads/{lead_id}/notes", data={"note": "Interesada en El Nogal"}, headers=FRAGMENT,
+    )
+    assert "Interesada en El Nogal" in response.text
+
+    response = await client.post(f"/dashboard/asesor/leads/{lead_id}/tasks/{task_id}/toggle", headers=FRAGMENT)
+    assert response.status_code == 200
+    assert "Reabrir" in response.text
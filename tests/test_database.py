@@ -0,0 +1,64 @@
+import time
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import text
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+from app import database
+from app.database import build_engine
+from app.middleware import ReadYourWritesMiddleware
+
+
+@pytest.mark.asyncio
+async def test_sqlite_file_engine_applies_pragmas_and_pool(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'wal.db'}")
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+        assert engine.pool.size() == 5
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pragmas_can_be_disabled(tmp_path):
+    engine = build_engine(f"sqlite+aiosqlite:///{tmp_path / 'plain.db'}", pragmas={})
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "delete"
+    finally:
+        await engine.dispose()
+
+
+def _request(cookies: dict) -> Request:
+    header = "; ".join(f"{k}={v}" for k, v in cookies.items())
+    return Request({"type": "http", "headers": [(b"cookie", header.encode())] if header else []})
+
+
+def test_recent_writer_reads_from_primary(monkeypatch):
+    replica_sessions = object()
+    monkeypatch.setattr(database, "ReadSessionLocal", replica_sessions)
+
+    assert database.read_session_factory(_request({})) is replica_sessions
+    fresh = {database.READ_PRIMARY_COOKIE: f"{time.time() + 5:.0f}"}
+    assert database.read_session_factory(_request(fresh)) is database.AsyncSessionLocal
+    expired = {database.READ_PRIMARY_COOKIE: f"{time.time() - 5:.0f}"}
+    assert database.read_session_factory(_request(expired)) is replica_sessions
+
+
+@pytest.mark.asyncio
+async def test_write_sets_read_primary_cookie():
+    async def endpoint(request):
+        return Response("ok")
+
+    app = ReadYourWritesMiddleware(
+        Starlette(routes=[Route("/", endpoint, methods=["GET", "POST"])]), seconds=5,
+    )
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert database.READ_PRIMARY_COOKIE not in (await client.get("/")).cookies
+        response = await client.post("/")
+        assert float(response.cookies[database.READ_PRIMARY_COOKIE]) > time.time()
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole
+from app.routers.dashboard import event_stream
+from app.schemas.lead import LeadCreateRequest
+from app.services import events
+from app.services.auth_service import create_access_token
+from app.services.events import (
+    EVENT_MAX_LEAD_IDS, NOTIFY_MAX_BYTES, EventBroker, PostgresBridge, SocketBridge, advisor_channel, broker,
+    format_sse, publish_leads_assigned,
+)
+from app.services.lead_service import create_lead
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.mark.asyncio
+async def test_publish_reaches_only_the_channel_subscribers():
+    local = EventBroker(max_queue=10)
+    mine = local.subscribe(advisor_channel(1))
+    other = local.subscribe(advisor_channel(2))
+    local.publish(advisor_channel(1), "lead_assigned", {"count": 1})
+    assert mine.queue.get_nowait() == ("lead_assigned", {"count": 1})
+    assert other.queue.empty()
+
+    local.unsubscribe(mine)
+    local.unsubscribe(other)
+    assert local.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync_instead_of_growing():
+    local = EventBroker(max_queue=3)
+    slow = local.subscribe(advisor_channel(1))
+    for i in range(5):
+        local.publish(advisor_channel(1), "lead_assigned", {"count": 1, "n": i})
+    items = []
+    while not slow.queue.empty():
+        items.append(slow.queue.get_nowait())
+    assert items[0] == ("resync", {"dropped": 3})
+    assert len(items) <= 3
+
+
+@pytest.mark.asyncio
+async def test_create_lead_notifies_the_assigned_advisor(db_session: AsyncSession):
+    advisor = User(name="Asesor", last_name="SSE", email="asesor@sse.test", password_hash="x", role=UserRole.ASESOR)
+    db_session.add(advisor)
+    await db_session.commit()
+    advisor_id = advisor.id
+    subscription = broker.subscribe(advisor_channel(advisor_id))
+    try:
+        lead = await create_lead(db_session, LeadCreateRequest(
+            first_name="Ana", last_name="SSE", email="ana@example.com", notes_public="El Nogal",
+        ))
+        event, data = subscription.queue.get_nowait()
+    finally:
+        broker.unsubscribe(subscription)
+    assert event == "lead_assigned"
+    assert data == {"count": 1, "source": "new", "lead_ids": [lead.id]}
+
+
+@pytest.mark.asyncio
+async def test_large_assignments_fit_in_a_notify(monkeypatch):
+    local = EventBroker(max_queue=10)
+    local.bridge = PostgresBridge(local, "postgresql+asyncpg://localhost/egp")
+    monkeypatch.setattr(events, "broker", local)
+    subscription = local.subscribe(advisor_channel(1))
+
+    publish_leads_assigned([1] * 5000, source="import", lead_ids=range(100000, 105000))
+    publish_leads_assigned([1, 2], source="webhook", lead_ids=[7, 8])
+    assert subscription.queue.get_nowait() == ("lead_assigned", {"count": 5000, "source": "import"})
+    assert subscription.queue.get_nowait()[1]["lead_ids"] == [7]
+    relayed = [local.bridge._outbox.get_nowait() for _ in range(local.bridge._outbox.qsize())]
+    assert len(relayed) == 3 and all(len(payload.encode()) <= NOTIFY_MAX_BYTES for payload in relayed)
+
+    # Un payload que aún no cabe llega a los demás workers como resync
+    publish_leads_assigned([1] * EVENT_MAX_LEAD_IDS, source="import", lead_ids=[10 ** 80] * EVENT_MAX_LEAD_IDS)
+    assert json.loads(local.bridge._outbox.get_nowait())["event"] == "resync"
+
+
+@pytest.mark.asyncio
+async def test_socket_bridge_relays_between_workers(tmp_path):
+    first, second = EventBroker(max_queue=10), EventBroker(max_queue=10)
+    bridges = [SocketBridge(first, str(tmp_path)), SocketBridge(second, str(tmp_path))]
+    for b, bridge in zip((first, second), bridges):
+        await bridge.start()
+        b.bridge = bridge
+    try:
+        here = first.subscribe(advisor_channel(7))
+        there = second.subscribe(advisor_channel(7))
+        first.publish(advisor_channel(7), "lead_assigned", {"count": 2})
+        assert here.queue.get_nowait() == ("lead_assigned", {"count": 2})
+        assert await asyncio.wait_for(there.queue.get(), timeout=2) == ("lead_assigned", {"count": 2})
+        # El worker de origen no recibe su propio evento dos veces
+        await asyncio.sleep(0.05)
+        assert here.queue.empty()
+    finally:
+        for bridge in bridges:
+            await bridge.stop()
+
+
+@pytest.mark.asyncio
+async def test_event_stream_yields_events_and_heartbeats(monkeypatch):
+    local = EventBroker(max_queue=10)
+    monkeypatch.setattr(events, "broker", local)
+    monkeypatch.setattr("app.routers.dashboard.broker", local)
+    request = FakeRequest()
+    subscription = local.subscribe(advisor_channel(3))
+    stream = event_stream(request, subscription, heartbeat=0.01)
+
+    assert await stream.__anext__() == b"retry: 5000\n\n"
+    assert await stream.__anext__() == b": ping\n\n"
+    local.publish(advisor_channel(3), "lead_assigned", {"count": 1, "source": "pending"})
+    chunk = await stream.__anext__()
+    assert chunk == format_sse("lead_assigned", {"count": 1, "source": "pending"})
+    assert json.loads(chunk.decode().split("data: ")[1]) == {"count": 1, "source": "pending"}
+
+    request.disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert local.subscriber_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_events_endpoint_is_for_advisors_only(client: AsyncClient, db_session: AsyncSession):
+    referrer = User(
+        name="Ref", last_name="SSE", email="ref@sse.test", password_hash="x",
+        role=UserRole.REFERIDOR, referral_code="SSE00001",
+    )
+    db_session.add(referrer)
+    await db_session.commit()
+    client.cookies.set("access_token", create_access_token({"sub": str(referrer.id), "role": "REFERIDOR"}))
+    response = await client.get("/dashboard/asesor/events")
+    assert response.status_code == 403
@@ -0,0 +1,114 @@
+import csv
+import io
+import zipfile
+from xml.etree import ElementTree
+import pytest
+import pytest_asyncio
+from datetime import datetime
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead, LeadStatus
+from app.services.auth_service import create_access_token
+from app.services.export_service import EXPORT_HEADER, stream_csv
+from app.services.xlsx_stream import stream_xlsx
+
+
+@pytest_asyncio.fixture
+async def admin(client: AsyncClient, db_session: AsyncSession) -> dict:
+    admin = User(name="Admin", last_name="Export", email="admin@export.test", password_hash="x", role=UserRole.ADMIN)
+    advisor = User(name="Ana", last_name="Asesora", email="ana@export.test", password_hash="x", role=UserRole.ASESOR)
+    referrer = User(
+        name="Rafael", last_name="Núñez", email="rafa@export.test", password_hash="x",
+        role=UserRole.REFERIDOR, referral_code="EXPORT01",
+    )
+    db_session.add_all([admin, advisor, referrer])
+    await db_session.flush()
+    for i in range(5):
+        db_session.add(Lead(
+            first_name=f"Lead{i}", last_name="Export", email=f"lead{i}@export.test", notes_public="Barú Beach",
+            referrer_id=referrer.id if i < 3 else None, advisor_id=advisor.id,
+            status=LeadStatus.GANADA if i == 0 else LeadStatus.NUEVO,
+            commission_amount=1500000.0 if i == 0 else None, created_at=datetime(2026, 2, i + 1),
+        ))
+    await db_session.commit()
+    client.cookies.set("access_token", create_access_token({"sub": str(admin.id), "role": "ADMIN"}))
+    return {"advisor_id": advisor.id}
+
+
+@pytest.mark.asyncio
+async def test_export_csv_joins_names_and_filters(client: AsyncClient, admin):
+    response = await client.get("/admin/export/leads.csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == EXPORT_HEADER
+    assert len(rows) == 6
+    first = dict(zip(rows[0], rows[1]))
+    assert first["referidor"] == "Rafael Núñez"
+    assert first["asesor"] == "Ana Asesora"
+    assert first["estado"] == "GANADA" and first["comision"] == "1500000.0"
+
+    response = await client.get("/admin/export/leads.csv?status=GANADA")
+    assert len(list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))) == 2
+    response = await client.get("/admin/export/leads.csv?created_from=2026-02-04")
+    assert len(list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_xlsx_is_a_valid_workbook(client: AsyncClient, admin):
+    response = await client.get("/admin/export/leads.xlsx")
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+    assert sheet.count("<row>") == 6
+    assert "Rafael Núñez" in sheet
+
+
+@pytest.mark.asyncio
+async def test_export_requires_admin(client: AsyncClient, admin):
+    client.cookies.set("access_token", create_access_token({"sub": str(admin["advisor_id"]), "role": "ASESOR"}))
+    response = await client.get("/admin/export/leads.csv")
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_stream_csv_yields_one_chunk_per_batch():
+    async def batches():
+        for start in range(0, 9, 3):
+            yield [(i, f"lead{i}") for i in range(start, start + 3)]
+
+    chunks = [chunk async for chunk in stream_csv(["id", "nombre"], batches())]
+    assert len(chunks) == 4
+    assert chunks[1].decode().splitlines() == ["0,lead0", "1,lead1", "2,lead2"]
+
+
+@pytest.mark.asyncio
+async def test_export_ignores_empty_form_fields(client: AsyncClient, admin):
+    response = await client.get("/admin/export/leads.csv?status=&advisor_id=&created_from=&created_to=")
+    assert response.status_code == 200
+    assert len(response.content.decode("utf-8-sig").splitlines()) == 6
+    assert (await client.get("/admin/export/leads.csv?advisor_id=abc")).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_stream_csv_neutralizes_formulas():
+    async def batches():
+        yield [(1, "=HYPERLINK(\"http://x\")", "+57 300", "-1", "@SUM(A1)", "\tTab", "\rCR", "Ana", -5.0)]
+
+    chunks = [chunk async for chunk in stream_csv(["id"] + ["c"] * 8, batches())]
+    row = next(csv.reader(io.StringIO(chunks[1].decode())))
+    assert row == ["1", "'=HYPERLINK(\"http://x\")", "'+57 300", "'-1", "'@SUM(A1)", "'\tTab", "'\rCR", "Ana", "-5.0"]
+
+
+@pytest.mark.asyncio
+async def test_stream_xlsx_drops_invalid_xml_characters():
+    async def batches():
+        yield [(1, "Ana\x00\x08\x0bMaría\x1f", "línea\nnueva")]
+
+    content = b"".join([chunk async for chunk in stream_xlsx(["id", "nombre", "notas"], batches())])
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    texts = [t.text for t in sheet.iter("{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t")]
+    assert texts[-2:] == ["AnaMaría", "línea\nnueva"]
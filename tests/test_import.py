@@ -0,0 +1,122 @@
+import threading
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead, LeadStatus
+from app.services.auth_service import create_access_token
+from app.metrics import registry
+from app.schemas.lead import LeadCreateRequest
+from app.services.import_service import import_leads, read_csv_rows, read_csv_rows_off_loop
+from app.services.lead_service import create_lead, normalize_lead_emails
+
+CSV = """nombre,apellido,email,telefono,proyecto,referral_code,utm_source
+Camila,García,camila@example.com,3001112233,Isla Barú,IMPORT01,evento
+Andrés,López,ANDRES@example.com,3002223344,El Nogal,NOEXISTE,evento
+Duplicada,Email,existente@example.com,3009998877,,,
+Duplicado,Telefono,otro@example.com,3001112233,,,
+X,Corto,malo,,,,
+Sofía,Díaz,sofia@example.com,,Prado Norte,,
+"""
+
+
+@pytest_asyncio.fixture
+async def setup_users(db_session: AsyncSession) -> dict:
+    admin = User(name="Admin", last_name="Import", email="admin@import.test", password_hash="x", role=UserRole.ADMIN)
+    advisors = [
+        User(name=f"Asesor{i}", last_name="Import", email=f"asesor{i}@import.test", password_hash="x", role=UserRole.ASESOR)
+        for i in range(2)
+    ]
+    referrer = User(
+        name="Ref", last_name="Import", email="ref@import.test", password_hash="x",
+        role=UserRole.REFERIDOR, referral_code="IMPORT01",
+    )
+    db_session.add_all([admin, referrer, *advisors])
+    db_session.add(Lead(first_name="Ya", last_name="Existe", email="existente@example.com", status=LeadStatus.NUEVO))
+    await db_session.commit()
+    return {"admin_id": admin.id, "referrer_id": referrer.id, "advisor_ids": [a.id for a in advisors]}
+
+
+@pytest.mark.asyncio
+async def test_import_leads_report(db_session: AsyncSession, setup_users):
+    report = await import_leads(db_session, read_csv_rows(CSV.splitlines(keepends=True)), chunk_size=2)
+    assert report.total == 6
+    assert report.imported == 3
+    assert report.duplicates == 2
+    assert report.error_count == 1
+    assert report.errors[0].line == 6 and report.errors[0].email == "malo"
+    assert report.unknown_referral_codes == 1
+
+    leads = (await db_session.execute(
+        select(Lead).where(Lead.email.in_(["camila@example.com", "andres@example.com", "sofia@example.com"]))
+        .order_by(Lead.id)
+    )).scalars().all()
+    assert [lead.email for lead in leads] == ["camila@example.com", "andres@example.com", "sofia@example.com"]
+    assert leads[0].referrer_id == setup_users["referrer_id"] and leads[0].notes_public == "Isla Barú"
+    assert leads[1].referrer_id is None
+    # Round-robin continuo entre lotes
+    assert [lead.advisor_id for lead in leads] == setup_users["advisor_ids"] + setup_users["advisor_ids"][:1]
+    assert all(lead.status == LeadStatus.NUEVO for lead in leads)
+
+
+@pytest.mark.asyncio
+async def test_import_endpoint(client: AsyncClient, db_session: AsyncSession, setup_users):
+    client.cookies.set("access_token", create_access_token({"sub": str(setup_users["admin_id"]), "role": "ADMIN"}))
+    files = {"file": ("leads.csv", CSV.encode("utf-8-sig"), "text/csv")}
+    response = await client.post("/admin/import/leads", files=files)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["imported"] == 3 and body["error_count"] == 1
+    assert body["errors"][0]["line"] == 6
+
+    # Reimportar el mismo archivo no duplica nada
+    response = await client.post("/admin/import/leads", files=files)
+    assert response.json()["imported"] == 0
+    assert (await db_session.execute(select(func.count(Lead.id)))).scalar() == 4
+
+
+@pytest.mark.asyncio
+async def test_import_detects_mixed_case_duplicates_and_counts_metric(db_session: AsyncSession, setup_users):
+    # Alta por otra vía con mayúsculas: se guarda normalizada
+    lead = await create_lead(db_session, LeadCreateRequest(first_name="Ana", last_name="Mayus", email="Ana.Mayus@Example.com"))
+    assert lead.email == "ana.mayus@example.com"
+
+    registry.clear()
+    csv_text = "nombre,apellido,email\nAna,Mayus,ANA.MAYUS@example.com\nLuis,Nuevo,luis@example.com\n"
+    report = await import_leads(db_session, read_csv_rows(csv_text.splitlines(keepends=True)))
+    assert (report.imported, report.duplicates) == (1, 1)
+    created = sum(v for (name, _labels), v in registry.counters.items() if name == "leads_created_total")
+    assert created == 1
+
+
+@pytest.mark.asyncio
+async def test_normalize_lead_emails_fixes_older_leads(db_session: AsyncSession, setup_users):
+    # Lead guardado antes de la normalización
+    db_session.add(Lead(first_name="Vieja", last_name="Mayus", email="Vieja@Example.com", status=LeadStatus.NUEVO))
+    await db_session.commit()
+    assert await normalize_lead_emails(db_session) == 1
+    assert await normalize_lead_emails(db_session) == 0
+
+    csv_text = "nombre,apellido,email\nVieja,Mayus,vieja@example.com\n"
+    report = await import_leads(db_session, read_csv_rows(csv_text.splitlines(keepends=True)))
+    assert (report.imported, report.duplicates) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_upload_is_parsed_off_the_event_loop(client: AsyncClient, setup_users):
+    readers = set()
+
+    def lines():
+        for line in CSV.splitlines(keepends=True):
+            readers.add(threading.get_ident())
+            yield line
+
+    rows = [row async for row in read_csv_rows_off_loop(lines(), block_size=2)]
+    assert [line for line, _row in rows] == [2, 3, 4, 5, 6, 7]
+    assert threading.get_ident() not in readers
+
+    client.cookies.set("access_token", create_access_token({"sub": str(setup_users["admin_id"]), "role": "ADMIN"}))
+    files = {"file": ("leads.csv", "nombre,apellido,email\nJosé,Pérez,jose@example.com\n".encode("latin-1"), "text/csv")}
+    response = await client.post("/admin/import/leads", files=files)
+    assert response.status_code == 400
@@ -0,0 +1,61 @@
+import json
+import os
+import pytest
+from httpx import AsyncClient
+from app.metrics import MetricsRegistry, collect, flush_metrics, metrics_file, registry, render
+from conftest import login
+
+DEAD_PID = 2 ** 22 + 1  # por encima de pid_max: nunca está vivo
+
+
+def test_render_histogram_and_counters():
+    local = MetricsRegistry()
+    local.inc("http_requests_total", {"method": "GET", "route": "/r/{code}", "status": 200})
+    local.observe("http_request_duration_seconds", 0.02, {"method": "GET", "route": "/r/{code}"})
+    local.observe("http_request_duration_seconds", 3.0, {"method": "GET", "route": "/r/{code}"})
+
+    text = render([local.snapshot()])
+    assert 'http_requests_total{method="GET",route="/r/{code}",status="200"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/r/{code}",le="0.025"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/r/{code}",le="+Inf"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/r/{code}"} 2' in text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+
+
+def test_workers_are_aggregated_from_files(tmp_path):
+    worker = MetricsRegistry()
+    worker.inc("leads_created_total", {"advisor_id": 7}, 3)
+    worker.set("db_pool_checked_out", 4)
+    snapshot = worker.snapshot()
+    snapshot["pid"] = DEAD_PID
+    with open(metrics_file(str(tmp_path), DEAD_PID), "w") as f:
+        json.dump(snapshot, f)
+
+    registry.clear()
+    registry.inc("leads_created_total", {"advisor_id": 7}, 2)
+    registry.set("db_pool_checked_out", 1)
+    flush_metrics(str(tmp_path))
+    assert os.path.exists(metrics_file(str(tmp_path)))
+
+    text = render(collect(str(tmp_path)))
+    # Los counters de un worker muerto siguen sumando; sus gauges no
+    assert 'leads_created_total{advisor_id="7"} 5' in text
+    assert f'db_pool_checked_out{{pid="{os.getpid()}"}} 1' in text
+    assert str(DEAD_PID) not in text
+    registry.clear()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_is_admin_only(client: AsyncClient, users):
+    admin, referrer = users["admin"], users["referrer"]
+    assert (await client.get("/metrics")).status_code == 401
+    login(client, referrer)
+    assert (await client.get("/metrics")).status_code == 403
+
+    await client.get("/r/REFTEST0")
+    login(client, admin)
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'route="/r/{code}"' in response.text
+    assert "/r/REFTEST0" not in response.text
@@ -0,0 +1,94 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from app.main import app
+from app.middleware import CompressionMiddleware, ServerTimingMiddleware
+
+PAGE = ("<p>Proyecto Prado Norte</p>\n" * 500).encode()
+
+
+async def page(request):
+    return Response(PAGE, media_type="text/html")
+
+
+async def small(request):
+    return Response(b"<p>ok</p>", media_type="text/html")
+
+
+async def image(request):
+    return Response(PAGE, media_type="image/jpeg")
+
+
+async def streamed(request):
+    async def chunks():
+        for _ in range(50):
+            yield PAGE[:300]
+    return StreamingResponse(chunks(), media_type="text/html")
+
+
+@pytest_asyncio.fixture
+async def compressed_client():
+    app = Starlette(routes=[
+        Route("/page", page), Route("/small", small),
+        Route("/image", image), Route("/streamed", streamed),
+    ])
+    app = CompressionMiddleware(app, minimum_size=1024, gzip_level=6)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+
+
+@pytest.mark.asyncio
+async def test_gzip_response(compressed_client: AsyncClient):
+    response = await compressed_client.get("/page", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert "content-length" not in response.headers or int(response.headers["content-length"]) < len(PAGE)
+    assert response.content == PAGE
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_compressed(compressed_client: AsyncClient):
+    response = await compressed_client.get("/streamed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == PAGE[:300] * 50
+
+
+@pytest.mark.asyncio
+async def test_skips_small_and_media_responses(compressed_client: AsyncClient):
+    response = await compressed_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"<p>ok</p>"
+
+    response = await compressed_client.get("/image", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_identity_when_not_accepted(compressed_client: AsyncClient):
+    response = await compressed_client.get("/page", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(PAGE))
+
+
+@pytest.mark.asyncio
+async def test_home_page_is_compressed(client: AsyncClient):
+    response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "EGP Referidos" in response.text
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(client: AsyncClient):
+    # Apagado por defecto: sin cabecera ni línea de log
+    assert "server-timing" not in (await client.get("/leaderboard")).headers
+
+    transport = ASGITransport(app=ServerTimingMiddleware(app, sample_rate=1.0))
+    async with AsyncClient(transport=transport, base_url="http://test") as sampled:
+        response = await sampled.get("/leaderboard")
+    server_timing = response.headers["server-timing"]
+    assert 'db;dur=' in server_timing
+    assert '"1 queries"' in server_timing
+    assert "tpl;dur=" in server_timing and "total;dur=" in server_timing
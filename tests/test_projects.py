@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead, LeadStatus, Project
+from app.schemas.lead import LeadCreateRequest
+from app.services.import_service import import_leads, read_csv_rows
+from app.services.lead_service import create_lead
+from app.services.project_service import backfill_lead_projects, match_project, top_projects
+
+
+def test_match_project_spelling_variants():
+    assert match_project("Isla Barú") == match_project("isla baru") == 1
+    assert match_project("Baru Beach") == match_project("Barú Beach Condominio") == 2
+    assert match_project("Palma de Mallorca") == match_project("PALMAS DE MALLORCA") == 4
+    assert match_project("Interesada en El Nogal, 2 alcobas") == 3
+    assert match_project("Coveñas") == 6
+    # Ninguno o más de uno: sin proyecto
+    assert match_project("Quiero información") is None
+    assert match_project("El Nogal o Prado Norte") is None
+    assert match_project(None) is None
+
+
+async def project_counts(db: AsyncSession) -> dict:
+    db.expire_all()
+    return dict((await db.execute(select(Project.slug, Project.lead_count))).all())
+
+
+@pytest.mark.asyncio
+async def test_new_leads_get_project_and_counter(db_session: AsyncSession):
+    db_session.add(User(name="Asesor", last_name="Proy", email="asesor@proy.test", password_hash="x", role=UserRole.ASESOR))
+    await db_session.commit()
+    lead = await create_lead(db_session, LeadCreateRequest(
+        first_name="Ana", last_name="Proy", email="ana@example.com", notes_public="Isla Baru",
+    ))
+    assert lead.project_id == 1
+    assert lead.notes_public == "Isla Baru"
+
+    csv = "nombre,apellido,email,proyecto\nLuis,Proy,luis@example.com,Isla Barú\nEva,Proy,eva@example.com,Prado Norte\n"
+    await import_leads(db_session, read_csv_rows(csv.splitlines(keepends=True)))
+    counts = await project_counts(db_session)
+    assert counts["isla-baru"] == 2 and counts["prado-norte"] == 1 and counts["el-nogal"] == 0
+    assert await top_projects(db_session) == [("Isla Barú", 2), ("Prado Norte", 1)]
+
+
+@pytest.mark.asyncio
+async def test_backfill_maps_existing_free_text(db_session: AsyncSession):
+    for notes in ["Palma de Mallorca", "Palmas de Mallorca", "el nogal", "Otra cosa", None]:
+        db_session.add(Lead(first_name="Old", last_name="Lead", email="old@example.com", notes_public=notes,
+                            status=LeadStatus.NUEVO))
+    await db_session.commit()
+
+    report = await backfill_lead_projects(db_session)
+    assert report == {"values": 4, "matched_values": 3, "leads_updated": 3}
+    counts = await project_counts(db_session)
+    assert counts["palmas-mallorca"] == 2 and counts["el-nogal"] == 1
+    # Idempotente
+    assert (await backfill_lead_projects(db_session))["leads_updated"] == 0
+    assert await project_counts(db_session) == counts
+
+
+@pytest.mark.asyncio
+async def test_top_projects_is_index_only(db_session: AsyncSession):
+    compiled = select(Project.name, Project.lead_count).where(Project.lead_count > 0) \
+        .order_by(Project.lead_count.desc(), Project.name).limit(3) \
+        .compile(compile_kwargs={"literal_binds": True})
+    plan = " ".join(str(row[-1]) for row in (await db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all())
+    assert "COVERING INDEX ix_projects_lead_count" in plan
@@ -0,0 +1,146 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.main import app
+from app.instrumentation import query_budget_violations
+from app.models.models import Lead, LeadStatus, LeadNote, LeadAdminTask
+from conftest import login
+
+LEADS_PER_ADVISOR = 6
+
+
+@pytest_asyncio.fixture
+async def dataset(db_session: AsyncSession, users) -> dict:
+    """Enough rows that a per-lead query loop would exceed any budget."""
+    advisors, referrer = users["advisors"], users["referrer"]
+    for advisor in advisors:
+        for i in range(LEADS_PER_ADVISOR):
+            lead = Lead(
+                first_name=f"Lead{i}", last_name="Budget", email=f"lead{advisor.id}-{i}@budget.test",
+                notes_public="Prado Norte", referrer_id=referrer.id, advisor_id=advisor.id,
+                status=LeadStatus.NUEVO,
+            )
+            db_session.add(lead)
+            await db_session.flush()
+            db_session.add_all([
+                LeadNote(lead_id=lead.id, advisor_id=advisor.id, note="Nota 1"),
+                LeadNote(lead_id=lead.id, advisor_id=advisor.id, note="Nota 2"),
+                LeadAdminTask(lead_id=lead.id, task="Tarea 1"),
+                LeadAdminTask(lead_id=lead.id, task="Tarea 2"),
+            ])
+    for i in range(LEADS_PER_ADVISOR):
+        db_session.add(Lead(
+            first_name=f"Pending{i}", last_name="Budget", email=f"pending{i}@budget.test",
+            notes_public="El Nogal", status=LeadStatus.PENDING_ASSIGNMENT,
+        ))
+    await db_session.commit()
+    return users
+
+
+async def assert_within_budget(client, query_recorder, method, path, **kwargs):
+    query_recorder.clear()
+    response = await client.request(method, path, **kwargs)
+    assert response.status_code < 400, response.text[:200]
+    problems = query_budget_violations(query_recorder, app, method, path)
+    assert not problems, "\n".join(problems)
+
+
+@pytest.mark.asyncio
+async def test_public_routes_query_budget(client: AsyncClient, query_recorder, dataset):
+    await assert_within_budget(client, query_recorder, "GET", "/")
+    await assert_within_budget(client, query_recorder, "GET", "/r/REFTEST0?utm_source=facebook")
+    await assert_within_budget(client, query_recorder, "GET", "/leaderboard")
+    await assert_within_budget(client, query_recorder, "POST", "/leads", data={
+        "first_name": "Nuevo", "last_name": "Lead", "email": "nuevo@budget.test",
+        "notes_public": "Isla Barú", "referral_code": "REFTEST0",
+    })
+
+
+@pytest.mark.asyncio
+async def test_dashboard_routes_query_budget(client: AsyncClient, query_recorder, dataset):
+    login(client, dataset["referrer"])
+    await assert_within_budget(client, query_recorder, "GET", "/dashboard/referidor")
+
+    login(client, dataset["advisor"])
+    await assert_within_budget(client, query_recorder, "GET", "/dashboard/asesor")
+
+
+@pytest.mark.asyncio
+async def test_asesor_fragment_routes_query_budget(client: AsyncClient, query_recorder, dataset):
+    login(client, dataset["advisor"])
+    leads = (await client.get("/api/v1/leads?fields=id")).json()["items"]
+    lead_id = leads[0]["id"]
+    headers = {"HX-Request": "true"}
+    base = f"/dashboard/asesor/leads/{lead_id}"
+    await assert_within_budget(client, query_recorder, "POST", f"{base}/status", data={"status": "CONTACTANDO"}, headers=headers)
+    await assert_within_budget(client, query_recorder, "POST", f"{base}/notes", data={"note": "Nota"}, headers=headers)
+    await assert_within_budget(client, query_recorder, "POST", f"{base}/payment-date", data={"payment_date": "2026-05-01"}, headers=headers)
+    await assert_within_budget(client, query_recorder, "POST", f"{base}/commission", data={"commission": "1000"}, headers=headers)
+    await assert_within_budget(client, query_recorder, "POST", f"{base}/tasks", data={"task": "Llamar"}, headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_admin_routes_query_budget(client: AsyncClient, query_recorder, dataset):
+    login(client, dataset["admin"])
+    await assert_within_budget(client, query_recorder, "GET", "/admin")
+    await assert_within_budget(client, query_recorder, "GET", f"/admin/advisors/{dataset['advisor'].id}/funnel")
+    await assert_within_budget(client, query_recorder, "GET", "/admin/trends?dimension=advisor&days=7")
+    await assert_within_budget(client, query_recorder, "POST", "/admin/assign-pending")
+    await assert_within_budget(client, query_recorder, "GET", "/admin/export/leads.csv")
+    await assert_within_budget(client, query_recorder, "GET", "/admin/export/leads.xlsx?status=NUEVO")
+    csv_body = "first_name,last_name,email,phone,referral_code\n" + "".join(
+        f"Import{i},Budget,import{i}@example.com,31000000{i:02d},REFTEST0\n" for i in range(20)
+    )
+    await assert_within_budget(
+        client, query_recorder, "POST", "/admin/import/leads", files={"file": ("leads.csv", csv_body, "text/csv")},
+    )
+
+
+@pytest.mark.asyncio
+async def test_api_routes_query_budget(client: AsyncClient, query_recorder, dataset):
+    # Como en el formulario: el código ya está en caché tras visitar la landing
+    await client.get("/r/REFTEST0")
+    await assert_within_budget(client, query_recorder, "POST", "/api/v1/leads", json={
+        "first_name": "Api", "last_name": "Lead", "email": "api@example.com", "referral_code": "REFTEST0",
+    })
+    login(client, dataset["admin"])
+    await assert_within_budget(client, query_recorder, "GET", "/api/v1/leads")
+    await assert_within_budget(client, query_recorder, "GET", "/api/v1/leads?fields=id,referrer_name,advisor_name")
+    lead_ids = [item["id"] for item in (await client.get("/api/v1/leads?fields=id")).json()["items"]]
+    for body in (
+        {"operation": "set_status", "status": "CONTACTANDO"},
+        {"operation": "reassign", "advisor_id": dataset["advisor"].id},
+        {"operation": "mark_commission_paid"},
+        {"operation": "add_task", "task": "Llamar"},
+    ):
+        await assert_within_budget(client, query_recorder, "POST", "/api/v1/leads/bulk", json={"lead_ids": lead_ids, **body})
+
+
+@pytest.mark.asyncio
+async def test_commission_payout_query_budget(client: AsyncClient, query_recorder, db_session: AsyncSession, dataset):
+    await db_session.execute(update(Lead).where(Lead.referrer_id.isnot(None)).values(commission_amount=1000.0))
+    await db_session.commit()
+    login(client, dataset["admin"])
+    await assert_within_budget(client, query_recorder, "POST", "/api/v1/commissions/payouts", json={
+        "referrer_ids": [dataset["referrer"].id],
+    })
+
+
+@pytest.mark.asyncio
+async def test_webhook_query_budget(client: AsyncClient, query_recorder, dataset, monkeypatch):
+    from app.routers import api
+
+    monkeypatch.setattr(api.settings, "WEBHOOK_TOKEN", "secreto")
+    batch = {"leads": [
+        {
+            "idempotency_key": f"budget-{i}", "first_name": "Hook", "last_name": f"Lead{i}",
+            "email": f"hook{i}@example.com", "referral_code": "REFTEST0",
+        }
+        for i in range(20)
+    ]}
+    headers = {"X-Webhook-Token": "secreto"}
+    await assert_within_budget(client, query_recorder, "POST", "/api/v1/webhooks/leads", json=batch, headers=headers)
+    # Reenvío del mismo lote
+    await assert_within_budget(client, query_recorder, "POST", "/api/v1/webhooks/leads", json=batch, headers=headers)
@@ -0,0 +1,162 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, Lead, LeadStatus, ReferrerStats
+from app.routers.dashboard import REFERIDOR_PAGE_SIZE
+from app.schemas.lead import LeadBulkRequest, LeadCreateRequest
+from app.services.import_service import import_leads, read_csv_rows
+from app.services.lead_service import bulk_update_leads, create_lead
+from app.services.referrer_stats_service import badge_flags, rebuild_referrer_stats, referrer_overview
+from conftest import login
+
+
+async def refer(db: AsyncSession, code: str, count: int, prefix: str) -> list:
+    leads = [
+        await create_lead(db, LeadCreateRequest(
+            first_name="Ana", last_name="Stats", email=f"{prefix}{i}@example.com", referral_code=code,
+        ))
+        for i in range(count)
+    ]
+    return [lead.id for lead in leads]
+
+
+async def stats_rows(db: AsyncSession) -> dict:
+    result = await db.execute(select(
+        ReferrerStats.referrer_id, ReferrerStats.total_referidos, ReferrerStats.closed_count,
+        ReferrerStats.ranked_count, ReferrerStats.leaderboard_rank, ReferrerStats.badge_flags,
+    ))
+    return {row[0]: tuple(row[1:]) for row in result.all()}
+
+
+@pytest.mark.asyncio
+async def test_writes_keep_counters_and_badges(client: AsyncClient, db_session: AsyncSession, users):
+    ref_id = users["referrer_ids"][0]
+    ids = await refer(db_session, "REFTEST0", 5, "a")
+    assert (await stats_rows(db_session))[ref_id] == (5, 0, 0, None, badge_flags(5, 0))
+
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids[:3], operation="set_status", status="GANADA",
+    ))
+    login(client, users["admin"])
+    await client.post(f"/dashboard/asesor/leads/{ids[0]}/status", data={"status": "PERDIDA"})
+    total, closed, _ranked, _rank, flags = (await stats_rows(db_session))[ref_id]
+    assert (total, closed) == (5, 2)
+    # Medallas según los contadores actuales: Top Closer (3 cierres) se pierde con el cambio
+    assert flags == badge_flags(5, 2) == 1 | 2 | 16
+
+
+@pytest.mark.asyncio
+async def test_payment_dates_move_the_leaderboard(client: AsyncClient, db_session: AsyncSession, users):
+    ref_a, ref_b, ref_c = users["referrer_ids"]
+    leads_a = await refer(db_session, "REFTEST0", 2, "a")
+    leads_b = await refer(db_session, "REFTEST1", 2, "b")
+    leads_c = await refer(db_session, "REFTEST2", 1, "c")
+    login(client, users["admin"])
+
+    async def set_date(lead_id: int, value: str = "2026-05-01") -> None:
+        await client.post(f"/dashboard/asesor/leads/{lead_id}/payment-date", data={"payment_date": value})
+
+    for lead_id in [leads_b[0], leads_c[0], leads_a[0], leads_a[1]]:
+        await set_date(lead_id)
+    ranks = {ref: row[3] for ref, row in (await stats_rows(db_session)).items()}
+    assert ranks == {ref_a: 1, ref_b: 2, ref_c: 2}
+
+    await set_date(leads_b[1])
+    ranks = {ref: row[3] for ref, row in (await stats_rows(db_session)).items()}
+    assert ranks == {ref_a: 1, ref_b: 1, ref_c: 3}
+    await set_date(leads_a[0], "")
+    ranks = {ref: row[3] for ref, row in (await stats_rows(db_session)).items()}
+    assert ranks == {ref_b: 1, ref_a: 2, ref_c: 2}
+
+    # Cambiar una fecha ya puesta no mueve el ranking; quitar la última deja al referidor sin puesto
+    await set_date(leads_c[0], "2026-06-01")
+    await set_date(leads_c[0], "")
+    rows = await stats_rows(db_session)
+    assert rows[ref_c][2:4] == (0, None) and rows[ref_a][3] == 2
+
+    # La reconstrucción desde leads llega a lo mismo
+    before = await stats_rows(db_session)
+    assert (await rebuild_referrer_stats(db_session)) == {"referrers": 3, "ranked": 2}
+    assert await stats_rows(db_session) == before
+
+
+@pytest.mark.asyncio
+async def test_rebuild_absorbs_out_of_band_writes(db_session: AsyncSession, users):
+    ref_id = users["referrer_ids"][1]
+    ids = await refer(db_session, "REFTEST1", 3, "b")
+    await db_session.execute(update(Lead).where(Lead.id.in_(ids)).values(status=LeadStatus.GANADA))
+    await db_session.commit()
+    assert (await referrer_overview(db_session, ref_id)).closed_count == 0
+
+    await rebuild_referrer_stats(db_session)
+    overview = await referrer_overview(db_session, ref_id)
+    assert (overview.total_referidos, overview.closed_count) == (3, 3)
+    assert overview.badge_flags == badge_flags(3, 3)
+    # Sin leads ni comisiones: valores por defecto
+    assert await referrer_overview(db_session, users["referrer_ids"][2]) == (0, 0, None, 0, None, 0.0, 0.0)
+
+
+@pytest.mark.asyncio
+async def test_dashboard_renders_summary_and_paginates(
+    client: AsyncClient, db_session: AsyncSession, users, query_recorder,
+):
+    referrer = users["referrers"][0]
+    await refer(db_session, "REFTEST0", REFERIDOR_PAGE_SIZE + 2, "p")
+    login(client, referrer)
+    await client.post("/dashboard/referidor/confirmar-evento")
+
+    query_recorder.clear()
+    response = await client.get("/dashboard/referidor")
+    assert response.status_code == 200
+    assert query_recorder.count <= 4
+    assert "Página 1 de 2" in response.text
+    # 27 referidos: cuatro medallas de referidos desbloqueadas, servidas desde el sprite
+    assert response.text.count("/static/img/badges.svg?v=1#badge-") == 4
+    assert "<polygon" not in response.text
+    assert "Ya confirmaste tu asistencia" in response.text
+
+    second = await client.get("/dashboard/referidor?page=2")
+    assert "Página 2 de 2" in second.text and "Anterior" in second.text
+    assert second.text.count("<strong>Ana Stats</strong>") == 2
+
+
+@pytest.mark.asyncio
+async def test_only_active_referrers_get_a_row(client: AsyncClient, db_session: AsyncSession, users):
+    ref_a, ref_b, ref_c = users["referrer_ids"]
+    advisor_id = users["advisor"].id
+    await db_session.execute(update(User).where(User.id == ref_c).values(is_active=False))
+    await db_session.execute(update(User).where(User.id == advisor_id).values(referral_code="ASESOR01"))
+    await db_session.commit()
+
+    # Un solo lote con varios referidores: solo los activos reciben fila
+    csv_text = "nombre,apellido,email,referral_code\n" + "".join(
+        f"Ana,Stats,{code.lower()}{i}@example.com,{code}\n"
+        for code, count in [("REFTEST0", 2), ("REFTEST1", 1), ("REFTEST2", 3), ("ASESOR01", 1)]
+        for i in range(count)
+    )
+    report = await import_leads(db_session, read_csv_rows(csv_text.splitlines(keepends=True)))
+    assert report.imported == 7
+    assert {ref: row[0] for ref, row in (await stats_rows(db_session)).items()} == {ref_a: 2, ref_b: 1}
+
+    leads_c = (await db_session.execute(select(Lead.id).where(Lead.referrer_id == ref_c))).scalars().all()
+    leads_b = (await db_session.execute(select(Lead.id).where(Lead.referrer_id == ref_b))).scalars().all()
+    login(client, users["admin"])
+    for lead_id in [*leads_c, leads_b[0]]:
+        await client.post(f"/dashboard/asesor/leads/{lead_id}/payment-date", data={"payment_date": "2026-05-01"})
+    rows = await stats_rows(db_session)
+    assert set(rows) == {ref_a, ref_b}
+    assert rows[ref_b][3] == 1 and rows[ref_a][3] is None
+
+    # Reactivarlo reconstruye su fila y lo pone por delante; desactivarlo lo saca y recalcula los puestos
+    response = await client.post(f"/admin/users/{ref_c}/toggle")
+    assert response.status_code == 302
+    ranks = {ref: row[3] for ref, row in (await stats_rows(db_session)).items()}
+    assert ranks == {ref_c: 1, ref_b: 2, ref_a: None}
+    assert (await stats_rows(db_session))[ref_c][:3] == (3, 0, 3)
+
+    await client.post(f"/admin/users/{ref_c}/toggle")
+    ranks = {ref: row[3] for ref, row in (await stats_rows(db_session)).items()}
+    assert ranks == {ref_b: 1, ref_a: None}
+    # Solo referidores
+    assert (await client.post(f"/admin/users/{advisor_id}/toggle")).status_code == 404
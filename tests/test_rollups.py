@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead, LeadStatus, LeadDailyRollup
+from app.schemas.lead import LeadBulkRequest, LeadCreateRequest
+from app.services.assignment_service import assign_pending_leads
+from app.services.lead_service import bulk_update_leads, create_lead
+from app.services.rollup_service import RollupTotals, catch_up_rollups, open_daily_rollups, rollup_totals
+from conftest import login
+
+
+async def new_lead(db: AsyncSession, email: str, **fields) -> Lead:
+    return await create_lead(db, LeadCreateRequest(first_name="Ana", last_name="Roll", email=email, **fields))
+
+
+async def totals(db: AsyncSession, dimension: str = "all", key: str = "") -> RollupTotals:
+    return (await rollup_totals(db, dimension)).get(key, RollupTotals())
+
+
+@pytest.mark.asyncio
+async def test_writes_book_rollups(client: AsyncClient, db_session: AsyncSession, users):
+    lead_id = (await new_lead(db_session, "ana@example.com", notes_public="Isla Baru", utm_source="meta")).id
+    advisor_key = str(users["advisor"].id)
+    assert await totals(db_session) == RollupTotals(created=1)
+    assert (await totals(db_session, "advisor", advisor_key)).created == 1
+    assert (await totals(db_session, "project", "1")).created == 1
+    assert (await totals(db_session, "utm_source", "meta")).created == 1
+    assert (await totals(db_session, "referrer", "")).created == 1
+
+    login(client, users["advisor"])
+    base = f"/dashboard/asesor/leads/{lead_id}"
+    for status in ["CONTACTANDO", "GANADA", "GANADA"]:
+        await client.post(f"{base}/status", data={"status": status}, headers={"HX-Request": "true"})
+    assert await totals(db_session) == RollupTotals(created=1, transitions=2, won=1)
+
+    # Salir de GANADA descuenta el ganado: las cifras son netas
+    await client.post(f"{base}/status", data={"status": "PERDIDA"}, headers={"HX-Request": "true"})
+    assert await totals(db_session, "advisor", advisor_key) == RollupTotals(created=1, transitions=3, won=0, lost=1)
+
+    await client.post(f"{base}/commission", data={"commission": "1500"}, headers={"HX-Request": "true"})
+    await client.post(f"{base}/commission", data={"commission": "1000"}, headers={"HX-Request": "true"})
+    assert (await totals(db_session)).commission == 1000
+
+
+@pytest.mark.asyncio
+async def test_bulk_status_books_rollups(db_session: AsyncSession, users):
+    ids = [(await new_lead(db_session, f"bulk{i}@example.com")).id for i in range(3)]
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids, operation="set_status", status="GANADA",
+    ))
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids[:1], operation="set_status", status="GANADA",
+    ))
+    assert await totals(db_session) == RollupTotals(created=3, transitions=3, won=3)
+
+
+@pytest.mark.asyncio
+async def test_catch_up_rebuilds_and_reconciles(db_session: AsyncSession, users):
+    today = datetime.utcnow().date()
+    await new_lead(db_session, "uno@example.com")
+    lead = await new_lead(db_session, "dos@example.com")
+    # Cambios por fuera de la app: lead con fecha de ayer ganado por SQL
+    await db_session.execute(
+        update(Lead).where(Lead.id == lead.id)
+        .values(created_at=datetime.utcnow() - timedelta(days=1), status=LeadStatus.GANADA, commission_amount=500.0)
+    )
+    await db_session.commit()
+
+    report = await catch_up_rollups(db_session, today - timedelta(days=1), today)
+    assert report["created"] == 2 and report["corrections"] > 0
+    rows = dict((await db_session.execute(
+        select(LeadDailyRollup.day, LeadDailyRollup.created)
+        .where(LeadDailyRollup.dimension == "all")
+    )).all())
+    assert rows == {today - timedelta(days=1): 1, today: 1}
+    assert await totals(db_session) == RollupTotals(created=2, won=1, commission=500.0)
+
+    # Idempotente
+    assert (await catch_up_rollups(db_session, today - timedelta(days=1), today))["corrections"] == 0
+    assert await totals(db_session) == RollupTotals(created=2, won=1, commission=500.0)
+
+
+@pytest.mark.asyncio
+async def test_reassignment_moves_advisor_totals(client: AsyncClient, db_session: AsyncSession, users):
+    advisor_id, other_id = users["advisor_ids"]
+    # Sin asesores activos: el lead queda pendiente, bajo la clave ""
+    await db_session.execute(update(User).where(User.role == UserRole.ASESOR).values(is_active=False))
+    await db_session.commit()
+    pending_id = (await new_lead(db_session, "pend@example.com")).id
+    assert await totals(db_session, "advisor", "") == RollupTotals(created=1)
+    await db_session.execute(update(User).where(User.id == advisor_id).values(is_active=True))
+    await db_session.commit()
+    assert await assign_pending_leads(db_session) == 1
+    assert (await totals(db_session, "advisor", "")).created == 0
+
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=[pending_id], operation="set_status", status="GANADA",
+    ))
+    login(client, users["admin"])
+    await client.post(f"/admin/leads/{pending_id}/reassign", data={"advisor_id": str(other_id)})
+    assert (await totals(db_session, "advisor", str(advisor_id)))[:4] == (0, 2, 0, 0)
+    assert (await totals(db_session, "advisor", str(other_id)))[:4] == (1, 0, 1, 0)
+
+    # La conciliación reconstruye created por el asesor actual: nada que corregir
+    today = datetime.utcnow().date()
+    assert (await catch_up_rollups(db_session, today, today))["corrections"] == 0
+    assert (await totals(db_session, "advisor", str(other_id))).created == 1
+
+
+@pytest.mark.asyncio
+async def test_first_start_backfills_whole_history(db_session: AsyncSession, users):
+    # Leads anteriores a los rollups: nadie los registró
+    advisor_id = users["advisor"].id
+    old = datetime.utcnow() - timedelta(days=400)
+    db_session.add_all([
+        Lead(first_name="Vieja", last_name="Roll", email=f"old{i}@example.com", advisor_id=advisor_id,
+             status=status, created_at=old + timedelta(days=i))
+        for i, status in enumerate([LeadStatus.GANADA, LeadStatus.PERDIDA, LeadStatus.NUEVO])
+    ])
+    await db_session.commit()
+
+    report = await open_daily_rollups(db_session)
+    assert report["created"] == 3 and report["days"] == 401
+    assert await totals(db_session, "advisor", str(advisor_id)) == RollupTotals(created=3, won=1, lost=1)
+    assert await open_daily_rollups(db_session) is None
+
+
+@pytest.mark.asyncio
+async def test_trends_page(client: AsyncClient, db_session: AsyncSession, users):
+    await new_lead(db_session, "ana@example.com")
+    login(client, users["admin"])
+    response = await client.get("/admin/trends?dimension=advisor&days=7")
+    assert response.status_code == 200
+    assert "Asesor0 Test" in response.text
+    assert (await client.get("/admin/trends?dimension=otra")).status_code == 400
+
+    login(client, users["advisor"])
+    assert (await client.get("/admin/trends")).status_code in (302, 403)
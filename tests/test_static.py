@@ -0,0 +1,115 @@
+import gzip
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from app.staticfiles import PrecompressedStaticFiles, parse_range_header
+
+CSS = b"body { color: #111; }\n" * 200
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "style.css").write_bytes(CSS)
+    (tmp_path / "style.css.gz").write_bytes(gzip.compress(CSS))
+    return tmp_path
+
+
+@pytest_asyncio.fixture
+async def static_client(static_dir):
+    app = Starlette(routes=[Mount("/static", PrecompressedStaticFiles(directory=static_dir))])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=0-1,5-9", 1000) == [(0, 1), (5, 9)]
+    assert parse_range_header("bytes=2000-", 1000) == []
+    assert parse_range_header("items=0-1", 1000) is None
+
+
+@pytest.mark.asyncio
+async def test_serves_gzip_variant(static_client: AsyncClient):
+    response = await static_client.get("/static/style.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-type"].startswith("text/css")
+    assert response.content == CSS
+
+
+@pytest.mark.asyncio
+async def test_serves_identity_without_accept_encoding(static_client: AsyncClient):
+    response = await static_client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.content == CSS
+    assert response.headers["cache-control"] == "public, no-cache"
+
+
+@pytest.mark.asyncio
+async def test_versioned_asset_is_immutable(static_client: AsyncClient):
+    response = await static_client.get("/static/style.css?v=2")
+    assert "immutable" in response.headers["cache-control"]
+
+
+@pytest.mark.asyncio
+async def test_range_request(static_client: AsyncClient):
+    response = await static_client.get("/static/style.css", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CSS)}"
+    assert response.content == CSS[10:20]
+
+    response = await static_client.get("/static/style.css", headers={"Range": f"bytes={len(CSS)}-"})
+    assert response.status_code == 416
+
+
+@pytest.mark.asyncio
+async def test_if_range_mismatch_returns_full_file(static_client: AsyncClient):
+    response = await static_client.get(
+        "/static/style.css",
+        headers={"Range": "bytes=0-9", "If-Range": '"stale-etag"', "Accept-Encoding": "identity"},
+    )
+    assert response.status_code == 200
+    assert response.content == CSS
+
+
+@pytest.mark.asyncio
+async def test_multi_range_request(static_client: AsyncClient):
+    response = await static_client.get("/static/style.css", headers={"Range": "bytes=0-4,100-109"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    body = response.content
+    assert int(response.headers["content-length"]) == len(body)
+    assert f"Content-Range: bytes 0-4/{len(CSS)}".encode() in body
+    assert f"Content-Range: bytes 100-109/{len(CSS)}".encode() in body
+    assert CSS[100:110] in body
+    assert body.endswith(f"--{boundary}--\r\n".encode())
+
+
+@pytest.mark.asyncio
+async def test_media_video_ranges(client: AsyncClient, tmp_path, monkeypatch):
+    from app.routers import media
+
+    video = bytes(range(256)) * 4096
+    (tmp_path / "demo.mp4").write_bytes(video)
+    monkeypatch.setattr(media.settings, "MEDIA_VIDEOS_DIR", str(tmp_path))
+
+    response = await client.get("/media/videos/demo.mp4?v=2", headers={"Range": "bytes=1000-"})
+    assert response.status_code == 206
+    assert response.headers["content-type"] == "video/mp4"
+    assert response.headers["content-range"] == f"bytes 1000-{len(video) - 1}/{len(video)}"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.content == video[1000:]
+
+    etag = response.headers["etag"]
+    response = await client.get("/media/videos/demo.mp4", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = await client.get("/media/videos/../secret.mp4")
+    assert response.status_code == 404
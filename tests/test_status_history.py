@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Lead, LeadDailyRollup, LeadStatus, LeadStatusEvent
+from app.schemas.lead import LeadBulkRequest, LeadCreateRequest
+from app.services.assignment_service import assign_pending_leads
+from app.services.lead_service import bulk_update_leads, create_lead
+from app.services.rollup_service import RollupTotals, catch_up_rollups, rollup_totals
+from app.services.status_history_service import summarize, velocity_bucket, velocity_histograms
+from conftest import login
+
+FIRST_CONTACT = (LeadStatus.NUEVO, LeadStatus.CONTACTANDO)
+
+
+async def new_lead(db: AsyncSession, email: str, hours_ago: float = 0) -> int:
+    lead = await create_lead(db, LeadCreateRequest(first_name="Ana", last_name="Hist", email=email))
+    if hours_ago:
+        await db.execute(
+            update(Lead).where(Lead.id == lead.id)
+            .values(status_changed_at=datetime.utcnow() - timedelta(hours=hours_ago))
+        )
+        await db.commit()
+    return lead.id
+
+
+async def events(db: AsyncSession) -> list:
+    result = await db.execute(select(LeadStatusEvent).order_by(LeadStatusEvent.id))
+    return result.scalars().all()
+
+
+def test_summarize_interpolates_median():
+    assert velocity_bucket(0.5) == 0 and velocity_bucket(3) == 2 and velocity_bucket(10_000) == 14
+    # 3 leads entre 2 y 4 horas, 1 entre 24 y 36
+    stat = summarize({2: (3, 9.0), 6: (1, 30.0)})
+    assert stat.count == 4 and stat.mean_hours == 9.75
+    assert 2 < stat.median_hours < 4
+    assert summarize({}) == (0, 0.0, 0.0)
+
+
+@pytest.mark.asyncio
+async def test_status_change_logs_event_and_velocity(client: AsyncClient, db_session: AsyncSession, users):
+    lead_id = await new_lead(db_session, "ana@example.com", hours_ago=5)
+    login(client, users["advisor"])
+    base = f"/dashboard/asesor/leads/{lead_id}/status"
+    for status in ["CONTACTANDO", "CONTACTANDO", "PROPUESTA_REALIZADA"]:
+        await client.post(base, data={"status": status}, headers={"HX-Request": "true"})
+
+    logged = await events(db_session)
+    assert [(e.from_status, e.to_status) for e in logged] == [
+        (LeadStatus.NUEVO, LeadStatus.CONTACTANDO), (LeadStatus.CONTACTANDO, LeadStatus.PROPUESTA_REALIZADA),
+    ]
+    assert all(e.advisor_id == users["advisor_id"] and e.changed_by_id == users["advisor_id"] for e in logged)
+    assert 4.9 < logged[0].hours_in_stage < 5.1
+    assert logged[1].hours_in_stage < 0.1
+    lead = (await db_session.execute(select(Lead).where(Lead.id == lead_id))).scalar_one()
+    assert lead.status_changed_at == logged[1].at
+
+    histograms = await velocity_histograms(db_session, users["advisor_id"])
+    first_contact = summarize(histograms[FIRST_CONTACT])
+    assert first_contact.count == 1 and 4 < first_contact.median_hours <= 8
+    assert 4.9 < first_contact.mean_hours < 5.1
+
+
+@pytest.mark.asyncio
+async def test_bulk_and_assignment_log_events(db_session: AsyncSession, users):
+    ids = [await new_lead(db_session, f"bulk{i}@example.com", hours_ago=30) for i in range(3)]
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids, operation="set_status", status="CONTACTANDO",
+    ))
+    # Sin cambio real: ni evento ni nueva fecha de entrada
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids[:1], operation="set_status", status="CONTACTANDO",
+    ))
+    logged = await events(db_session)
+    assert len(logged) == 3 and all(e.changed_by_id == users["admin_id"] for e in logged)
+    histograms = await velocity_histograms(db_session)
+    assert sum(count for count, _hours in histograms[FIRST_CONTACT].values()) == 3
+
+    pending = Lead(first_name="Pend", last_name="Hist", email="pend@example.com",
+                   status=LeadStatus.PENDING_ASSIGNMENT)
+    db_session.add(pending)
+    await db_session.commit()
+    assert await assign_pending_leads(db_session) == 1
+    last = (await events(db_session))[-1]
+    assert (last.lead_id, last.from_status, last.to_status) == (pending.id, LeadStatus.PENDING_ASSIGNMENT, LeadStatus.NUEVO)
+    # Turno rotativo: tras tres leads le toca al segundo asesor
+    assert last.advisor_id == users["advisor_ids"][1]
+
+
+@pytest.mark.asyncio
+async def test_catch_up_rebuilds_transitions_from_events(db_session: AsyncSession, users):
+    ids = [await new_lead(db_session, f"cu{i}@example.com") for i in range(2)]
+    await bulk_update_leads(db_session, users["admin"], LeadBulkRequest(
+        lead_ids=ids, operation="set_status", status="GANADA",
+    ))
+    # Rollups borrados a mano: la conciliación los recupera del historial
+    await db_session.execute(update(LeadDailyRollup).values(transitions=0))
+    await db_session.commit()
+
+    today = datetime.utcnow().date()
+    await catch_up_rollups(db_session, today, today)
+    totals = await rollup_totals(db_session, "advisor")
+    assert [totals[str(advisor_id)] for advisor_id in users["advisor_ids"]] == [
+        RollupTotals(created=1, transitions=1, won=1),
+    ] * 2
+
+
+@pytest.mark.asyncio
+async def test_funnel_shows_velocity(client: AsyncClient, db_session: AsyncSession, users):
+    lead_id = await new_lead(db_session, "ana@example.com", hours_ago=72)
+    login(client, users["advisor"])
+    await client.post(f"/dashboard/asesor/leads/{lead_id}/status", data={"status": "CONTACTANDO"})
+
+    login(client, users["admin"])
+    response = await client.get(f"/admin/advisors/{users['advisor_id']}/funnel")
+    assert response.status_code == 200
+    assert "Velocidad del embudo" in response.text
+    assert "Mediana al primer contacto (1 leads)" in response.text
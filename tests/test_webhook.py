@@ -0,0 +1,136 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import User, UserRole, Lead
+from app.routers import api
+from app.schemas.lead import LeadWebhookRequest
+from app.services.events import advisor_channel, broker
+from app.services.import_service import ingest_webhook_leads, utm_from_url
+
+TOKEN = {"X-Webhook-Token": "secreto"}
+
+BATCH = {
+    "utm_source": "meta",
+    "utm_campaign": "baru-2026",
+    "leads": [
+        {
+            "idempotency_key": "fb-1", "first_name": "Camila", "last_name": "García",
+            "email": "camila@example.com", "referral_code": "HOOK0001",
+        },
+        {
+            "idempotency_key": "fb-2", "first_name": "Andrés", "last_name": "López", "email": "andres@example.com",
+            "landing_url": "https://egp.com/r/HOOK0001?utm_source=instagram&utm_content=video",
+        },
+        {"idempotency_key": "fb-3", "first_name": "X", "last_name": "Corto", "email": "malo"},
+        {"first_name": "Sin", "last_name": "Llave", "email": "sin@example.com"},
+        {"idempotency_key": "fb-1", "first_name": "Camila", "last_name": "García", "email": "camila@example.com"},
+    ],
+}
+
+
+@pytest_asyncio.fixture
+async def setup_users(db_session: AsyncSession, monkeypatch) -> dict:
+    monkeypatch.setattr(api.settings, "WEBHOOK_TOKEN", "secreto")
+    advisor = User(name="Asesor", last_name="Hook", email="asesor@hook.test", password_hash="x", role=UserRole.ASESOR)
+    referrer = User(
+        name="Ref", last_name="Hook", email="ref@hook.test", password_hash="x",
+        role=UserRole.REFERIDOR, referral_code="HOOK0001",
+    )
+    db_session.add_all([advisor, referrer])
+    await db_session.commit()
+    return {"advisor_id": advisor.id, "referrer_id": referrer.id}
+
+
+def test_utm_from_url():
+    assert utm_from_url("https://egp.com/?utm_source=google&utm_medium=cpc&gclid=x") == {
+        "utm_source": "google", "utm_medium": "cpc",
+    }
+    assert utm_from_url(None) == {}
+
+
+@pytest.mark.asyncio
+async def test_webhook_batch_outcomes(client: AsyncClient, db_session: AsyncSession, setup_users):
+    response = await client.post("/api/v1/webhooks/leads", json=BATCH, headers=TOKEN)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["received"], body["created"], body["duplicates"], body["invalid"]) == (5, 2, 1, 2)
+    outcomes = [(r["idempotency_key"], r["outcome"]) for r in body["results"]]
+    assert outcomes == [
+        ("fb-1", "created"), ("fb-2", "created"), ("fb-3", "invalid"), (None, "invalid"), ("fb-1", "duplicate"),
+    ]
+    assert body["results"][4]["lead_id"] == body["results"][0]["lead_id"]
+    assert body["results"][2]["errors"]
+
+    leads = (await db_session.execute(select(Lead).order_by(Lead.id))).scalars().all()
+    assert [lead.email for lead in leads] == ["camila@example.com", "andres@example.com"]
+    assert leads[0].referrer_id == setup_users["referrer_id"]
+    assert (leads[0].utm_source, leads[0].utm_campaign) == ("meta", "baru-2026")
+    # La URL de la landing gana sobre el UTM del lote
+    assert (leads[1].utm_source, leads[1].utm_content, leads[1].utm_campaign) == ("instagram", "video", "baru-2026")
+    assert all(lead.advisor_id == setup_users["advisor_id"] for lead in leads)
+
+
+@pytest.mark.asyncio
+async def test_redelivered_batch_is_a_noop(client: AsyncClient, db_session: AsyncSession, setup_users, query_recorder):
+    first = (await client.post("/api/v1/webhooks/leads", json=BATCH, headers=TOKEN)).json()
+    query_recorder.clear()
+    again = (await client.post("/api/v1/webhooks/leads", json=BATCH, headers=TOKEN)).json()
+    assert again["created"] == 0 and again["duplicates"] == 3
+    assert [r["lead_id"] for r in again["results"]] == [r["lead_id"] for r in first["results"]]
+    # Solo la búsqueda de llaves
+    assert query_recorder.count == 1
+    assert (await db_session.execute(select(func.count(Lead.id)))).scalar() == 2
+    assert (await db_session.execute(select(func.count(Lead.idempotency_key)))).scalar() == 2
+
+
+@pytest.mark.asyncio
+async def test_unique_key_race_is_reevaluated(db_session: AsyncSession, setup_users, monkeypatch):
+    from app.services import import_service
+
+    data = LeadWebhookRequest(leads=[BATCH["leads"][0]])
+    first = await ingest_webhook_leads(db_session, data)
+    # Simula una entrega concurrente que no vio la llave al consultar
+    real_lookup = import_service._lead_ids_by_key
+    calls = []
+
+    async def stale_lookup(db, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else await real_lookup(db, keys)
+
+    monkeypatch.setattr(import_service, "_lead_ids_by_key", stale_lookup)
+    second = await ingest_webhook_leads(db_session, data)
+    assert second.created == 0 and second.duplicates == 1
+    assert second.results[0].lead_id == first.results[0].lead_id
+    assert (await db_session.execute(select(func.count(Lead.id)))).scalar() == 1
+
+
+@pytest.mark.asyncio
+async def test_assigned_events_carry_each_advisors_leads(db_session: AsyncSession, users):
+    # Llaves en orden inverso al alfabético: el SELECT por llave no sigue el orden de inserción
+    data = LeadWebhookRequest(leads=[
+        {"idempotency_key": key, "first_name": "Ana", "last_name": "Hook", "email": f"{key}@example.com"}
+        for key in ["zzz", "aaa"]
+    ])
+    subscriptions = {advisor_id: broker.subscribe(advisor_channel(advisor_id)) for advisor_id in users["advisor_ids"]}
+    try:
+        response = await ingest_webhook_leads(db_session, data)
+        received = {advisor_id: sub.queue.get_nowait()[1]["lead_ids"] for advisor_id, sub in subscriptions.items()}
+    finally:
+        for subscription in subscriptions.values():
+            broker.unsubscribe(subscription)
+
+    lead_ids = [result.lead_id for result in response.results]
+    assigned = dict((await db_session.execute(select(Lead.id, Lead.advisor_id).where(Lead.id.in_(lead_ids)))).all())
+    assert received == {advisor_id: [lead_id] for lead_id, advisor_id in assigned.items()}
+    assert sorted(received) == sorted(users["advisor_ids"])
+
+
+@pytest.mark.asyncio
+async def test_webhook_requires_token(client: AsyncClient, setup_users, monkeypatch):
+    response = await client.post("/api/v1/webhooks/leads", json=BATCH, headers={"X-Webhook-Token": "otro"})
+    assert response.status_code == 401
+    monkeypatch.setattr(api.settings, "WEBHOOK_TOKEN", "")
+    response = await client.post("/api/v1/webhooks/leads", json=BATCH, headers=TOKEN)
+    assert response.status_code == 404